@@ -0,0 +1,74 @@
+# backend/python/benchmarks/assignment_solver.py
+#
+# Times the sparse bipartite assignment solver (worker.assignment.max_weight_assignment)
+# against networkx's max_weight_matching on large synthetic score tiers, and checks that
+# both select the same total surplus. With tied weights both can pick different but
+# equally good assignments, so the selected pairs are compared as well but only reported.
+#
+# Usage (from backend/python):
+#   python -m benchmarks.assignment_solver --sizes 200 1000 5000 --degree 8 --reference-max 2000
+
+import argparse
+import time
+
+import numpy as np
+
+from worker.assignment import max_weight_assignment, max_weight_assignment_networkx
+
+
+def make_tier(resources_per_side: int, degree: int, seed: int) -> tuple:
+    """
+    A tier of potential matches as edge arrays: every buyer is compatible with about
+    `degree` sellers at a nearby price, weighted by the surplus (bid - ask) like the resolver does.
+    """
+    rng = np.random.default_rng(seed)
+    bids = rng.integers(5, 500, resources_per_side)
+    asks = rng.integers(1, 450, resources_per_side)
+    buyers = np.repeat(np.arange(resources_per_side), degree)
+    # Counterparts around the buyer's own position, so the graph has realistic local structure
+    offsets = rng.integers(-4 * degree, 4 * degree + 1, len(buyers))
+    sellers = np.clip(buyers + offsets, 0, resources_per_side - 1)
+    weights = (bids[buyers] - asks[sellers]).astype(np.float64)
+    return buyers, sellers, weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the sparse assignment solver with networkx.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[200, 1000, 5000, 20000], help="Buyers (and sellers) per tier.")
+    parser.add_argument('--degree', type=int, default=8, help="Potential matches per buyer.")
+    parser.add_argument('--reference-max', type=int, default=2000, help="Largest tier size also solved with networkx.")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Benchmark: degree {args.degree}, seed {args.seed}")
+    print(f"{'size':>7} {'edges':>8} {'solver s':>9} {'networkx s':>11} {'speedup':>8} {'matched':>8} "
+          f"{'surplus':>10} {'same surplus':>13} {'same pairs':>11}")
+
+    for size in args.sizes:
+        buyers, sellers, weights = make_tier(size, args.degree, args.seed)
+
+        started_at = time.perf_counter()
+        selected = max_weight_assignment(buyers, sellers, weights)
+        solver_seconds = time.perf_counter() - started_at
+        surplus = weights[selected].sum()
+
+        if size <= args.reference_max:
+            started_at = time.perf_counter()
+            reference = max_weight_assignment_networkx(buyers, sellers, weights)
+            reference_seconds = time.perf_counter() - started_at
+            same_surplus = str(bool(np.isclose(surplus, weights[reference].sum())))
+            reference_pairs = set(zip(buyers[reference], sellers[reference]))
+            selected_pairs = set(zip(buyers[selected], sellers[selected]))
+            same_pairs = f"{len(selected_pairs & reference_pairs) / max(len(reference_pairs), 1):.1%}"
+            networkx_column = f"{reference_seconds:>11.3f}"
+            speedup_column = f"{reference_seconds / solver_seconds:>7.1f}x"
+        else:
+            same_surplus, same_pairs = '-', '-'
+            networkx_column, speedup_column = f"{'-':>11}", f"{'-':>8}"
+
+        print(f"{size:>7} {len(weights):>8} {solver_seconds:>9.3f} {networkx_column} {speedup_column} {len(selected):>8} "
+              f"{surplus:>10.0f} {same_surplus:>13} {same_pairs:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# backend/python/benchmarks/errand_scoring.py
+#
+# Checks that the vectorized errand scorer (nlp/errand_scoring.py) returns the same score
+# as calculate_match_score for every request/offer pair, and compares their speed.
+#
+# Usage (from backend/python):
+#   python -m benchmarks.errand_scoring --requests 500 --offers 2000
+
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_errands
+from nlp.errand_scoring import OfferFeatures, calculate_match_scores, request_features
+from nlp.processing import calculate_match_score
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the vectorized and scalar errand scorers.")
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--offers', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    service_requests, service_offers, runner_profile_map = make_errands(args.requests, args.offers, args.seed)
+    scorable_offers = [(s_offer, runner_profile_map[s_offer['userId']]) for s_offer in service_offers]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        started_at = time.perf_counter()
+        scalar_scores = np.array([
+            [calculate_match_score(s_req, s_offer, runner_profile) for s_offer, runner_profile in scorable_offers]
+            for s_req in service_requests
+        ])
+        scalar_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        offer_features = OfferFeatures(scorable_offers)
+        vectorized_scores = np.array([
+            calculate_match_scores(request_features(s_req, offer_features), offer_features) for s_req in service_requests
+        ])
+        vectorized_seconds = time.perf_counter() - started_at
+
+    mismatches = int(np.count_nonzero(scalar_scores != vectorized_scores))
+    print(f"Benchmark: {args.requests} requests x {args.offers} offers = {scalar_scores.size} pairs, seed {args.seed}")
+    print(f"{'scorer':>11} {'seconds':>9} {'pairs/s':>12}")
+    print(f"{'scalar':>11} {scalar_seconds:>9.3f} {scalar_scores.size / scalar_seconds:>12.0f}")
+    print(f"{'vectorized':>11} {vectorized_seconds:>9.3f} {scalar_scores.size / vectorized_seconds:>12.0f}")
+    print(f"Speedup {scalar_seconds / vectorized_seconds:.1f}x, score mismatches: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# backend/python/benchmarks/match_parallel.py
+#
+# Measures the speedup of parallel per-category / per-price-bucket candidate scoring
+# (MATCH_PARALLEL_WORKERS, MATCH_SHARD_SIZE) over scoring the categories one after another,
+# and checks that both produce the same candidates.
+#
+# Usage (from backend/python):
+#   python -m benchmarks.match_parallel --categories 6 --resources 1500 --workers 2 4 8
+
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from benchmarks.synthetic import make_resources
+from config import CPU_POOL_START_METHOD
+from worker.candidates import concatenate_candidates, offset_candidates
+from worker.executor import _init_cpu_worker
+from worker.matching import plan_scoring_shards, score_category_resources
+
+
+def make_categories(category_count: int, resources_per_category: int, seed: int) -> list:
+    # Category sizes vary, so one large category shows the benefit of splitting it into price buckets
+    categories = []
+    for index in range(category_count):
+        size = resources_per_category * (3 if index == 0 else 1)
+        categories.append((f"Category {index}", make_resources(size, category=f"Category {index}", seed=seed + index)))
+    return categories
+
+
+def merge(results: list, categories: list) -> np.ndarray:
+    # results are per-category lists of candidate arrays, in shard order
+    candidate_arrays = []
+    table_offset = 0
+    for (_, category_resources), category_results in zip(categories, results):
+        candidate_arrays.extend(offset_candidates(candidates, table_offset) for candidates in category_results)
+        table_offset += len(category_resources)
+    return concatenate_candidates(candidate_arrays)
+
+
+def run_sequential(pool: ProcessPoolExecutor, categories: list) -> tuple:
+    # The sequential path: one category at a time, each as a single task
+    started_at = time.perf_counter()
+    results = []
+    for category, category_resources in categories:
+        candidates, _ = pool.submit(score_category_resources, category, category_resources).result()
+        results.append([candidates])
+    return merge(results, categories), time.perf_counter() - started_at
+
+
+def run_parallel(pool: ProcessPoolExecutor, categories: list, shard_size: int) -> tuple:
+    started_at = time.perf_counter()
+    futures = [
+        [pool.submit(score_category_resources, category, category_resources, anchor_range=anchor_range)
+         for anchor_range in plan_scoring_shards(category_resources, shard_size)]
+        for category, category_resources in categories
+    ]
+    results = [[future.result()[0] for future in category_futures] for category_futures in futures]
+    return merge(results, categories), time.perf_counter() - started_at
+
+
+def make_pool(workers: int) -> ProcessPoolExecutor:
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context(CPU_POOL_START_METHOD),
+        initializer=_init_cpu_worker,
+    )
+    return pool
+
+
+def warm_up(pool: ProcessPoolExecutor, workers: int, categories: list):
+    # Start every process and fill its embedding cache, so model loading is not timed
+    for future in [pool.submit(score_category_resources, category, category_resources)
+                   for category, category_resources in categories for _ in range(workers)]:
+        future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare parallel and sequential candidate scoring.")
+    parser.add_argument('--categories', type=int, default=6)
+    parser.add_argument('--resources', type=int, default=1500, help="Resources per category (the first category gets 3x).")
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--shard-size', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    categories = make_categories(args.categories, args.resources, args.seed)
+
+    with make_pool(1) as pool:
+        warm_up(pool, 1, categories)
+        reference, sequential_seconds = run_sequential(pool, categories)
+
+    print(f"Benchmark: {args.categories} categories, {sum(len(resources) for _, resources in categories)} resources, "
+          f"shard size {args.shard_size}, {multiprocessing.cpu_count()} CPUs")
+    print(f"{'mode':>14} {'seconds':>9} {'speedup':>8} {'candidates':>11} {'identical':>10}")
+    print(f"{'sequential':>14} {sequential_seconds:>9.2f} {1.0:>7.2f}x {len(reference):>11} {'-':>10}")
+
+    for workers in args.workers:
+        with make_pool(workers) as pool:
+            warm_up(pool, workers, categories)
+            candidates, parallel_seconds = run_parallel(pool, categories, args.shard_size)
+        identical = len(candidates) == len(reference) and all(
+            np.array_equal(candidates[field], reference[field]) for field in reference.dtype.names
+        )
+        print(f"{f'{workers} workers':>14} {parallel_seconds:>9.2f} {sequential_seconds / parallel_seconds:>7.2f}x "
+              f"{len(candidates):>11} {str(identical):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# backend/python/benchmarks/match_top_k.py
+#
+# Compares top-K candidate generation (MATCH_TOP_K) against exhaustive mode on synthetic data:
+# scoring and resolution time, number and size of the candidates, and matching quality.
+#
+# Usage (from backend/python):
+#   python -m benchmarks.match_top_k --resources 3000 --k 1 5 10 20
+
+import argparse
+import contextlib
+import io
+import time
+
+from benchmarks.synthetic import make_resources
+from worker.candidates import slim_resource, sort_by_score
+from worker.matching import score_category_resources, resolve_potential_matches
+
+
+def greedy_assignment(candidates) -> tuple:
+    """
+    One-to-one assignment taking candidates in descending score order, as a quality
+    reference that does not depend on the resolver's tier rules.
+    Returns the set of matched pairs and their total score.
+    """
+    matched_resources = set()
+    matched_pairs = set()
+    total_score = 0.0
+    for candidate in sort_by_score(candidates):
+        idx_a, idx_b = int(candidate['idx_a']), int(candidate['idx_b'])
+        if idx_a in matched_resources or idx_b in matched_resources:
+            continue
+        matched_resources.update((idx_a, idx_b))
+        matched_pairs.add(frozenset((idx_a, idx_b)))
+        total_score += float(candidate['score'])
+    return matched_pairs, total_score
+
+
+def run_mode(resources: list, top_k: int, verbose: bool) -> dict:
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        started_at = time.perf_counter()
+        candidates, scoring_stats = score_category_resources('Benchmark', resources, top_k=top_k)
+        scoring_seconds = time.perf_counter() - started_at
+
+        status_map = {str(resource['_id']): 'matching' for resource in resources}
+        started_at = time.perf_counter()
+        created_matches, _ = resolve_potential_matches(candidates, [slim_resource(resource) for resource in resources], status_map)
+        resolve_seconds = time.perf_counter() - started_at
+
+    greedy_pairs, greedy_score = greedy_assignment(candidates)
+    return {
+        'top_k': top_k,
+        'candidates': len(candidates),
+        'candidate_bytes': candidates.nbytes,
+        'scored_pairs': scoring_stats['scored_pairs'],
+        'scoring_seconds': scoring_seconds,
+        'resolve_seconds': resolve_seconds,
+        'created_matches': len(created_matches),
+        'created_score': sum(match['score'] for match in created_matches),
+        'greedy_pairs': greedy_pairs,
+        'greedy_score': greedy_score,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare top-K and exhaustive candidate generation.")
+    parser.add_argument('--resources', type=int, default=2000, help="Number of synthetic resources in the category.")
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 5, 10, 20], help="Top-K values to compare.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help="Show the matcher's own log output.")
+    args = parser.parse_args()
+
+    resources = make_resources(args.resources, seed=args.seed)
+
+    # Warm-up run, so model loading and embedding cache misses are not charged to the first mode
+    run_mode(resources, 0, args.verbose)
+
+    exhaustive = run_mode(resources, 0, args.verbose)
+    results = [exhaustive] + [run_mode(resources, top_k, args.verbose) for top_k in args.k]
+
+    print(f"Benchmark: {args.resources} resources, seed {args.seed}")
+    print(f"{'mode':>12} {'candidates':>11} {'KiB':>9} {'score s':>9} {'resolve s':>10} "
+          f"{'created':>8} {'greedy score':>13} {'vs exhaustive':>14} {'same pairs':>11}")
+    for result in results:
+        mode = 'exhaustive' if result['top_k'] == 0 else f"top-{result['top_k']}"
+        score_ratio = result['greedy_score'] / exhaustive['greedy_score'] if exhaustive['greedy_score'] else 1.0
+        same_pairs = len(result['greedy_pairs'] & exhaustive['greedy_pairs'])
+        pair_ratio = same_pairs / len(exhaustive['greedy_pairs']) if exhaustive['greedy_pairs'] else 1.0
+        print(f"{mode:>12} {result['candidates']:>11} {result['candidate_bytes'] / 1024:>9.1f} "
+              f"{result['scoring_seconds']:>9.3f} {result['resolve_seconds']:>10.3f} {result['created_matches']:>8} "
+              f"{result['greedy_score']:>13.1f} {score_ratio:>13.1%} {pair_ratio:>10.1%}")
+
+
+if __name__ == '__main__':
+    main()
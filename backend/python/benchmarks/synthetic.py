@@ -0,0 +1,121 @@
+# backend/python/benchmarks/synthetic.py
+#
+# Deterministic synthetic marketplace data for the benchmark scripts in this directory.
+
+import random
+
+from bson import ObjectId
+
+ITEM_NAMES = [
+    "calculus textbook", "linear algebra textbook", "physics lab manual", "organic chemistry notes",
+    "english novel", "python programming guide", "desk lamp", "bicycle", "mechanical keyboard",
+    "wireless mouse", "graphing calculator", "yoga mat", "rice cooker", "electric kettle",
+    "高等数学教材", "线性代数", "台灯", "自行车",
+]
+NAME_SUFFIXES = ["", "", " 2nd edition", " used", " like new", " s"]
+SPEC_VALUES = {
+    "edition": ["1", "2", "3"],
+    "condition": ["new", "like new", "used"],
+    "language": ["en", "zh"],
+    "color": ["black", "white", "blue"],
+}
+
+
+def make_resources(count: int, category: str = "Books", seed: int = 0) -> list:
+    """
+    Builds `count` resources in 'matching' status for one category, with a mix of
+    buy / sell / rent / lease types, overlapping names and specifications, and prices
+    that make a good share of the buyer/seller pairs price-compatible.
+    Returned sorted by price, like the matchResources job fetches them.
+    """
+    rng = random.Random(seed)
+    resources = []
+    for _ in range(count):
+        resource_type = rng.choice(["buy", "sell", "rent", "lease"])
+        specifications = {
+            key: rng.choice(values) for key, values in SPEC_VALUES.items() if rng.random() < 0.6
+        }
+        base_price = rng.randint(5, 200)
+        # Buyers bid a bit above the going price, sellers ask a bit below it
+        price = base_price + rng.randint(0, 30) if resource_type in ("buy", "lease") else base_price - rng.randint(0, 30)
+        resources.append({
+            "_id": ObjectId(),
+            "userId": ObjectId(),
+            "name": rng.choice(ITEM_NAMES) + rng.choice(NAME_SUFFIXES),
+            "type": resource_type,
+            "category": category,
+            "price": max(price, 1),
+            "specifications": specifications,
+            "status": "matching",
+        })
+    resources.sort(key=lambda resource: resource["price"])
+    return resources
+
+
+CAMPUS_ZONES = ["North", "South", "East", "West", "Central"]
+BUILDINGS = ["Library", "Gym", "Dorm 1", "Dorm 2", "Science Hall", "Canteen"]
+EQUIPMENT = ["insulated bag", "door-delivery", "trolley", "umbrella"]
+CARGO_CAPACITIES = ["fits in backpack", "small box", "heavy items up to 20kg", None]
+
+
+def _address(rng: random.Random) -> dict:
+    if rng.random() < 0.1:
+        return {}
+    return {"buildingName": rng.choice(BUILDINGS + [""]), "campusZone": rng.choice(CAMPUS_ZONES + [""])}
+
+
+def _time_slot(rng: random.Random) -> tuple:
+    day = rng.randint(1, 3)
+    start_hour = rng.randint(6, 20)
+    end_hour = min(start_hour + rng.randint(1, 4), 23)
+    return f"2025-05-{day:02d}T{start_hour:02d}:00:00+08:00", f"2025-05-{day:02d}T{end_hour:02d}:30:00+08:00"
+
+
+def make_errands(request_count: int, offer_count: int, seed: int = 0) -> tuple:
+    """
+    Builds service-requests, service-offers and their runners' profiles (keyed by userId)
+    with overlapping buildings, campus zones, time slots and equipment, for the errand
+    scoring benchmarks. Returns (service_requests, service_offers, runner_profile_map).
+    """
+    rng = random.Random(seed)
+    service_requests = []
+    for _ in range(request_count):
+        start, end = _time_slot(rng)
+        service_requests.append({
+            "_id": ObjectId(),
+            "userId": ObjectId(),
+            "type": "service-request",
+            "specifications": {
+                "from_address": _address(rng),
+                "to_address": _address(rng),
+                "expectedStartTime": start,
+                "expectedEndTime": end,
+                "door_delivery": rng.random() < 0.4,
+                "item_details": {"size": rng.choice(["fits in backpack", "small box", "heavy", ""])},
+                "requiredEquipment": rng.choice([None, [], ["insulated bag"], ["trolley", "umbrella"]]),
+            },
+        })
+
+    service_offers = []
+    runner_profile_map = {}
+    for _ in range(offer_count):
+        user_id = ObjectId()
+        time_slots = [dict(zip(("start", "end"), _time_slot(rng))) for _ in range(rng.randint(0, 3))]
+        service_offers.append({
+            "_id": ObjectId(),
+            "userId": user_id,
+            "type": "service-offer",
+            "specifications": {
+                "availabilityCampusZone": rng.choice(CAMPUS_ZONES + BUILDINGS + [""]),
+                "availableTimeSlots": time_slots,
+            },
+        })
+        runner_profile_map[user_id] = {
+            "_id": ObjectId(),
+            "userId": user_id,
+            "operatingCampusZones": rng.sample(CAMPUS_ZONES, rng.randint(0, 2)),
+            "vehicleType": rng.choice(["foot", "bicycle", "scooter", "car"]),
+            "specialEquipment": rng.sample(EQUIPMENT, rng.randint(0, 2)),
+            "cargoCapacityDescription": rng.choice(CARGO_CAPACITIES),
+        }
+    return service_requests, service_offers, runner_profile_map
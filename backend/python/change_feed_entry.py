@@ -0,0 +1,54 @@
+# backend/python/change_feed_entry.py
+# This script scores errand resources as they change (see worker/change_feed.py)
+#
+# All setup happens in main(): the CPU pool's 'spawn' processes re-import this script as
+# __mp_main__, so nothing at module level may open connections or install signal handlers.
+
+import sys
+import os
+import time
+import resource
+
+_startup_started_at = time.perf_counter() # Startup-time measurement, reported before the feed starts
+
+sys.path.insert(0, '/app')  # Ensure /app is at the beginning of the path
+
+import asyncio
+import signal
+
+
+def main():
+    from worker.change_feed import run_change_feed
+    from worker.executor import shutdown_pools
+    from worker.potential_matches import ensure_potential_match_indexes
+
+    from config import RESOURCE_CHANGE_FEED_SOURCE
+
+    print(f"Change Feed Entry: Startup completed in {time.perf_counter() - _startup_started_at:.2f}s "
+          f"(max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB).")
+
+    async def run():
+        await ensure_potential_match_indexes() # Unique / read / TTL indexes of the potential-match collection, if used
+        print(f"Change Feed Entry: Scoring resource changes from '{RESOURCE_CHANGE_FEED_SOURCE}'...")
+        await run_change_feed()
+
+    # Basic signal handling for graceful shutdown; the checkpoint of the last saved batch is already stored
+    def shutdown_change_feed(signum, frame):
+        print(f"\nChange Feed Entry: Received signal {signum}, shutting down...")
+        shutdown_pools() # Stop the CPU process pool and the I/O thread pool
+        os._exit(0)
+
+    signal.signal(signal.SIGINT, shutdown_change_feed)
+    signal.signal(signal.SIGTERM, shutdown_change_feed)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("Change Feed Entry: Keyboard interrupt received.")
+    except Exception as e:
+        print(f"Change Feed Entry: Unhandled exception in main loop: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
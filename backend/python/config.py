@@ -12,8 +12,106 @@ REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 # MongoDB connection details for worker to access database
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "your_database_name") # Replace with your DB name
+# Connection pool sizes for the worker's async MongoDB client (worker/db.py)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
 
 # NLP Model Names
 SPACY_MODEL_NAME = "xx" # Multilingual blank model
 TRANSFORMER_MODEL_NAME = "xlm-roberta-base" # Hugging Face model for spaCy transformer
 SENTENCE_TRANSFORMER_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2" # Sentence Transformer model
+
+# Number of texts sent to the Sentence Transformer per forward pass when batch-encoding
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 256))
+
+# Embedding cache (nlp/embedding_cache.py)
+# In-process LRU tier is bounded by the total size of the cached vectors
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Shared Redis tier, so every worker replica benefits from the others' encodes
+EMBEDDING_CACHE_REDIS_ENABLED = os.getenv("EMBEDDING_CACHE_REDIS_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_REDIS_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_REDIS_TTL_SECONDS", 30 * 24 * 3600))
+
+# Category taxonomy and its precomputed, normalized embedding matrix (nlp/taxonomy.py)
+CATEGORY_TAXONOMY_PATH = os.getenv("CATEGORY_TAXONOMY_PATH", os.path.join(os.path.dirname(__file__), "nlp", "taxonomy.json"))
+CATEGORY_EMBEDDINGS_DIR = os.getenv("CATEGORY_EMBEDDINGS_DIR", os.path.join(os.path.dirname(__file__), "nlp", "data"))
+
+# Bulk classification ('classifyResources' job)
+CLASSIFY_BULK_MAX_SIZE = int(os.getenv("CLASSIFY_BULK_MAX_SIZE", 500)) # Max resources classified per job
+
+# Micro-batching of single 'classifyResource' jobs (nlp/batching.py)
+CLASSIFY_BATCH_MAX_SIZE = int(os.getenv("CLASSIFY_BATCH_MAX_SIZE", 32)) # Flush once this many requests are queued
+CLASSIFY_BATCH_MAX_WAIT_MS = int(os.getenv("CLASSIFY_BATCH_MAX_WAIT_MS", 20)) # ...or once the oldest has waited this long
+CLASSIFY_BATCH_STATS_EVERY = int(os.getenv("CLASSIFY_BATCH_STATS_EVERY", 100)) # The dispatcher logs its stats every this many batches; 0 never
+
+# Number of jobs the resource worker runs concurrently; must be > 1 for classification jobs to coalesce
+RESOURCE_WORKER_CONCURRENCY = int(os.getenv("RESOURCE_WORKER_CONCURRENCY", 32))
+
+# Execution pools (worker/executor.py)
+# Every CPU pool process holds its own copy of the NLP models (xlm-roberta-base through spaCy plus the
+# sentence transformer, roughly 1.5-2 GB of RSS with torch), loaded at start while CPU_POOL_PRELOAD_MODELS
+# is on. Size the pool to the container's memory, not its cores: at most 2 processes unless set.
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", min(os.cpu_count() or 1, 2))) # Processes for NLP and scoring
+CPU_POOL_START_METHOD = os.getenv("CPU_POOL_START_METHOD", "spawn") # 'spawn' avoids forking a process that already runs threads
+CPU_POOL_PRELOAD_MODELS = os.getenv("CPU_POOL_PRELOAD_MODELS", "true").lower() == "true" # Load NLP models when each process starts
+IO_POOL_WORKERS = int(os.getenv("IO_POOL_WORKERS", 32)) # Threads for blocking database calls
+
+# Candidate generation for the 'matchResources' job (worker/matching.py)
+# Keep only the K best-scoring counterparts per resource while scoring; 0 keeps every pair above MIN_MATCH_SCORE
+MATCH_TOP_K = int(os.getenv("MATCH_TOP_K", 0))
+# Shards (categories, or price buckets of large categories) scored concurrently in the CPU pool; 1 scores them one at a time.
+# Defaults to CPU_POOL_WORKERS, as more concurrent shards than pool processes only queue up in the pool
+MATCH_PARALLEL_WORKERS = int(os.getenv("MATCH_PARALLEL_WORKERS", CPU_POOL_WORKERS))
+# Categories with more resources than this are split into price buckets of this size; 0 never splits
+MATCH_SHARD_SIZE = int(os.getenv("MATCH_SHARD_SIZE", 2000))
+
+# Distributed matching: 'matchResourcesCoordinator' fans scoring out as 'scoreMatchShard' jobs (worker/fanout.py)
+MATCH_FANOUT_KEY_PREFIX = os.getenv("MATCH_FANOUT_KEY_PREFIX", "match:run") # Redis keys of a run: <prefix>:<runId>:...
+MATCH_FANOUT_TTL_SECONDS = int(os.getenv("MATCH_FANOUT_TTL_SECONDS", 6 * 3600)) # Leftovers of failed runs expire after this
+MATCH_SHARD_ATTEMPTS = int(os.getenv("MATCH_SHARD_ATTEMPTS", 5)) # A shard job is retried this many times in total...
+MATCH_SHARD_BACKOFF_MS = int(os.getenv("MATCH_SHARD_BACKOFF_MS", 5000)) # ...with exponential backoff starting at this delay
+# A 'checkMatchRun' job looks at the run this long after the coordinator and reports it if it has not reduced; keep below the TTL
+MATCH_RUN_CHECK_DELAY_SECONDS = int(os.getenv("MATCH_RUN_CHECK_DELAY_SECONDS", 3600))
+
+# Conflict resolution of a 'matchResources' run (worker/matching.py)
+# 'tiered' resolves candidates score tier by score tier; 'global' solves one assignment per category
+MATCH_ASSIGNMENT_MODE = os.getenv("MATCH_ASSIGNMENT_MODE", "tiered")
+# In 'global' mode an edge weighs score + this * surplus (bid - ask), so surplus mainly breaks near-ties in score
+MATCH_GLOBAL_SURPLUS_WEIGHT = float(os.getenv("MATCH_GLOBAL_SURPLUS_WEIGHT", 0.01))
+
+# Errand pre-matching ('populatePotentialMatches' job, worker/errand_matching.py)
+# Score each service-request only against offers sharing a building or campus zone with it. Lossy while
+# MIN_MATCH_SCORE <= 50: a pair without location points can still reach 50 from time overlap, door delivery,
+# cargo and equipment, and the index skips it. Off by default; turn on to trade those matches for speed.
+ERRAND_LOCATION_INDEX_ENABLED = os.getenv("ERRAND_LOCATION_INDEX_ENABLED", "false").lower() == "true"
+# Requests without any building or campus zone: 'all' scores them against every offer, 'none' skips them
+ERRAND_UNLOCATED_REQUEST_FALLBACK = os.getenv("ERRAND_UNLOCATED_REQUEST_FALLBACK", "all")
+# Offers one run scores the requests against (the run holds them all in memory); when more changed within the
+# window, the first by _id are kept and the rest wait for a later run or the change feed. 0 keeps every offer
+ERRAND_MAX_OFFERS_PER_RUN = int(os.getenv("ERRAND_MAX_OFFERS_PER_RUN", 5000))
+
+# Errand potential matches (worker/potential_matches.py), written by 'populatePotentialMatches' and read by 'assignErrand'
+# 'runner_profile' embeds them in RunnerProfile.potentialErrandRequests (also read by the Node claim route),
+# 'collection' stores one document per (request, offer) in POTENTIAL_MATCH_COLLECTION, 'both' writes both and reads the collection
+POTENTIAL_MATCH_STORE = os.getenv("POTENTIAL_MATCH_STORE", "runner_profile")
+POTENTIAL_MATCH_COLLECTION = os.getenv("POTENTIAL_MATCH_COLLECTION", "potential_matches")
+POTENTIAL_MATCH_TTL_SECONDS = int(os.getenv("POTENTIAL_MATCH_TTL_SECONDS", 24 * 3600)) # Entries not re-scored for this long expire
+POTENTIAL_MATCH_WRITE_CHUNK_SIZE = int(os.getenv("POTENTIAL_MATCH_WRITE_CHUNK_SIZE", 1000)) # Upserts per unordered bulk_write
+# Embedded potentialErrandRequests keep only the K best entries per runner; entries not re-scored within the horizon are dropped
+RUNNER_POTENTIAL_MATCHES_TOP_K = int(os.getenv("RUNNER_POTENTIAL_MATCHES_TOP_K", 50))
+POTENTIAL_MATCH_STALE_HOURS = int(os.getenv("POTENTIAL_MATCH_STALE_HOURS", 24))
+# 'prunePotentialMatches' job: removes potential matches of requests that are no longer waiting for a runner
+POTENTIAL_MATCH_PRUNE_INTERVAL_MINUTES = int(os.getenv("POTENTIAL_MATCH_PRUNE_INTERVAL_MINUTES", 30))
+# Incremental potential matching (change_feed_entry.py): changed service-requests / offers are scored as they change.
+# 'change_stream' watches the resources collection (needs a replica set; a single-node one works locally),
+# 'redis_stream' reads entries with a resourceId field XADDed to RESOURCE_CHANGE_STREAM_KEY on create/update
+RESOURCE_CHANGE_FEED_SOURCE = os.getenv("RESOURCE_CHANGE_FEED_SOURCE", "change_stream")
+RESOURCE_CHANGE_STREAM_KEY = os.getenv("RESOURCE_CHANGE_STREAM_KEY", "resource_changes")
+RESOURCE_CHANGE_CHECKPOINT_KEY = os.getenv("RESOURCE_CHANGE_CHECKPOINT_KEY", "potential_matches:change_feed:checkpoint") # Resume token / last stream ID, in Redis
+RESOURCE_CHANGE_BATCH_SIZE = int(os.getenv("RESOURCE_CHANGE_BATCH_SIZE", 200)) # Changed resources scored together
+RESOURCE_CHANGE_BATCH_WAIT_MS = int(os.getenv("RESOURCE_CHANGE_BATCH_WAIT_MS", 500)) # How long a batch waits for more changes
+# The feed keeps the open requests / offers (and the offers' runner profiles) in memory and updates them from the
+# changes it scores; they are re-read from MongoDB this often, to pick up runner profile edits and anything missed
+RESOURCE_CHANGE_RELOAD_MINUTES = int(os.getenv("RESOURCE_CHANGE_RELOAD_MINUTES", 60))
+# Instant match: classifyResource scores the classified resource against its category's open counterparts right away
+INSTANT_MATCH_ENABLED = os.getenv("INSTANT_MATCH_ENABLED", "true").lower() == "true"
+INSTANT_MATCH_CANDIDATES = int(os.getenv("INSTANT_MATCH_CANDIDATES", 5)) # Best counterparts tried, in score order, when claiming one
@@ -0,0 +1,119 @@
+# backend/python/nlp/batching.py
+
+import asyncio
+import time
+
+from config import CLASSIFY_BATCH_MAX_SIZE, CLASSIFY_BATCH_MAX_WAIT_MS, CLASSIFY_BATCH_STATS_EVERY
+from .processing import classify_resource_texts
+
+
+class ClassificationBatcher:
+    """
+    In-process micro-batching dispatcher in front of the classifier.
+
+    Concurrent classify() calls are queued and flushed together once max_batch_size
+    requests are waiting or the oldest one has waited max_wait_ms. Each flush runs one
+    batched classification (one encode, one similarity product against the category
+    matrix) and resolves every caller's future with its own result.
+    """
+
+    def __init__(self, max_batch_size: int = CLASSIFY_BATCH_MAX_SIZE, max_wait_ms: int = CLASSIFY_BATCH_MAX_WAIT_MS,
+                 run_batch=None, stats_every: int = CLASSIFY_BATCH_STATS_EVERY):
+        """
+        Args:
+            max_batch_size: Maximum number of requests per batch.
+            max_wait_ms: Maximum time a request waits for the batch to fill.
+            run_batch: Optional coroutine function taking the list of items and returning the
+                       aligned results. Defaults to calling classify_resource_texts inline.
+            stats_every: Log stats() every this many batches; 0 never logs them.
+        """
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self.run_batch = run_batch
+        self.stats_every = max(0, stats_every)
+        self._queue = None
+        self._dispatcher_task = None
+
+        # Metrics, read through stats()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_size_seen = 0
+        self.total_queue_delay = 0.0
+        self.max_queue_delay = 0.0
+
+    async def classify(self, name: str, description: str, existing_specifications: dict) -> dict:
+        """
+        Queues one resource for classification and waits for its result.
+        Raises the per-item exception if that resource could not be classified.
+        """
+        self._ensure_dispatcher()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(((name, description, existing_specifications), future, time.perf_counter()))
+        return await future
+
+    def _ensure_dispatcher(self):
+        # Bind the queue and dispatcher task to the running event loop on first use
+        if self._dispatcher_task is None or self._dispatcher_task.done():
+            self._queue = asyncio.Queue()
+            self._dispatcher_task = asyncio.get_running_loop().create_task(self._dispatch_forever())
+
+    async def _collect_batch(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _dispatch_forever(self):
+        while True:
+            batch = await self._collect_batch()
+            flushed_at = time.perf_counter()
+            items = [item for item, _, _ in batch]
+
+            queue_delays = [flushed_at - enqueued_at for _, _, enqueued_at in batch]
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch_size_seen = max(self.max_batch_size_seen, len(batch))
+            self.total_queue_delay += sum(queue_delays)
+            self.max_queue_delay = max(self.max_queue_delay, max(queue_delays))
+
+            try:
+                if self.run_batch is not None:
+                    results = await self.run_batch(items)
+                else:
+                    results = classify_resource_texts(items)
+            except Exception as e:
+                print(f"NLP Batching: Batch of {len(batch)} classifications failed: {e}")
+                results = [e] * len(batch)
+
+            for (_, future, _), result in zip(batch, results):
+                if future.done():
+                    continue # Caller was cancelled while waiting
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+            print(f"NLP Batching: Classified batch of {len(batch)} in {time.perf_counter() - flushed_at:.3f}s "
+                  f"(max queue delay {max(queue_delays) * 1000:.1f}ms).")
+            if self.stats_every and self.batches % self.stats_every == 0:
+                print(f"NLP Batching: Stats after {self.batches} batches: {self.stats()}")
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size_seen,
+            "avg_queue_delay_ms": self.total_queue_delay / self.items * 1000 if self.items else 0.0,
+            "max_queue_delay_ms": self.max_queue_delay * 1000,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
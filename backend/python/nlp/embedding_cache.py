@@ -0,0 +1,181 @@
+# backend/python/nlp/embedding_cache.py
+
+import hashlib
+import re
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from config import (
+    SENTENCE_TRANSFORMER_MODEL_NAME,
+    EMBEDDING_CACHE_MAX_BYTES,
+    EMBEDDING_CACHE_REDIS_ENABLED,
+    EMBEDDING_CACHE_REDIS_TTL_SECONDS,
+)
+
+# Prefix for all embedding keys stored in Redis
+REDIS_KEY_PREFIX = "emb"
+
+_whitespace_re = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes text before hashing and encoding, so re-posted items that only differ
+    in full-width characters or spacing share one cache entry.
+    """
+    return _whitespace_re.sub(" ", unicodedata.normalize("NFKC", text or "")).strip()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for sentence embeddings.
+
+    Tier 1 is a bounded in-process LRU, tier 2 is a Redis store shared by all worker replicas.
+    Vectors are stored as float16 bytes in both tiers and keyed by model name plus a
+    SHA-1 of the normalized text. Lookups return float32 arrays.
+    """
+
+    def __init__(self, model_name: str, max_bytes: int, redis_enabled: bool = True, redis_ttl_seconds: int = 0):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.redis_enabled = redis_enabled
+        self.redis_ttl_seconds = redis_ttl_seconds
+
+        self._entries = OrderedDict() # key -> float16 bytes, oldest first
+        self._size_bytes = 0
+        self._redis = None
+
+        # Counters, read through stats()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key_for(self, text: str) -> str:
+        digest = hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{REDIS_KEY_PREFIX}:{self.model_name}:{digest}"
+
+    # --- Redis tier ---
+    def _get_redis(self):
+        if not self.redis_enabled:
+            return None
+        if self._redis is None:
+            try:
+                # Reuse the connection the BullMQ queues already hold (imported lazily to avoid
+                # a circular import: worker -> worker.task -> nlp.processing -> this module).
+                from worker.queue import redis_connection
+                self._redis = redis_connection
+            except Exception as e:
+                print(f"NLP Embedding Cache: Redis tier unavailable, using in-process cache only: {e}")
+                self.redis_enabled = False
+                return None
+        return self._redis
+
+    # --- Local LRU tier ---
+    def _local_get(self, key: str):
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def _local_put(self, key: str, value: bytes):
+        if key in self._entries:
+            self._size_bytes -= len(self._entries.pop(key))
+        self._entries[key] = value
+        self._size_bytes += len(value)
+
+        # Size-based eviction, least recently used first
+        while self._size_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._size_bytes -= len(evicted)
+            self.evictions += 1
+
+    @staticmethod
+    def _to_bytes(vector: np.ndarray) -> bytes:
+        return np.asarray(vector, dtype=np.float16).tobytes()
+
+    @staticmethod
+    def _from_bytes(value: bytes) -> np.ndarray:
+        return np.frombuffer(value, dtype=np.float16).astype(np.float32)
+
+    # --- Public API ---
+    def get_many(self, texts: list) -> dict:
+        """
+        Looks up embeddings for texts, checking the local LRU first and then Redis.
+
+        Returns:
+            A dict mapping each cached text to its float32 vector. Missing texts are absent.
+        """
+        found = {}
+        redis_lookups = {}
+
+        for text in texts:
+            key = self.key_for(text)
+            value = self._local_get(key)
+            if value is not None:
+                found[text] = self._from_bytes(value)
+                self.local_hits += 1
+            else:
+                redis_lookups[text] = key
+
+        redis_client = self._get_redis() if redis_lookups else None
+        if redis_client is not None:
+            try:
+                values = redis_client.mget(list(redis_lookups.values()))
+                for (text, key), value in zip(redis_lookups.items(), values):
+                    if value is not None:
+                        self._local_put(key, value) # Promote into the local tier
+                        found[text] = self._from_bytes(value)
+                        self.redis_hits += 1
+            except Exception as e:
+                print(f"NLP Embedding Cache: Redis lookup failed for {len(redis_lookups)} keys: {e}")
+
+        self.misses += len(texts) - len(found)
+        return found
+
+    def put_many(self, embeddings: dict):
+        """Stores a dict of text -> vector in both tiers."""
+        if not embeddings:
+            return
+
+        redis_client = self._get_redis()
+        pipeline = redis_client.pipeline(transaction=False) if redis_client is not None else None
+
+        for text, vector in embeddings.items():
+            key = self.key_for(text)
+            value = self._to_bytes(vector)
+            self._local_put(key, value)
+            if pipeline is not None:
+                if self.redis_ttl_seconds > 0:
+                    pipeline.set(key, value, ex=self.redis_ttl_seconds)
+                else:
+                    pipeline.set(key, value)
+
+        if pipeline is not None:
+            try:
+                pipeline.execute()
+            except Exception as e:
+                print(f"NLP Embedding Cache: Redis write failed for {len(embeddings)} keys: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.local_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "size_bytes": self._size_bytes,
+        }
+
+
+# Process-wide cache used by nlp/processing.py
+embedding_cache = EmbeddingCache(
+    SENTENCE_TRANSFORMER_MODEL_NAME,
+    max_bytes=EMBEDDING_CACHE_MAX_BYTES,
+    redis_enabled=EMBEDDING_CACHE_REDIS_ENABLED,
+    redis_ttl_seconds=EMBEDDING_CACHE_REDIS_TTL_SECONDS,
+)
@@ -0,0 +1,311 @@
+# backend/python/nlp/errand_scoring.py
+#
+# Vectorized form of calculate_match_score (nlp/processing.py) for scoring one
+# service-request against many service-offers. The offers and their runner profiles are
+# turned once into typed arrays (location codes, an interval index of every time slot,
+# equipment bitmasks), each request once into the same codes, and the score of every
+# rule is then computed for all offers with NumPy. The scores equal calculate_match_score's,
+# which stays the reference implementation (see tests/test_errand_scoring.py).
+
+import datetime
+
+import numpy as np
+
+NO_CODE = -1 # Code of an empty / missing string
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def _lowered(value) -> str:
+    return value.lower() if isinstance(value, str) else ''
+
+
+def parse_timestamp(value) -> datetime.datetime:
+    """
+    Parses an errand timestamp into an aware datetime, as both errand scorers read them:
+    ISO 8601 strings, including JavaScript's toISOString() 'Z' suffix (which
+    datetime.fromisoformat only accepts from Python 3.11), or datetimes. Naive values are
+    read as UTC. Raises ValueError for anything else.
+    """
+    if isinstance(value, datetime.datetime):
+        parsed = value
+    elif isinstance(value, str):
+        if value[-1:] in ('Z', 'z'):
+            value = value[:-1] + '+00:00'
+        parsed = datetime.datetime.fromisoformat(value)
+    else:
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+def _epoch_microseconds(value) -> int:
+    return (parse_timestamp(value) - _EPOCH) // _MICROSECOND
+
+
+def _parse_interval(start, end) -> tuple:
+    """(start, end) in epoch microseconds, or None when either is missing or can't be parsed."""
+    if not start or not end:
+        return None
+    try:
+        return _epoch_microseconds(start), _epoch_microseconds(end)
+    except ValueError as e:
+        print(f"Warning: Could not parse datetime for time matching. Error: {e}")
+        return None
+
+
+class Vocabulary:
+    """Assigns consecutive integer codes to (lowercased) strings."""
+
+    def __init__(self):
+        self.codes = {}
+
+    def code(self, value: str) -> int:
+        if not value:
+            return NO_CODE
+        return self.codes.setdefault(value, len(self.codes))
+
+    def lookup(self, value: str) -> int:
+        # Like code(), but strings no offer uses get NO_CODE instead of a new code
+        return self.codes.get(value, NO_CODE) if value else NO_CODE
+
+
+class TimeSlotIndex:
+    """
+    Interval index over the time slots of all offers (epoch microseconds, end exclusive).
+
+    Slots are grouped by duration into power-of-two buckets, each sorted by start. A slot
+    overlapping [start, end) begins before end and, being at most the bucket's longest
+    duration long, after start - that duration, so each bucket is searched with two
+    bisections and then only scans slots starting in that window: O(buckets * log n + k)
+    per query, where k stays close to the number of overlapping slots.
+    """
+
+    def __init__(self, slot_offers, slot_starts, slot_ends):
+        """
+        Args:
+            slot_offers: Offer position of each slot.
+            slot_starts, slot_ends: Bounds of each slot; slots with end <= start are left out.
+        """
+        slot_offers = np.asarray(slot_offers, dtype=np.int64)
+        slot_starts = np.asarray(slot_starts, dtype=np.int64)
+        slot_ends = np.asarray(slot_ends, dtype=np.int64)
+        durations = slot_ends - slot_starts
+        valid = durations > 0
+        slot_offers, slot_starts, slot_ends, durations = slot_offers[valid], slot_starts[valid], slot_ends[valid], durations[valid]
+
+        self.slot_count = len(slot_starts)
+        self.buckets = [] # (starts, ends, offers, longest duration), starts ascending
+        duration_classes = np.floor(np.log2(durations)).astype(np.int64) if self.slot_count else durations
+        for duration_class in np.unique(duration_classes):
+            in_bucket = np.flatnonzero(duration_classes == duration_class)
+            in_bucket = in_bucket[np.argsort(slot_starts[in_bucket], kind='stable')]
+            self.buckets.append((slot_starts[in_bucket], slot_ends[in_bucket], slot_offers[in_bucket], int(durations[in_bucket].max())))
+
+    def overlaps(self, start: int, end: int) -> tuple:
+        """
+        Slots overlapping [start, end).
+
+        Returns:
+            (offer positions, overlap lengths) of the overlapping slots; an offer appears
+            once per overlapping slot.
+        """
+        offers = []
+        overlap_lengths = []
+        for bucket_starts, bucket_ends, bucket_offers, longest_duration in self.buckets:
+            first = np.searchsorted(bucket_starts, start - longest_duration, side='right')
+            last = np.searchsorted(bucket_starts, end, side='left')
+            if first >= last:
+                continue
+            lengths = np.minimum(bucket_ends[first:last], end) - np.maximum(bucket_starts[first:last], start)
+            overlapping = lengths > 0
+            offers.append(bucket_offers[first:last][overlapping])
+            overlap_lengths.append(lengths[overlapping])
+        if not offers:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(offers), np.concatenate(overlap_lengths)
+
+
+class OfferFeatures:
+    """
+    Typed arrays describing (service-offer, runner profile) pairs, in the given order.
+
+    Attributes:
+        availability_codes: Location code of each offer's availabilityCampusZone; request
+                            buildings and campus zones are coded with the same vocabulary.
+        runner_zone_offers: Location code -> boolean mask of the offers whose runner lists
+                            that zone in operatingCampusZones.
+        time_slots: TimeSlotIndex over every offer's availableTimeSlots.
+        door_delivery: Whether the runner can do door delivery.
+        equipment_masks: (offers, words) uint64 bitmask of each runner's specialEquipment.
+        cargo_codes: Index of each runner's cargoCapacityDescription in cargo_capacities.
+    """
+
+    def __init__(self, scorable_offers: list):
+        """
+        Args:
+            scorable_offers: (service-offer Resource document, RunnerProfile document) pairs.
+        """
+        offer_count = len(scorable_offers)
+        self.offer_count = offer_count
+        self.locations = Vocabulary()
+        self.equipment = Vocabulary()
+        self.availability_codes = np.full(offer_count, NO_CODE, dtype=np.int32)
+        self.runner_zone_offers = {}
+        self.door_delivery = np.zeros(offer_count, dtype=bool)
+        self.cargo_codes = np.full(offer_count, NO_CODE, dtype=np.int32)
+        cargo_vocabulary = Vocabulary()
+        equipment_lists = []
+        slot_offers, slot_starts, slot_ends = [], [], []
+
+        for position, (offer_resource, runner_profile) in enumerate(scorable_offers):
+            offer_specs = offer_resource.get('specifications') or {}
+
+            # --- Location ---
+            self.availability_codes[position] = self.locations.code(_lowered(offer_specs.get('availabilityCampusZone')))
+            for campus_zone in runner_profile.get('operatingCampusZones') or []:
+                zone_code = self.locations.code(_lowered(campus_zone))
+                if zone_code != NO_CODE:
+                    self.runner_zone_offers.setdefault(zone_code, np.zeros(offer_count, dtype=bool))[position] = True
+
+            # --- Time (every slot, parsed once) ---
+            for time_slot in offer_specs.get('availableTimeSlots') or []:
+                if not isinstance(time_slot, dict):
+                    continue
+                interval = _parse_interval(time_slot.get('start'), time_slot.get('end'))
+                if interval is not None:
+                    slot_offers.append(position)
+                    slot_starts.append(interval[0])
+                    slot_ends.append(interval[1])
+
+            # --- Capabilities ---
+            special_equipment = runner_profile.get('specialEquipment') or []
+            self.door_delivery[position] = (
+                'door-delivery' in special_equipment or runner_profile.get('vehicleType') in ['foot', 'bicycle']
+            )
+            equipment_lists.append([self.equipment.code(item) for item in special_equipment if isinstance(item, str)])
+            cargo_capacity = runner_profile.get('cargoCapacityDescription')
+            if isinstance(cargo_capacity, str):
+                self.cargo_codes[position] = cargo_vocabulary.code(cargo_capacity.lower())
+
+        self.time_slots = TimeSlotIndex(slot_offers, slot_starts, slot_ends)
+        self.cargo_capacities = list(cargo_vocabulary.codes)
+        self.equipment_masks = np.zeros((offer_count, max(1, -(-len(self.equipment.codes) // 64))), dtype=np.uint64)
+        for position, equipment_codes in enumerate(equipment_lists):
+            for equipment_code in equipment_codes:
+                if equipment_code != NO_CODE:
+                    self.equipment_masks[position, equipment_code // 64] |= np.uint64(1 << (equipment_code % 64))
+
+
+def request_features(request_resource: dict, offer_features: OfferFeatures) -> dict:
+    """Codes of one service-request in the vocabularies of offer_features."""
+    request_specs = request_resource.get('specifications') or {}
+    locations = offer_features.locations
+    from_address = request_specs.get('from_address') or {}
+    to_address = request_specs.get('to_address') or {}
+
+    # Required equipment no runner has can never be satisfied
+    required_equipment = request_specs.get('requiredEquipment')
+    required_mask = None
+    if required_equipment and isinstance(required_equipment, list):
+        required_mask = np.zeros(offer_features.equipment_masks.shape[1], dtype=np.uint64)
+        for item in required_equipment:
+            equipment_code = offer_features.equipment.lookup(item) if isinstance(item, str) else NO_CODE
+            if equipment_code == NO_CODE:
+                required_mask = False
+                break
+            required_mask[equipment_code // 64] |= np.uint64(1 << (equipment_code % 64))
+
+    item_details = request_specs.get('item_details') or {}
+    cargo_description = item_details.get('size') or item_details.get('weightDescription')
+
+    return {
+        'pickup_building': locations.lookup(_lowered(from_address.get('buildingName'))),
+        'dropoff_building': locations.lookup(_lowered(to_address.get('buildingName'))),
+        'pickup_zone': locations.lookup(_lowered(from_address.get('campusZone'))),
+        'dropoff_zone': locations.lookup(_lowered(to_address.get('campusZone'))),
+        'interval': _parse_interval(request_specs.get('expectedStartTime'), request_specs.get('expectedEndTime')),
+        'door_delivery': request_specs.get('door_delivery') is True,
+        'cargo_description': cargo_description.lower() if isinstance(cargo_description, str) and cargo_description else None,
+        'required_mask': required_mask,
+    }
+
+
+def calculate_match_scores(request: dict, offer_features: OfferFeatures, positions=None) -> np.ndarray:
+    """
+    calculate_match_score of one request (see request_features) against many offers.
+
+    Args:
+        request: The request's features.
+        offer_features: The offers' features.
+        positions: Positions of the offers to score; defaults to all of them.
+
+    Returns:
+        int64 scores aligned with positions.
+    """
+    if positions is None:
+        positions = np.arange(offer_features.offer_count)
+    positions = np.asarray(positions, dtype=np.int64)
+    scores = np.zeros(len(positions), dtype=np.int64)
+    if len(positions) == 0:
+        return scores
+
+    # --- 1. Location Matching ---
+    availability_codes = offer_features.availability_codes[positions]
+    building_match = np.zeros(len(positions), dtype=bool)
+    for building_code in (request['pickup_building'], request['dropoff_building']):
+        if building_code != NO_CODE:
+            building_match |= availability_codes == building_code
+
+    in_runner_zone = np.zeros(len(positions), dtype=bool)
+    offer_in_request_zone = np.zeros(len(positions), dtype=bool)
+    for zone_code in (request['pickup_zone'], request['dropoff_zone']):
+        if zone_code != NO_CODE:
+            if zone_code in offer_features.runner_zone_offers:
+                in_runner_zone |= offer_features.runner_zone_offers[zone_code][positions]
+            offer_in_request_zone |= availability_codes == zone_code
+
+    scores += np.where(building_match, 50, np.where(in_runner_zone, np.where(offer_in_request_zone, 30, 20), 0))
+
+    # --- 2. Time Matching (best overlap over all of an offer's slots) ---
+    if request['interval'] is not None:
+        best_overlaps = best_slot_overlaps(request['interval'], offer_features, positions)
+        scores += np.where(best_overlaps > 0, 20, 0)
+
+    # --- 3. Capability Matching ---
+    if request['door_delivery']:
+        scores += np.where(offer_features.door_delivery[positions], 15, -10)
+
+    if request['cargo_description'] is not None and offer_features.cargo_capacities:
+        # Substring test once per distinct capacity description, then looked up per offer
+        capacity_matches = np.array(
+            [request['cargo_description'] in capacity for capacity in offer_features.cargo_capacities] + [False]
+        )
+        scores += np.where(capacity_matches[offer_features.cargo_codes[positions]], 5, 0) # NO_CODE picks the trailing False
+
+    required_mask = request['required_mask']
+    if required_mask is False:
+        scores -= 5
+    elif required_mask is not None:
+        equipment_masks = offer_features.equipment_masks[positions]
+        has_all_required = np.all((equipment_masks & required_mask) == required_mask, axis=1)
+        scores += np.where(has_all_required, 10, -5)
+
+    return np.maximum(scores, 0)
+
+
+def best_slot_overlaps(interval: tuple, offer_features: OfferFeatures, positions) -> np.ndarray:
+    """
+    Longest overlap (microseconds) of each offer's time slots with interval, aligned with
+    positions (0 where no slot overlaps). Only the overlapping slots are visited.
+    """
+    slot_offers, overlap_lengths = offer_features.time_slots.overlaps(*interval)
+    if len(slot_offers) == 0:
+        return np.zeros(len(positions), dtype=np.int64)
+
+    # Best overlap per offer, then picked for positions (which may be any subset, in any order, with repeats)
+    best_overlaps = np.zeros(offer_features.offer_count, dtype=np.int64)
+    np.maximum.at(best_overlaps, slot_offers, overlap_lengths)
+    return best_overlaps[positions]
@@ -1,9 +1,12 @@
 # backend/python/nlp/models.py
 
-import spacy
-from sentence_transformers import SentenceTransformer
+import time
 from config import SPACY_MODEL_NAME, TRANSFORMER_MODEL_NAME, SENTENCE_TRANSFORMER_MODEL_NAME
-import os
+
+# Models are loaded lazily, on the first job that needs them.
+# spacy, sentence_transformers (and through them torch) are only imported inside the
+# loaders, so processes that never classify or score names (the scheduler, the queue
+# module, cleanup and auto-complete jobs) never pay for them.
 
 # --- Global variables for loaded models ---
 nlp_pipeline = None
@@ -14,7 +17,9 @@ def load_nlp_pipeline():
     global nlp_pipeline
     if nlp_pipeline is None:
         print("NLP Models: Loading multilingual spaCy pipeline...")
+        started_at = time.perf_counter()
         try:
+            import spacy
             nlp = spacy.blank(SPACY_MODEL_NAME)
             # Ensure spacy-transformers is installed in this Python environment
             nlp.add_pipe("transformer", config={"model": {"name": TRANSFORMER_MODEL_NAME}})
@@ -22,7 +27,7 @@ def load_nlp_pipeline():
             # nlp.add_pipe("ner") # Add NER component if you have a transformer-based NER model or plan to train one
 
             nlp_pipeline = nlp
-            print("NLP Models: SpaCy pipeline loaded successfully.")
+            print(f"NLP Models: SpaCy pipeline loaded successfully in {time.perf_counter() - started_at:.2f}s.")
         except Exception as e:
             print(f"NLP Models: Error loading spaCy pipeline: {e}")
             # Depending on environment, you might want to raise the exception
@@ -36,24 +41,36 @@ def load_sentence_transformer_model():
     global sentence_transformer_model
     if sentence_transformer_model is None:
         print("NLP Models: Loading Sentence Transformer model...")
+        started_at = time.perf_counter()
         try:
+            from sentence_transformers import SentenceTransformer
             # This will download the model files the first time
             model = SentenceTransformer(SENTENCE_TRANSFORMER_MODEL_NAME)
             sentence_transformer_model = model
-            print("NLP Models: Sentence Transformer model loaded successfully.")
+            print(f"NLP Models: Sentence Transformer model loaded successfully in {time.perf_counter() - started_at:.2f}s.")
         except Exception as e:
             print(f"NLP Models: Error loading Sentence Transformer model: {e}")
             sentence_transformer_model = None
             raise # Re-raise the exception
 
 
-# --- Call loading functions when this module is imported ---
-# This ensures models are loaded when the worker process that imports this module starts
-# Handle potential errors if models fail to load
-try:
-    load_nlp_pipeline()
-    load_sentence_transformer_model()
-except Exception as e:
-    print("NLP Models: One or more NLP models failed to load on startup.")
-    # The worker should handle the case where models are not loaded
-    # Jobs requiring NLP might fail if models are None
+# --- On-demand accessors ---
+# Callers use these instead of the globals. They load the model on first use and
+# return None if loading fails, so jobs can fall back the same way they did when
+# a model failed to load at import time.
+def get_nlp_pipeline():
+    if nlp_pipeline is None:
+        try:
+            load_nlp_pipeline()
+        except Exception:
+            print("NLP Models: spaCy pipeline is unavailable.")
+    return nlp_pipeline
+
+
+def get_sentence_transformer_model():
+    if sentence_transformer_model is None:
+        try:
+            load_sentence_transformer_model()
+        except Exception:
+            print("NLP Models: Sentence Transformer model is unavailable.")
+    return sentence_transformer_model
@@ -1,14 +1,20 @@
 # backend/python/nlp/processing.py
 
-from .models import nlp_pipeline, sentence_transformer_model # Import loaded models
+from .models import get_nlp_pipeline, get_sentence_transformer_model # Models are loaded on first use
 import re
 import numpy as np # Using numpy for matrix creation can be efficient, or use list of lists
 import sys # To potentially import sys.maxsize if needed for initialization (not strictly needed for this basic version)
 import datetime
+from config import EMBEDDING_BATCH_SIZE
+from .embedding_cache import embedding_cache, normalize_text
+from .taxonomy import load_taxonomy, load_or_build_category_embeddings
+from .errand_scoring import parse_timestamp # Errand timestamps, shared with the vectorized errand scorer
 
 # Define categories and precomputed embeddings
-categories = ["Electronics", "Books", "Errands", "Furniture"]
-category_embeddings = np.array([sentence_transformer_model.encode([cat])[0] for cat in categories])
+# Categories come from the taxonomy file (CATEGORY_TAXONOMY_PATH); their embedding matrix is
+# stored on disk and memory-mapped on first classification, see get_category_embeddings()
+categories = load_taxonomy()
+category_embeddings = None
 
 # Subcategories for errands
 ERRAND_CATEGORIES = {
@@ -46,15 +52,16 @@ def classify_resource_text(name: str, description: str, existing_specifications:
         # 1. Broad Category Classification (using Sentence Embeddings)
         # This step initially identifies the broad category (e.g., "Errands", "Electronics").
         # Using YOUR 'sentence_transformer_model'
-        if sentence_transformer_model is None or category_embeddings is None:
+        category_embeddings = get_category_embeddings()
+        if category_embeddings is None:
             print("NLP: SentenceTransformer model or embeddings not loaded. Skipping broad classification.")
             broad_category_from_nlp = "ClassificationError" # Assign error category if model is not ready
         else:
             try:
-                embedding = sentence_transformer_model.encode([text])[0]
-                similarities = np.dot(category_embeddings, embedding) / (
-                    np.linalg.norm(category_embeddings, axis=1) * np.linalg.norm(embedding)
-                )
+                embedding = encode_texts([text])[0]
+                # Both the category matrix and the text embedding are L2-normalized,
+                # so the dot product is the cosine similarity
+                similarities = category_embeddings @ embedding
                 best_match = np.argmax(similarities)
                 broad_category_from_nlp = categories[best_match] # e.g., "Errands", "Electronics"
                 print(f"NLP: Classified as broad category: {broad_category_from_nlp}")
@@ -73,7 +80,7 @@ def classify_resource_text(name: str, description: str, existing_specifications:
         if broad_category_from_nlp == "Errands":
             print("NLP: Broad category is 'Errands'. Performing granular classification...")
             # Using YOUR 'spacy_nlp'
-            if spacy_nlp is None:
+            if get_nlp_pipeline() is None:
                 print("NLP: Spacy model not loaded. Cannot perform granular errand classification or extract fuzzy specs.")
                 final_category_for_resource = "misc" # Fallback to default granular type on error
             else:
@@ -130,8 +137,110 @@ def classify_resource_text(name: str, description: str, existing_specifications:
             "specifications": existing_specifications # Retain existing specs even on error
         }
 
-def classify_errand_subcategory(text: str) -> str:
-    doc = spacy_nlp(text.lower())
+# --- Batch classification ---
+# Categories whose spec extraction runs the spaCy pipeline over the raw text
+_REGEX_SPEC_CATEGORIES = ("Electronics", "Errands", "Books")
+
+def classify_resource_texts(items: list) -> list:
+    """
+    Batch version of classify_resource_text for many resources at once.
+    All texts are encoded together and scored against the category matrix with one
+    matrix product, and the spaCy pipeline runs once over each group of texts via nlp.pipe.
+
+    Args:
+        items: A list of (name, description, existing_specifications) tuples.
+
+    Returns:
+        A list aligned with items. Each entry is the dictionary classify_resource_text
+        would return, or an Exception for an item that could not be classified (no broad
+        category, or an error while classifying it), so one bad resource does not fail the
+        whole batch.
+    """
+    if not items:
+        return []
+
+    print(f"NLP: Starting batch classification of {len(items)} resources...")
+    texts = [f"{name or ''} {description or ''}".strip() for name, description, _ in items]
+
+    # 1. Broad Category Classification for the whole batch
+    broad_categories = ["ClassificationError"] * len(items)
+    broad_classification_error = None # Why the batch has no broad categories, reported for every item
+    category_embeddings = get_category_embeddings()
+    if category_embeddings is None:
+        print("NLP: SentenceTransformer model or embeddings not loaded. Skipping broad classification.")
+        broad_classification_error = "SentenceTransformer model or category embeddings not loaded"
+    else:
+        try:
+            embeddings = encode_texts(texts)
+            best_matches = np.argmax(embeddings @ np.asarray(category_embeddings).T, axis=1)
+            broad_categories = [categories[best_match] for best_match in best_matches]
+        except Exception as e:
+            print(f"NLP: Error during batch broad category classification: {e}")
+            broad_classification_error = f"Broad category classification failed: {e}"
+
+    # 2. Run spaCy once per group of texts that needs it
+    errand_indices = [i for i, category in enumerate(broad_categories) if category == "Errands"]
+    general_indices = [i for i, category in enumerate(broad_categories)
+                       if category != "ClassificationError" and category not in _REGEX_SPEC_CATEGORIES]
+    errand_docs = {}
+    general_docs = {}
+    if errand_indices or general_indices:
+        nlp = get_nlp_pipeline()
+        if nlp is not None:
+            try:
+                errand_docs = dict(zip(errand_indices, nlp.pipe([texts[i].lower() for i in errand_indices])))
+                general_docs = dict(zip(general_indices, nlp.pipe([texts[i] for i in general_indices])))
+            except Exception as e:
+                print(f"NLP: Error running spaCy pipeline over the batch: {e}")
+
+    # 3. Per-item granular classification, spec extraction and merging
+    results = []
+    for i, (name, description, existing_specifications) in enumerate(items):
+        if broad_categories[i] == "ClassificationError":
+            # Reported as a failure, so the caller marks the resource 'classification_failed'
+            results.append(RuntimeError(broad_classification_error or "Broad category classification failed"))
+            continue
+        try:
+            final_category_for_resource = broad_categories[i]
+            extracted_fuzzy_specs = {}
+
+            if broad_categories[i] == "Errands":
+                if i not in errand_docs:
+                    final_category_for_resource = "misc" # Spacy unavailable, fall back to default granular type
+                else:
+                    try:
+                        final_category_for_resource = classify_errand_subcategory(texts[i], errand_docs[i])
+                        extracted_fuzzy_specs.update(extract_errand_specs(texts[i]))
+                    except Exception as e:
+                        print(f"NLP: Error during granular errand classification or spec extraction: {e}")
+                        final_category_for_resource = "misc"
+                        extracted_fuzzy_specs = {}
+
+            else:
+                try:
+                    extracted_fuzzy_specs = extract_specs_by_category(
+                        broad_categories[i], name, description, general_docs.get(i)
+                    )
+                except Exception as e:
+                    print(f"NLP: Error during non-Errand spec extraction: {e}")
+                    extracted_fuzzy_specs = {}
+
+            # User-provided specifications take priority over extracted ones
+            results.append({
+                "category": final_category_for_resource,
+                "specifications": {**extracted_fuzzy_specs, **(existing_specifications or {})},
+            })
+        except Exception as e:
+            print(f"NLP: Error classifying item {i} of batch: {e}")
+            results.append(e)
+
+    print(f"NLP: Batch classification complete for {len(items)} resources.")
+    return results
+
+def classify_errand_subcategory(text: str, doc=None) -> str:
+    # doc: optional precomputed spaCy doc of text.lower() (e.g. from nlp.pipe in batch classification)
+    if doc is None:
+        doc = get_nlp_pipeline()(text.lower())
     tokens = [token.text for token in doc if not token.is_stop]
 
     score = {cat: 0 for cat in ERRAND_CATEGORIES}
@@ -144,7 +253,7 @@ def classify_errand_subcategory(text: str) -> str:
     best = max(score, key=score.get)
     return best if score[best] > 0 else "misc"
 
-def extract_specs_by_category(category: str, name: str, description: str) -> dict:
+def extract_specs_by_category(category: str, name: str, description: str, doc=None) -> dict:
     text = f"{name} {description}".strip()
 
     if category == "Electronics":
@@ -154,7 +263,7 @@ def extract_specs_by_category(category: str, name: str, description: str) -> dic
     elif category == "Books":
         return extract_book_specs(text)
     else:
-        return extract_general_specs(text)
+        return extract_general_specs(text, doc)
 
 def extract_electronic_specs(text: str) -> dict:
     specs = {}
@@ -275,10 +384,11 @@ def extract_book_specs(text: str) -> dict:
         specs["edition"] = edition_match.group(1)
     return specs
 
-def extract_general_specs(text: str) -> dict:
+def extract_general_specs(text: str, doc=None) -> dict:
   specs = {}
   try:
-      doc = nlp_pipeline(text)
+      if doc is None:
+          doc = get_nlp_pipeline()(text)
       for ent in doc.ents:
           if ent.label_ in ["CARDINAL", "QUANTITY", "PRODUCT"]:
               key = ent.label_.lower()
@@ -290,29 +400,117 @@ def extract_general_specs(text: str) -> dict:
       print(f"NLP: Failed to extract general specs: {e}")
   return specs
 
+# --- Lazily encoded category embeddings ---
+def get_category_embeddings():
+    """
+    Returns the normalized category embedding matrix, memory-mapped from its .npy file.
+    The file is only rebuilt (which loads the model) when the taxonomy or model changes.
+    Returns None if it cannot be loaded or built.
+    """
+    global category_embeddings
+    if category_embeddings is None:
+        try:
+            category_embeddings = load_or_build_category_embeddings(categories, encode_texts)
+        except Exception as e:
+            print(f"NLP Processing: Could not encode category embeddings: {e}")
+            return None
+    return category_embeddings
+
+
+# --- Batched encoding helpers ---
+def encode_texts(texts: list) -> np.ndarray:
+    """
+    Encodes a list of texts with the Sentence Transformer in large batches and
+    L2-normalizes the result, so a plain dot product between two rows is their cosine similarity.
+    Texts already seen by this or another worker are served from the embedding cache.
+
+    Args:
+        texts: The texts to encode. Callers should de-duplicate them first.
+
+    Returns:
+        A float32 array of shape (len(texts), embedding_dim).
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    # Serve what we can from the embedding cache and only run the model on the misses
+    vectors = embedding_cache.get_many(texts)
+    missing_texts = list(dict.fromkeys(text for text in texts if text not in vectors))
+
+    if missing_texts:
+        sentence_transformer_model = get_sentence_transformer_model()
+        if sentence_transformer_model is None:
+            raise RuntimeError("Sentence Transformer model not loaded.")
+        encoded = sentence_transformer_model.encode(
+            [normalize_text(text) for text in missing_texts],
+            batch_size=EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        # Keep fresh vectors at the cache's float16 precision, so a text gets the same vector
+        # whether it was just encoded or served from the cache (by any process or shard)
+        new_vectors = dict(zip(missing_texts, np.asarray(encoded, dtype=np.float16).astype(np.float32)))
+        embedding_cache.put_many(new_vectors)
+        vectors.update(new_vectors)
+
+    embeddings = np.stack([vectors[text] for text in texts]).astype(np.float32, copy=False)
+    # Re-normalize, as the float16 round trip through the cache shifts norms slightly
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms == 0, 1, norms)
+
+
+def calculate_name_similarity_matrix(names_a: list, names_b: list) -> np.ndarray:
+    """
+    Calculates the pairwise semantic similarity between two lists of names.
+    Every distinct non-empty name is encoded exactly once, and all scores come
+    from a single matrix product of the normalized embeddings.
+
+    Args:
+        names_a: Names of the first side (e.g. buyers), one per resource.
+        names_b: Names of the second side (e.g. sellers), one per resource.
+
+    Returns:
+        A (len(names_a), len(names_b)) float32 array of cosine similarities.
+        Pairs where either name is missing score 0, as in the single-pair version.
+    """
+    similarity_matrix = np.zeros((len(names_a), len(names_b)), dtype=np.float32)
+
+    # Map every distinct name to a row of the embedding matrix
+    distinct_names = list(dict.fromkeys(name for name in list(names_a) + list(names_b) if name))
+    if not distinct_names:
+        return similarity_matrix
+    name_rows = {name: row for row, name in enumerate(distinct_names)}
+
+    try:
+        embeddings = encode_texts(distinct_names)
+    except Exception as e:
+        print(f"NLP Processing: Error batch-encoding {len(distinct_names)} names for semantic similarity: {e}")
+        return similarity_matrix
+
+    rows_a = np.array([name_rows.get(name, -1) if name else -1 for name in names_a], dtype=np.int64)
+    rows_b = np.array([name_rows.get(name, -1) if name else -1 for name in names_b], dtype=np.int64)
+    valid_a = rows_a >= 0
+    valid_b = rows_b >= 0
+
+    if valid_a.any() and valid_b.any():
+        scores = embeddings[rows_a[valid_a]] @ embeddings[rows_b[valid_b]].T
+        similarity_matrix[np.ix_(valid_a, valid_b)] = scores
+
+    return similarity_matrix
+
+
 # --- Function to calculate Semantic Similarity for Names ---
 def calculate_name_semantic_similarity(name1: str, name2: str) -> float:
     """
     Calculates semantic similarity between two names using Sentence Transformers.
     Returns a score between -1 and 1.
+    Prefer calculate_name_similarity_matrix when scoring many pairs.
     """
-    if sentence_transformer_model is None:
-        print("NLP Processing: Sentence Transformer model not loaded. Cannot calculate semantic similarity.")
-        return 0.0 # Return 0 if model not loaded
-
     if not name1 or not name2:
         return 0.0 # Return 0 if names are missing
 
-    try:
-        # Calculate embeddings
-        embeddings = sentence_transformer_model.encode([name1, name2], convert_to_numpy=True)
-        # Calculate cosine similarity
-        similarity = sentence_transformerModel.similarity(embeddings[0], embeddings[1])
-        return float(similarity) # Return as float
-
-    except Exception as e:
-        print(f"NLP Processing: Error calculating semantic similarity for '{name1}' and '{name2}': {e}")
-        return 0.0 # Return 0 if error occurs
+    return float(calculate_name_similarity_matrix([name1], [name2])[0, 0])
 
 
 # --- Include your levenshteinDistance function here or import it ---
@@ -371,6 +569,136 @@ def levenshteinDistance(s1: str, s2: str) -> int:
     # The final distance is in the bottom-right cell of the matrix
     return matrix[len1][len2]
 
+
+# --- Thresholded Levenshtein distance ---
+# Matching only rewards names within a small edit distance of each other, so the
+# distances below stop as soon as the result is known to exceed max_distance and
+# return max_distance + 1 for every such pair.
+def bounded_levenshtein_distance(s1: str, s2: str, max_distance: int) -> int:
+    """
+    Calculates the Levenshtein distance between two strings, capped at max_distance + 1.
+
+    Only the diagonal band of width 2 * max_distance + 1 of the distance matrix is
+    computed, and the computation stops once every cell of a row exceeds max_distance.
+
+    Args:
+        s1: The first string.
+        s2: The second string.
+        max_distance: The largest distance that needs to be reported exactly.
+
+    Returns:
+        The Levenshtein distance if it is <= max_distance, otherwise max_distance + 1.
+    """
+    cap = max_distance + 1
+    len1 = len(s1)
+    len2 = len(s2)
+
+    # Strings whose lengths differ by more than max_distance can't be within it
+    if abs(len1 - len2) > max_distance:
+        return cap
+    if s1 == s2:
+        return 0
+    if not s1 or not s2:
+        return min(len1 + len2, cap)
+
+    # previous_row[j] is the distance between the first i - 1 characters of s1 and the
+    # first j characters of s2; cells outside the band are treated as cap.
+    previous_row = [min(j, cap) for j in range(len2 + 1)]
+    for i in range(1, len1 + 1):
+        current_row = [cap] * (len2 + 1)
+        if i <= max_distance:
+            current_row[0] = i
+        band_start = max(1, i - max_distance)
+        band_end = min(len2, i + max_distance)
+        char1 = s1[i - 1]
+        row_min = current_row[band_start - 1]
+        for j in range(band_start, band_end + 1):
+            cost = 0 if char1 == s2[j - 1] else 1
+            value = min(
+                previous_row[j] + 1,          # Deletion
+                current_row[j - 1] + 1,       # Insertion
+                previous_row[j - 1] + cost,   # Substitution
+                cap,
+            )
+            current_row[j] = value
+            if value < row_min:
+                row_min = value
+        # Distances never decrease along the band, so the final one exceeds max_distance too
+        if row_min >= cap:
+            return cap
+        previous_row = current_row
+
+    return previous_row[len2]
+
+
+def bounded_levenshtein_distances(name: str, names: list, max_distance: int) -> np.ndarray:
+    """
+    Calculates the capped Levenshtein distance from one name to many names at once.
+
+    Names whose length differs from `name` by more than max_distance are skipped and
+    repeated names are computed once. The remaining names are encoded into a padded
+    NumPy code point matrix and the banded distance rows are computed for all of them
+    together, one row per character of `name`.
+
+    Args:
+        name: The string to compare against every entry of names.
+        names: The strings to compare with (None is treated as an empty string).
+        max_distance: The largest distance that needs to be reported exactly.
+
+    Returns:
+        An int32 array aligned with names holding the distance, or max_distance + 1
+        where it exceeds max_distance.
+    """
+    cap = max_distance + 1
+    distances = np.full(len(names), cap, dtype=np.int32)
+    name_length = len(name)
+
+    # Distinct candidate names within the length window, with their positions in names
+    positions_by_name = {}
+    for position, other in enumerate(names):
+        other = other or ''
+        if abs(len(other) - name_length) <= max_distance:
+            positions_by_name.setdefault(other, []).append(position)
+    if not positions_by_name:
+        return distances
+
+    candidates = list(positions_by_name)
+    lengths = np.array([len(candidate) for candidate in candidates], dtype=np.int64)
+    width = int(lengths.max())
+    codes = np.full((len(candidates), width), -1, dtype=np.int64)
+    for row, candidate in enumerate(candidates):
+        codes[row, :len(candidate)] = [ord(char) for char in candidate]
+
+    # rows[:, j] holds the distances to the first j characters of every candidate, capped at cap
+    rows = np.minimum(np.arange(width + 1, dtype=np.int64), cap)[np.newaxis, :].repeat(len(candidates), axis=0)
+    exceeded = False
+    for i in range(1, name_length + 1):
+        band_start = max(1, i - max_distance)
+        band_end = min(width, i + max_distance)
+
+        substitution = rows[:, band_start - 1:band_end] + (codes[:, band_start - 1:band_end] != ord(name[i - 1]))
+        deletion = rows[:, band_start:band_end + 1] + 1
+        band = np.empty((len(candidates), band_end - band_start + 2), dtype=np.int64)
+        band[:, 0] = i if i <= max_distance else cap
+        np.minimum(substitution, deletion, out=band[:, 1:])
+
+        # Insertions chain along the row: cell j is min over t <= j of band[t] + (j - t)
+        offsets = np.arange(band.shape[1], dtype=np.int64)
+        band = np.minimum.accumulate(band - offsets, axis=1) + offsets
+        np.minimum(band, cap, out=band)
+
+        rows = np.full_like(rows, cap)
+        rows[:, band_start - 1:band_end + 1] = band
+        if band.min() >= cap:
+            exceeded = True # No candidate can come back within max_distance
+            break
+
+    if not exceeded:
+        candidate_distances = rows[np.arange(len(candidates)), lengths]
+        for candidate, distance in zip(candidates, candidate_distances):
+            distances[positions_by_name[candidate]] = distance
+    return distances
+
 # --- Function to determine VCG-like prices for selected matches in a tier ---
 def determine_vcg_prices_for_tier(selected_matches: list, all_available_tier_matches: list) -> list:
     """
@@ -542,44 +870,48 @@ def calculate_match_score(request_resource: dict, offer_resource: dict, runner_p
 
     # --- 2. Time Matching ---
     # Assuming request_specs has `expectedStartTime` and `expectedEndTime` (ISO strings or compatible)
-    # Assuming offer_specs has `availableTimeSlots` (e.g., an array of { start: ISO, end: ISO } objects)
+    # Assuming offer_specs has `availableTimeSlots` (e.g., an array of { start: ISO, end: ISO } objects).
+    # Every slot is considered and the one overlapping the request the most counts.
+    # Timestamps are parsed with parse_timestamp ('Z' suffixes accepted, naive values read as UTC).
     
     request_start = None
     request_end = None
-    offer_start = None
-    offer_end = None
 
     try:
         if request_specs.get('expectedStartTime'):
-            request_start = datetime.fromisoformat(request_specs['expectedStartTime'])
+            request_start = parse_timestamp(request_specs['expectedStartTime'])
         if request_specs.get('expectedEndTime'):
-            request_end = datetime.fromisoformat(request_specs['expectedEndTime'])
-        
-        # Assuming availableTimeSlots is an array, taking the first one for simplicity as in JS pseudocode
-        if offer_specs.get('availableTimeSlots') and len(offer_specs['availableTimeSlots']) > 0:
-            first_slot = offer_specs['availableTimeSlots'][0]
-            if first_slot.get('start'):
-                offer_start = datetime.fromisoformat(first_slot['start'])
-            if first_slot.get('end'):
-                offer_end = datetime.fromisoformat(first_slot['end'])
+            request_end = parse_timestamp(request_specs['expectedEndTime'])
     except ValueError as e:
         print(f"Warning: Could not parse datetime for time matching. Error: {e}")
         # Continue without adding time score if parsing fails
 
-    if request_start and request_end and offer_start and offer_end:
-        # Check for any overlap in time ranges
-        # Max of starts and Min of ends
-        overlap_start = max(request_start, offer_start)
-        overlap_end = min(request_end, offer_end)
-
-        overlap_duration = (overlap_end - overlap_start).total_seconds() if overlap_end > overlap_start else 0
-
-        if overlap_duration > 0:
-            score += 20  # Example fixed score for overlap
-            # Could also be (overlap_duration / min_duration_seconds) * 20 for better scoring
-            # min_duration_seconds = min((request_end - request_start).total_seconds(), (offer_end - offer_start).total_seconds())
-            # if min_duration_seconds > 0:
-            #     score += (overlap_duration / min_duration_seconds) * 20
+    best_overlap_duration = 0
+    if request_start and request_end:
+        for time_slot in offer_specs.get('availableTimeSlots') or []:
+            if not isinstance(time_slot, dict) or not time_slot.get('start') or not time_slot.get('end'):
+                continue
+            try:
+                offer_start = parse_timestamp(time_slot['start'])
+                offer_end = parse_timestamp(time_slot['end'])
+            except ValueError as e:
+                print(f"Warning: Could not parse datetime for time matching. Error: {e}")
+                continue # Skip this slot
+
+            # Check for any overlap in time ranges
+            # Max of starts and Min of ends
+            overlap_start = max(request_start, offer_start)
+            overlap_end = min(request_end, offer_end)
+
+            overlap_duration = (overlap_end - overlap_start).total_seconds() if overlap_end > overlap_start else 0
+            best_overlap_duration = max(best_overlap_duration, overlap_duration)
+
+    if best_overlap_duration > 0:
+        score += 20  # Example fixed score for overlap
+        # Could also be (best_overlap_duration / min_duration_seconds) * 20 for better scoring
+        # min_duration_seconds = min((request_end - request_start).total_seconds(), (offer_end - offer_start).total_seconds())
+        # if min_duration_seconds > 0:
+        #     score += (best_overlap_duration / min_duration_seconds) * 20
 
 
     # --- 3. Capability Matching ---
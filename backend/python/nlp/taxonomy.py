@@ -0,0 +1,104 @@
+# backend/python/nlp/taxonomy.py
+
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+from config import CATEGORY_TAXONOMY_PATH, CATEGORY_EMBEDDINGS_DIR, SENTENCE_TRANSFORMER_MODEL_NAME
+
+
+def load_taxonomy(path: str = CATEGORY_TAXONOMY_PATH) -> list:
+    """
+    Loads the list of broad categories from the taxonomy file.
+
+    The file is a JSON object with a "categories" list, e.g. {"categories": ["Electronics", "Books"]}.
+    """
+    with open(path, encoding="utf-8") as f:
+        taxonomy = json.load(f)
+
+    categories = taxonomy.get("categories") or []
+    if not categories or len(set(categories)) != len(categories):
+        raise ValueError(f"Taxonomy file {path} must list unique, non-empty categories.")
+    return categories
+
+
+def taxonomy_hash(categories: list) -> str:
+    """Stable hash of the ordered category list; any edit to the taxonomy changes it."""
+    return hashlib.sha256(json.dumps(categories, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def category_embeddings_path(categories: list, model_name: str = SENTENCE_TRANSFORMER_MODEL_NAME,
+                             directory: str = CATEGORY_EMBEDDINGS_DIR) -> str:
+    """
+    Path of the .npy matrix for this taxonomy and model.
+    The model name and taxonomy hash are part of the file name, so a change to
+    either one points at a different file and triggers a rebuild.
+    """
+    model_slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+    return os.path.join(directory, f"category_embeddings_{model_slug}_{taxonomy_hash(categories)[:16]}.npy")
+
+
+def load_or_build_category_embeddings(categories: list, encode_fn,
+                                      model_name: str = SENTENCE_TRANSFORMER_MODEL_NAME,
+                                      directory: str = CATEGORY_EMBEDDINGS_DIR) -> np.ndarray:
+    """
+    Returns the normalized category embedding matrix, memory-mapped from disk.
+
+    Args:
+        categories: The ordered category list; row i of the matrix belongs to categories[i].
+        encode_fn: Called as encode_fn(categories) to build the matrix when no valid file exists.
+                   Must return L2-normalized rows.
+        model_name: Name of the model the matrix was built with.
+        directory: Where matrices and their metadata files live.
+
+    Returns:
+        A read-only (len(categories), embedding_dim) float32 array.
+    """
+    path = category_embeddings_path(categories, model_name, directory)
+    metadata_path = path[:-len(".npy")] + ".json"
+    expected_metadata = {
+        "model_name": model_name,
+        "taxonomy_hash": taxonomy_hash(categories),
+        "categories": categories,
+    }
+
+    if os.path.exists(path) and os.path.exists(metadata_path):
+        try:
+            with open(metadata_path, encoding="utf-8") as f:
+                metadata = json.load(f)
+            if metadata == expected_metadata:
+                embeddings = np.load(path, mmap_mode="r")
+                if embeddings.shape[0] == len(categories):
+                    print(f"NLP Taxonomy: Loaded {len(categories)} category embeddings from {path}.")
+                    return embeddings
+            print(f"NLP Taxonomy: Stored category embeddings at {path} do not match the taxonomy. Rebuilding.")
+        except Exception as e:
+            print(f"NLP Taxonomy: Could not load category embeddings from {path}: {e}. Rebuilding.")
+
+    print(f"NLP Taxonomy: Building category embeddings for {len(categories)} categories with {model_name}...")
+    embeddings = np.ascontiguousarray(encode_fn(categories), dtype=np.float32)
+
+    # Write to temporary files and rename, so concurrent workers never read a half-written matrix
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, embeddings)
+    os.replace(tmp_path, path)
+
+    tmp_metadata_path = f"{metadata_path}.{os.getpid()}.tmp"
+    with open(tmp_metadata_path, "w", encoding="utf-8") as f:
+        json.dump(expected_metadata, f, ensure_ascii=False)
+    os.replace(tmp_metadata_path, metadata_path)
+
+    print(f"NLP Taxonomy: Saved category embeddings to {path}.")
+    return np.load(path, mmap_mode="r")
+
+
+if __name__ == "__main__":
+    # Prebuild the matrix, e.g. during deployment: python -m nlp.taxonomy
+    from nlp.processing import categories, get_category_embeddings
+    matrix = get_category_embeddings()
+    print(f"NLP Taxonomy: Category embedding matrix ready for {len(categories)} categories, shape {None if matrix is None else matrix.shape}.")
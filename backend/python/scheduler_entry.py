@@ -3,11 +3,17 @@
 import asyncio
 import os
 import signal
+import time
+import resource
+
+_startup_started_at = time.perf_counter() # Startup-time measurement, reported before the scheduler starts
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
 # Import the BullMQ queue instances
 from worker.queue import resource_queue, auto_complete_match_queue
+from config import POTENTIAL_MATCH_PRUNE_INTERVAL_MINUTES
 
 # Define the async function that will be the scheduled job for populating potential matches
 async def add_populate_potential_matches_job():
@@ -43,6 +49,22 @@ async def add_assign_errand_job():
     except Exception as e:
         print(f"Scheduler: Error adding 'assignErrand' job to queue: {e}")
 
+# Define the async function that will be the scheduled job for pruning potential matches
+async def add_prune_potential_matches_job():
+    """
+    This function is executed by the scheduler and adds a 'prunePotentialMatches' job to the queue.
+    """
+    print("Scheduler: Running scheduled task - Adding 'prunePotentialMatches' job to queue...")
+    try:
+        job = await resource_queue.add('prunePotentialMatches', {}, {
+            'attempts': 1, # The next run prunes whatever this one missed
+            'removeOnComplete': True,
+            'removeOnFail': True,
+        })
+        print(f"Scheduler: Successfully added 'prunePotentialMatches' job {job.id} to queue.")
+    except Exception as e:
+        print(f"Scheduler: Error adding 'prunePotentialMatches' job to queue: {e}")
+
 # (Existing) Define the async function for auto-completing matches
 async def add_auto_complete_match_cleanup_job():
     """
@@ -81,6 +103,15 @@ scheduler.add_job(
 )
 print("Scheduler: Configured 'assignErrand' job to run periodically (every 10 minutes).")
 
+# Add the 'prunePotentialMatches' scheduled job
+scheduler.add_job(
+    add_prune_potential_matches_job,
+    IntervalTrigger(minutes=POTENTIAL_MATCH_PRUNE_INTERVAL_MINUTES),
+    id='prune_potential_matches_scheduled_job',
+    replace_existing=True
+)
+print(f"Scheduler: Configured 'prunePotentialMatches' job to run periodically (every {POTENTIAL_MATCH_PRUNE_INTERVAL_MINUTES} minutes).")
+
 # Add the 'auto_complete_match_cleanup_job' scheduled job (existing)
 scheduler.add_job(
     add_auto_complete_match_cleanup_job,
@@ -90,6 +121,10 @@ scheduler.add_job(
 )
 print("Scheduler: Configured 'auto_complete_match_cleanup_job' to run periodically (daily).")
 
+# Report startup cost; importing worker.queue must not load NLP models or torch
+print(f"Scheduler: Startup completed in {time.perf_counter() - _startup_started_at:.2f}s "
+      f"(max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB).")
+
 
 # --- Entry point to run the scheduler ---
 async def run_scheduler():
@@ -0,0 +1,87 @@
+# backend/python/tests/test_assignment.py
+#
+# max_weight_assignment must select the same total weight as the networkx reference.
+
+import numpy as np
+import pytest
+
+pytest.importorskip("networkx")
+
+from worker import assignment
+from worker.assignment import max_weight_assignment, max_weight_assignment_networkx
+
+
+def selected_weight(buyers, sellers, weights, positions) -> float:
+    """Total weight of the selected edges, after checking they form a one-to-one matching."""
+    positions = np.asarray(positions, dtype=np.int64)
+    assert np.all((positions >= 0) & (positions < len(weights)))
+    assert len(np.unique(positions)) == len(positions)
+    assert len(np.unique(np.asarray(buyers)[positions])) == len(positions)
+    assert len(np.unique(np.asarray(sellers)[positions])) == len(positions)
+    assert np.all(np.asarray(weights)[positions] > 0)
+    return float(np.asarray(weights, dtype=np.float64)[positions].sum())
+
+
+def assert_matches_networkx(buyers, sellers, weights):
+    positions = max_weight_assignment(buyers, sellers, weights)
+    reference = max_weight_assignment_networkx(buyers, sellers, weights)
+    assert selected_weight(buyers, sellers, weights, positions) == pytest.approx(
+        selected_weight(buyers, sellers, weights, reference)
+    )
+    return positions
+
+
+def test_empty_tier():
+    assert len(max_weight_assignment([], [], [])) == 0
+    assert len(max_weight_assignment([0, 1], [0, 1], [0.0, -1.0])) == 0
+
+
+def test_prefers_two_edges_over_the_heaviest():
+    # 0-0 (5) alone loses to 0-1 + 1-0 (4 + 4)
+    positions = assert_matches_networkx([0, 0, 1], [0, 1, 0], [5.0, 4.0, 4.0])
+    assert positions.tolist() == [1, 2]
+
+
+def test_duplicate_edges_use_the_last_weight():
+    buyers = [0, 0, 1, 0]
+    sellers = [0, 1, 1, 0]
+    weights = [9.0, 3.0, 4.0, 1.0] # The second 0-0 edge (1.0) replaces the first
+    positions = assert_matches_networkx(buyers, sellers, weights)
+    assert 0 not in positions.tolist()
+
+
+def test_several_components():
+    buyers = [0, 0, 1, 10, 11, 11, 20]
+    sellers = [0, 1, 1, 10, 10, 11, 20]
+    weights = [2.0, 3.0, 2.5, 1.0, 6.0, 1.5, 7.0]
+    positions = assert_matches_networkx(buyers, sellers, weights)
+    assert 6 in positions.tolist() # The lone edge is always taken
+
+
+def test_sparse_path_above_dense_threshold(monkeypatch):
+    rng = np.random.default_rng(7)
+    buyers = rng.integers(0, 40, size=300)
+    sellers = rng.integers(0, 40, size=300)
+    weights = rng.integers(1, 20, size=300).astype(np.float64)
+
+    solved_sparse = []
+    solve_sparse = assignment._solve_component_sparse
+
+    def spy(*args, **kwargs):
+        solved_sparse.append(True)
+        return solve_sparse(*args, **kwargs)
+
+    monkeypatch.setattr(assignment, "DENSE_COMPONENT_MAX_CELLS", 100)
+    monkeypatch.setattr(assignment, "_solve_component_sparse", spy)
+    assert_matches_networkx(buyers, sellers, weights)
+    assert solved_sparse
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_tiers(seed):
+    rng = np.random.default_rng(seed)
+    edge_count = int(rng.integers(1, 60))
+    buyers = rng.integers(0, 15, size=edge_count)
+    sellers = rng.integers(0, 15, size=edge_count)
+    weights = rng.choice([0.0, 1.0, 2.0, 2.5, 5.0], size=edge_count) # Ties and non-positive weights
+    assert_matches_networkx(buyers, sellers, weights)
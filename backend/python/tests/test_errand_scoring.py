@@ -0,0 +1,102 @@
+# backend/python/tests/test_errand_scoring.py
+#
+# The vectorized errand scorer must return calculate_match_score's score for every pair.
+
+import copy
+import datetime
+
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from benchmarks.synthetic import make_errands
+from nlp.errand_scoring import OfferFeatures, calculate_match_scores, parse_timestamp, request_features
+from nlp.processing import calculate_match_score
+
+
+def assert_scores_match(service_requests, service_offers, runner_profile_map):
+    scorable_offers = [(s_offer, runner_profile_map[s_offer['userId']]) for s_offer in service_offers]
+    offer_features = OfferFeatures(scorable_offers)
+    for s_req in service_requests:
+        expected = [calculate_match_score(s_req, s_offer, runner_profile) for s_offer, runner_profile in scorable_offers]
+        actual = calculate_match_scores(request_features(s_req, offer_features), offer_features)
+        assert actual.tolist() == expected, f"request {s_req['_id']}"
+
+
+def edge_case_errands():
+    """Two requests and offers per edge case, on top of a small synthetic set."""
+    service_requests, service_offers, runner_profile_map = make_errands(6, 12, seed=11)
+
+    def with_specs(resource, **specifications):
+        resource = copy.deepcopy(resource)
+        resource['_id'] = ObjectId()
+        resource['specifications'].update(specifications)
+        return resource
+
+    base_request, base_offer = service_requests[0], service_offers[0]
+    service_requests += [
+        with_specs(base_request, expectedStartTime=None, expectedEndTime=None), # No times
+        with_specs(base_request, expectedEndTime=None), # No end time
+        with_specs(base_request, expectedStartTime="tomorrow", expectedEndTime="later"), # Unparsable times
+        with_specs(base_request, from_address={"buildingName": "", "campusZone": ""}, to_address={}), # Empty zones
+        with_specs(base_request, requiredEquipment=[]), # Empty equipment
+        # JavaScript toISOString() values, and naive values (read as UTC)
+        with_specs(base_request, expectedStartTime="2025-05-01T01:00:00.000Z", expectedEndTime="2025-05-01T05:00:00.000Z"),
+        with_specs(base_request, expectedStartTime="2025-05-01T01:00:00", expectedEndTime="2025-05-01T05:00:00"),
+    ]
+
+    offer_cases = [
+        {'availableTimeSlots': []}, # No slots
+        {'availableTimeSlots': None},
+        {'availableTimeSlots': [{'start': "not a date", 'end': "2025-05-01T12:00:00+08:00"}]}, # Unparsable slot
+        {'availableTimeSlots': [{'start': "2025-05-01T08:00:00+08:00"}, "slot"]}, # Slot without end, malformed slot
+        {'availabilityCampusZone': ""}, # Empty zone
+        {'availableTimeSlots': [{'start': "2025-05-01T02:00:00.000Z", 'end': "2025-05-01T03:00:00.000Z"}]},
+        {'availableTimeSlots': [{'start': "2025-05-01T02:00:00", 'end': "2025-05-01T03:00:00"}]},
+    ]
+    for offer_specs in offer_cases:
+        s_offer = with_specs(base_offer, **offer_specs)
+        s_offer['userId'] = ObjectId()
+        service_offers.append(s_offer)
+        runner_profile_map[s_offer['userId']] = {
+            **runner_profile_map[base_offer['userId']], '_id': ObjectId(), 'userId': s_offer['userId'],
+            'operatingCampusZones': [], 'specialEquipment': [], # Empty zones and equipment
+        }
+    return service_requests, service_offers, runner_profile_map
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matches_scalar_scorer_on_synthetic_errands(seed):
+    assert_scores_match(*make_errands(40, 150, seed=seed))
+
+
+def test_matches_scalar_scorer_on_edge_cases():
+    assert_scores_match(*edge_case_errands())
+
+
+def test_scores_a_subset_of_offers():
+    service_requests, service_offers, runner_profile_map = make_errands(5, 60, seed=3)
+    scorable_offers = [(s_offer, runner_profile_map[s_offer['userId']]) for s_offer in service_offers]
+    offer_features = OfferFeatures(scorable_offers)
+    positions = np.array([3, 7, 7, 59, 0], dtype=np.int64)
+    for s_req in service_requests:
+        all_scores = calculate_match_scores(request_features(s_req, offer_features), offer_features)
+        subset_scores = calculate_match_scores(request_features(s_req, offer_features), offer_features, positions)
+        assert subset_scores.tolist() == all_scores[positions].tolist()
+
+
+def test_parse_timestamp():
+    utc = datetime.timezone.utc
+    assert parse_timestamp("2025-05-01T01:00:00.000Z") == datetime.datetime(2025, 5, 1, 1, tzinfo=utc)
+    assert parse_timestamp("2025-05-01T09:00:00+08:00") == datetime.datetime(2025, 5, 1, 1, tzinfo=utc)
+    assert parse_timestamp("2025-05-01T01:00:00") == datetime.datetime(2025, 5, 1, 1, tzinfo=utc)
+    assert parse_timestamp(datetime.datetime(2025, 5, 1, 1)) == datetime.datetime(2025, 5, 1, 1, tzinfo=utc)
+    for invalid in ("tomorrow", "", None, 12):
+        with pytest.raises(ValueError):
+            parse_timestamp(invalid)
+
+
+def test_utc_and_naive_times_score_the_overlap():
+    request = {'specifications': {'expectedStartTime': "2025-05-01T01:00:00.000Z", 'expectedEndTime': "2025-05-01T05:00:00.000Z"}}
+    offer = {'specifications': {'availableTimeSlots': [{'start': "2025-05-01T02:00:00", 'end': "2025-05-01T03:00:00"}]}}
+    assert calculate_match_score(request, offer, {}) == 20
@@ -1,4 +1,24 @@
 # /app/worker/__init__.py
 
 from .queue import RESOURCE_QUEUE_NAME, AUTO_COMPLETE_MATCH_QUEUE_NAME, get_redis_connection
-from .task import handle_ClassifyResource_Job, handle_MatchResources_Job, handle_CleanupTimedOutMatches_Job, handle_AutoCompleteMatch_Job
+
+# Job handlers are resolved lazily, so importing worker.queue (e.g. from scheduler_entry.py)
+# does not pull in worker.task and its MongoDB / NLP dependencies.
+_TASK_EXPORTS = (
+    'handle_ClassifyResource_Job',
+    'handle_ClassifyResources_Job',
+    'handle_MatchResources_Job',
+    'handle_MatchResourcesCoordinator_Job',
+    'handle_ScoreMatchShard_Job',
+    'handle_ReduceMatchResources_Job',
+    'handle_CheckMatchRun_Job',
+    'handle_CleanupTimedOutMatches_Job',
+    'handle_AutoCompleteMatch_Job',
+    'handle_PrunePotentialMatches_Job',
+)
+
+def __getattr__(name):
+    if name in _TASK_EXPORTS:
+        from . import task
+        return getattr(task, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
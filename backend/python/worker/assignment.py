@@ -0,0 +1,154 @@
+# backend/python/worker/assignment.py
+#
+# Maximum-weight bipartite assignment between buyer-side and seller-side resources.
+# Edges are given as integer arrays and the solver returns the positions of the selected
+# edges, so callers map the result straight back to their candidates.
+#
+# The graph is split into connected components; small components are solved as dense
+# linear assignment problems (scipy's LAPJV-based linear_sum_assignment), large ones as
+# sparse minimum-weight full matchings (LAPJVsp) on a graph augmented with dummy nodes.
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components, min_weight_full_bipartite_matching
+
+# Components with at most this many buyer x seller cells are solved with a dense matrix
+DENSE_COMPONENT_MAX_CELLS = 250_000
+
+
+def max_weight_assignment(buyers, sellers, weights) -> np.ndarray:
+    """
+    Selects a maximum-weight set of edges in which every buyer and every seller appears
+    at most once (a maximum-weight matching, not necessarily of maximum cardinality).
+
+    Args:
+        buyers: Integer ID of the buyer-side node of each edge.
+        sellers: Integer ID of the seller-side node of each edge (a separate ID space).
+        weights: Weight of each edge; edges with weight <= 0 are never selected.
+                 If the same (buyer, seller) edge is listed more than once, the last one
+                 is used, like repeated nx.Graph.add_edge calls.
+
+    Returns:
+        Sorted positions (into the input arrays) of the selected edges.
+    """
+    buyers = np.asarray(buyers, dtype=np.int64)
+    sellers = np.asarray(sellers, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+
+    # Keep the last occurrence of every (buyer, seller) pair that has a positive weight
+    edge_positions = np.flatnonzero(weights > 0)
+    if len(edge_positions) == 0:
+        return np.empty(0, dtype=np.int64)
+    _, buyer_nodes = np.unique(buyers[edge_positions], return_inverse=True)
+    _, seller_nodes = np.unique(sellers[edge_positions], return_inverse=True)
+    buyer_count = int(buyer_nodes.max()) + 1
+    seller_count = int(seller_nodes.max()) + 1
+    pair_keys = buyer_nodes * seller_count + seller_nodes
+    _, last_from_end = np.unique(pair_keys[::-1], return_index=True)
+    keep = np.sort(len(pair_keys) - 1 - last_from_end)
+    edge_positions, buyer_nodes, seller_nodes = edge_positions[keep], buyer_nodes[keep], seller_nodes[keep]
+    edge_weights = weights[edge_positions]
+
+    # Connected components of the bipartite graph (sellers numbered after the buyers)
+    adjacency = coo_matrix(
+        (np.ones(len(edge_positions)), (buyer_nodes, buyer_count + seller_nodes)),
+        shape=(buyer_count + seller_count, buyer_count + seller_count),
+    )
+    _, component_labels = connected_components(adjacency, directed=False)
+    edge_components = component_labels[buyer_nodes]
+
+    selected = []
+    order = np.argsort(edge_components, kind='stable')
+    boundaries = np.flatnonzero(np.diff(edge_components[order])) + 1
+    for component_edges in np.split(order, boundaries):
+        if len(component_edges) == 1:
+            selected.append(component_edges) # A lone edge is always taken
+            continue
+        selected.append(component_edges[_solve_component(
+            buyer_nodes[component_edges], seller_nodes[component_edges], edge_weights[component_edges]
+        )])
+
+    return np.sort(edge_positions[np.concatenate(selected)])
+
+
+def _solve_component(buyer_nodes, seller_nodes, weights) -> np.ndarray:
+    # Returns positions (into the component's edge arrays) of the selected edges
+    _, rows = np.unique(buyer_nodes, return_inverse=True)
+    _, columns = np.unique(seller_nodes, return_inverse=True)
+    row_count = int(rows.max()) + 1
+    column_count = int(columns.max()) + 1
+
+    if row_count * column_count <= DENSE_COMPONENT_MAX_CELLS:
+        # Missing edges weigh 0, and a pair assigned through one is simply left unmatched
+        dense = np.zeros((row_count, column_count))
+        edge_at = np.full((row_count, column_count), -1, dtype=np.int64)
+        dense[rows, columns] = weights
+        edge_at[rows, columns] = np.arange(len(weights))
+        assigned_rows, assigned_columns = linear_sum_assignment(dense, maximize=True)
+        chosen = edge_at[assigned_rows, assigned_columns]
+        return chosen[chosen >= 0]
+
+    return _solve_component_sparse(rows, columns, weights, row_count, column_count)
+
+
+def _solve_component_sparse(rows, columns, weights, row_count: int, column_count: int) -> np.ndarray:
+    """
+    Maximum-weight matching as a minimum-weight *full* matching on an augmented graph:
+
+        rows:    buyers (row_count)      + one dummy per seller (column_count)
+        columns: sellers (column_count)  + one dummy per buyer  (row_count)
+
+    buyer i - seller j costs K - w_ij, buyer i - its dummy and seller j's dummy - seller j
+    cost K, and seller j's dummy - buyer i's dummy costs K for every real edge (i, j), so
+    the dummies of a matched pair can pair up with each other. Every full matching has
+    row_count + column_count edges, so minimizing the total cost maximizes the matched
+    weight. K > max weight keeps every cost positive (zeros would read as missing edges).
+    """
+    edge_count = len(weights)
+    size = row_count + column_count
+    base_cost = float(weights.max()) + 1.0
+
+    real_rows, real_columns = rows, columns
+    buyer_dummy_rows = np.arange(row_count)
+    buyer_dummy_columns = column_count + np.arange(row_count)
+    seller_dummy_rows = row_count + np.arange(column_count)
+    seller_dummy_columns = np.arange(column_count)
+    dummy_pair_rows = row_count + columns
+    dummy_pair_columns = column_count + rows
+
+    graph = csr_matrix(
+        (
+            np.concatenate([base_cost - weights, np.full(row_count + column_count + edge_count, base_cost)]),
+            (
+                np.concatenate([real_rows, buyer_dummy_rows, seller_dummy_rows, dummy_pair_rows]),
+                np.concatenate([real_columns, buyer_dummy_columns, seller_dummy_columns, dummy_pair_columns]),
+            ),
+        ),
+        shape=(size, size),
+    )
+    assigned_rows, assigned_columns = min_weight_full_bipartite_matching(graph)
+
+    # Map the real buyer -> seller assignments back to edges
+    is_real = (assigned_rows < row_count) & (assigned_columns < column_count)
+    edge_index = {(int(row), int(column)): position for position, (row, column) in enumerate(zip(rows, columns))}
+    return np.array(
+        [edge_index[(int(row), int(column))] for row, column in zip(assigned_rows[is_real], assigned_columns[is_real])],
+        dtype=np.int64,
+    )
+
+
+def max_weight_assignment_networkx(buyers, sellers, weights) -> np.ndarray:
+    """
+    Reference implementation of max_weight_assignment with networkx's general-graph
+    blossom algorithm, used to check the solver (see benchmarks/assignment_solver.py).
+    """
+    import networkx as nx
+
+    graph = nx.Graph()
+    for position, (buyer, seller, weight) in enumerate(zip(buyers, sellers, weights)):
+        if weight > 0:
+            graph.add_edge(('buyer', int(buyer)), ('seller', int(seller)), weight=float(weight), position=position)
+
+    selected = [graph.edges[node_a, node_b]['position'] for node_a, node_b in nx.max_weight_matching(graph, maxcardinality=False)]
+    return np.sort(np.array(selected, dtype=np.int64))
@@ -0,0 +1,129 @@
+# backend/python/worker/candidates.py
+#
+# Compact representation of the potential matches of a 'matchResources' run.
+# A candidate is one row of a NumPy structured array holding integer indices into a
+# per-run resource table plus the score, prices and type codes of the pair, instead of
+# a dict carrying copies of both resource documents.
+
+from array import array
+
+import numpy as np
+
+# Resource types known to the matcher, stored as int8 codes in the candidate arrays
+RESOURCE_TYPES = ('buy', 'sell', 'rent', 'lease', 'service-request', 'service-offer')
+TYPE_CODES = {resource_type: code for code, resource_type in enumerate(RESOURCE_TYPES)}
+
+CANDIDATE_DTYPE = np.dtype([
+    ('idx_a', np.int32),    # Index of resource A in the resource table
+    ('idx_b', np.int32),    # Index of resource B in the resource table
+    ('score', np.float64),
+    ('price_a', np.float64),
+    ('price_b', np.float64),
+    ('type_a', np.int8),    # TYPE_CODES of resource A
+    ('type_b', np.int8),
+])
+
+# Fields of a resource document kept in the per-run resource table
+RESOURCE_TABLE_FIELDS = ('_id', 'userId', 'type', 'price', 'category')
+
+
+def empty_candidates() -> np.ndarray:
+    return np.empty(0, dtype=CANDIDATE_DTYPE)
+
+
+class CandidateBuilder:
+    """
+    Collects candidates one at a time into typed arrays (a few bytes per candidate)
+    and turns them into a CANDIDATE_DTYPE array at the end.
+    """
+
+    def __init__(self):
+        self._idx_a = array('i')
+        self._idx_b = array('i')
+        self._score = array('d')
+        self._price_a = array('d')
+        self._price_b = array('d')
+        self._type_a = array('b')
+        self._type_b = array('b')
+
+    def __len__(self):
+        return len(self._score)
+
+    def add(self, idx_a: int, idx_b: int, score: float, price_a, price_b, type_a: str, type_b: str):
+        self._idx_a.append(idx_a)
+        self._idx_b.append(idx_b)
+        self._score.append(score)
+        self._price_a.append(price_a)
+        self._price_b.append(price_b)
+        self._type_a.append(TYPE_CODES[type_a])
+        self._type_b.append(TYPE_CODES[type_b])
+
+    def build(self) -> np.ndarray:
+        candidates = np.empty(len(self), dtype=CANDIDATE_DTYPE)
+        candidates['idx_a'] = self._idx_a
+        candidates['idx_b'] = self._idx_b
+        candidates['score'] = self._score
+        candidates['price_a'] = self._price_a
+        candidates['price_b'] = self._price_b
+        candidates['type_a'] = self._type_a
+        candidates['type_b'] = self._type_b
+        return candidates
+
+
+def slim_resource(resource: dict) -> dict:
+    """The part of a resource document needed to create a Match from it."""
+    return {field: resource.get(field) for field in RESOURCE_TABLE_FIELDS}
+
+
+def offset_candidates(candidates: np.ndarray, offset: int) -> np.ndarray:
+    """Shifts the resource indices of candidates scored against a table that starts at offset."""
+    if offset:
+        candidates['idx_a'] += offset
+        candidates['idx_b'] += offset
+    return candidates
+
+
+def concatenate_candidates(candidate_arrays: list) -> np.ndarray:
+    return np.concatenate(candidate_arrays) if candidate_arrays else empty_candidates()
+
+
+def sort_by_score(candidates: np.ndarray) -> np.ndarray:
+    """Candidates in descending score order; equal scores keep their scoring order."""
+    return candidates[np.argsort(-candidates['score'], kind='stable')]
+
+
+def candidate_resource_indices(candidates: np.ndarray) -> np.ndarray:
+    """Distinct resource table indices referenced by candidates."""
+    return np.unique(np.concatenate((candidates['idx_a'], candidates['idx_b'])))
+
+
+def candidate_to_potential_match(candidate) -> dict:
+    """
+    The small dict form of one candidate used inside a score tier (bipartite graph
+    edges, VCG pricing). It carries the resource table indices, not the documents.
+    """
+    return {
+        'idxA': int(candidate['idx_a']),
+        'idxB': int(candidate['idx_b']),
+        'score': float(candidate['score']),
+        'priceA': _price_value(candidate['price_a']),
+        'priceB': _price_value(candidate['price_b']),
+        'typeA': RESOURCE_TYPES[candidate['type_a']],
+        'typeB': RESOURCE_TYPES[candidate['type_b']],
+    }
+
+
+def _price_value(price):
+    # Prices are stored as float64; give integral prices back as ints like the documents hold them
+    price = float(price)
+    return int(price) if price.is_integer() else price
+
+
+def candidates_to_bytes(candidates: np.ndarray) -> bytes:
+    """Raw bytes of a candidate array (CANDIDATE_DTYPE rows), e.g. for storing in Redis."""
+    return np.ascontiguousarray(candidates, dtype=CANDIDATE_DTYPE).tobytes()
+
+
+def candidates_from_bytes(value: bytes) -> np.ndarray:
+    """Inverse of candidates_to_bytes; returns a writable array."""
+    return np.frombuffer(value, dtype=CANDIDATE_DTYPE).copy()
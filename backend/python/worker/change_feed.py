@@ -0,0 +1,248 @@
+# backend/python/worker/change_feed.py
+#
+# Incremental population of errand potential matches (run by change_feed_entry.py). Instead
+# of waiting for the scheduled 'populatePotentialMatches' job, every service-request or
+# service-offer that is created or updated is scored as it changes: a changed request
+# against the open offers, a changed offer against the open requests. RESOURCE_CHANGE_FEED_SOURCE
+# selects where the changes come from:
+#
+#   'change_stream'  a MongoDB change stream on the resources collection; its resume token
+#                    is the checkpoint. Needs a replica set; locally a single-node one works:
+#                      docker run -d -p 27017:27017 mongo --replSet rs0
+#                      docker exec <container> mongosh --eval "rs.initiate()"
+#   'redis_stream'   the Redis stream RESOURCE_CHANGE_STREAM_KEY, whose entries carry the
+#                    changed resource's ID in a 'resourceId' field; the last entry ID is the
+#                    checkpoint. Locally:
+#                      redis-cli XADD resource_changes '*' resourceId <resource _id>
+#
+# The checkpoint is stored in Redis under RESOURCE_CHANGE_CHECKPOINT_KEY:<source> after a
+# batch's potential matches are saved, so a restart re-reads at most the batch in flight
+# (saving potential matches is idempotent). The scheduled job still runs as a reconciler.
+#
+# Counterparts come from OpenErrands, an in-memory copy of the open requests and offers that
+# every batch updates with the resources it read, instead of a scan of the opposite side per
+# batch. A location or time-slot query would drop pairs that score from the other criteria
+# alone (see MAX_NON_LOCATION_SCORE in worker/errand_matching.py), and slot times are stored
+# both as strings and as dates, so the copy is the lossless option. It is re-read every
+# RESOURCE_CHANGE_RELOAD_MINUTES for the runner profile edits the feed does not see.
+
+import json
+import time
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from config import (
+    RESOURCE_CHANGE_BATCH_SIZE,
+    RESOURCE_CHANGE_BATCH_WAIT_MS,
+    RESOURCE_CHANGE_CHECKPOINT_KEY,
+    RESOURCE_CHANGE_FEED_SOURCE,
+    RESOURCE_CHANGE_RELOAD_MINUTES,
+    RESOURCE_CHANGE_STREAM_KEY,
+)
+from .db import find_in_keyset_pages, resource_collection, runner_profile_collection
+from .errand_matching import score_errand_pairs
+from .executor import run_cpu, run_io
+from .potential_matches import OPEN_REQUEST_STATUSES, save_potential_matches
+from .queue import get_redis_connection
+
+# Resources the populatePotentialMatches job scores, without its time window
+OPEN_REQUEST_QUERY = {
+    'type': 'service-request',
+    'status': {'$in': OPEN_REQUEST_STATUSES},
+    'assignedErrandId': {'$exists': False},
+}
+OPEN_OFFER_QUERY = {
+    'type': 'service-offer',
+    'status': {'$in': ['active', 'available']},
+}
+
+# Counterparts are read in pages of this size
+COUNTERPART_PAGE_SIZE = 1000
+
+# Error code of a resume token that has fallen off the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+async def fetch_runner_profile_map(service_offers: list) -> dict:
+    """RunnerProfile documents of the offers' runners, keyed by userId."""
+    if not service_offers:
+        return {}
+    runner_ids = list({s_offer['userId'] for s_offer in service_offers})
+    runner_profiles = await runner_profile_collection.find({'userId': {'$in': runner_ids}}).to_list(length=None)
+    return {profile['userId']: profile for profile in runner_profiles}
+
+
+class OpenErrands:
+    """
+    The open service-requests and service-offers, keyed by _id, and the offers' runner
+    profiles, keyed by userId. load() reads them from MongoDB; update() applies a batch.
+    """
+
+    def __init__(self):
+        self.requests = {}
+        self.offers = {}
+        self.runner_profiles = {}
+        self.loaded_at = None
+
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at >= RESOURCE_CHANGE_RELOAD_MINUTES * 60
+
+    async def load(self):
+        started_at = time.perf_counter()
+        requests, offers = {}, {}
+        async for requests_page in find_in_keyset_pages(resource_collection, OPEN_REQUEST_QUERY, page_size=COUNTERPART_PAGE_SIZE):
+            requests.update((r['_id'], r) for r in requests_page)
+        async for offers_page in find_in_keyset_pages(resource_collection, OPEN_OFFER_QUERY, page_size=COUNTERPART_PAGE_SIZE):
+            offers.update((r['_id'], r) for r in offers_page)
+        self.requests, self.offers = requests, offers
+        self.runner_profiles = await fetch_runner_profile_map(list(offers.values()))
+        self.loaded_at = time.monotonic()
+        print(f"Worker Change Feed: Loaded {len(requests)} open requests and {len(offers)} open offers "
+              f"in {time.perf_counter() - started_at:.2f}s.")
+
+    async def update(self, resource_ids: list, open_resources: list):
+        """
+        Applies a batch: the changed resources that are still open replace their old copies,
+        the others (closed, deleted, no longer errands) are dropped.
+        """
+        for resource_id in resource_ids:
+            self.requests.pop(resource_id, None)
+            self.offers.pop(resource_id, None)
+        for resource in open_resources:
+            (self.requests if resource['type'] == 'service-request' else self.offers)[resource['_id']] = resource
+        changed_offers = [r for r in open_resources if r['type'] == 'service-offer']
+        self.runner_profiles.update(await fetch_runner_profile_map(changed_offers))
+
+
+async def score_changed_resources(resource_ids: list, open_errands: OpenErrands) -> dict:
+    """
+    Scores the changed resources that are open errands against their counterparts and saves
+    the potential matches. Resources that are closed, deleted or not errands are ignored;
+    their stale potential matches are left to the 'prunePotentialMatches' job.
+
+    Args:
+        resource_ids: ObjectIds of the changed resources.
+        open_errands: The loaded open requests / offers; updated with this batch first.
+
+    Returns:
+        The number of changed requests / offers and the scoring stats of score_errand_pairs.
+    """
+    changed_resources = await resource_collection.find(
+        {'_id': {'$in': resource_ids}, '$or': [OPEN_REQUEST_QUERY, OPEN_OFFER_QUERY]}
+    ).to_list(length=None)
+    await open_errands.update(resource_ids, changed_resources)
+    changed_requests = [r for r in changed_resources if r['type'] == 'service-request']
+    changed_offers = [r for r in changed_resources if r['type'] == 'service-offer']
+
+    feed_stats = {'changed_requests': len(changed_requests), 'changed_offers': len(changed_offers), 'saved_pairs': 0}
+
+    async def score_and_save(service_requests, service_offers):
+        scored_pairs, scoring_stats = await run_cpu(score_errand_pairs, service_requests, service_offers, open_errands.runner_profiles)
+        await save_potential_matches(scored_pairs)
+        feed_stats['saved_pairs'] += len(scored_pairs)
+        for stat_name, stat_value in scoring_stats.items():
+            feed_stats[stat_name] = feed_stats.get(stat_name, 0) + stat_value
+
+    # Changed requests against every open offer (the changed offers included)
+    if changed_requests and open_errands.offers:
+        await score_and_save(changed_requests, list(open_errands.offers.values()))
+
+    # Changed offers against the other open requests, page by page
+    if changed_offers:
+        changed_request_ids = {r['_id'] for r in changed_requests}
+        unchanged_requests = [r for r_id, r in open_errands.requests.items() if r_id not in changed_request_ids]
+        for page_start in range(0, len(unchanged_requests), COUNTERPART_PAGE_SIZE):
+            await score_and_save(unchanged_requests[page_start:page_start + COUNTERPART_PAGE_SIZE], changed_offers)
+
+    return feed_stats
+
+
+async def change_stream_batches(resume_token: dict = None):
+    """
+    Yields (resource_ids, resume_token) batches of inserted / updated / replaced errands and
+    deleted resources from a change stream on the resources collection. A batch closes when it holds
+    RESOURCE_CHANGE_BATCH_SIZE resources or no change arrived for RESOURCE_CHANGE_BATCH_WAIT_MS.
+    """
+    # Deletes carry no document; their IDs drop the resources from the open errands
+    pipeline = [{'$match': {'$or': [
+        {'operationType': 'delete'},
+        {
+            'operationType': {'$in': ['insert', 'update', 'replace']},
+            'fullDocument.type': {'$in': ['service-request', 'service-offer']},
+        },
+    ]}}]
+    async with resource_collection.watch(
+        pipeline, full_document='updateLookup', resume_after=resume_token, max_await_time_ms=RESOURCE_CHANGE_BATCH_WAIT_MS
+    ) as stream:
+        print("Worker Change Feed: Watching the resources collection" + (" from the saved resume token." if resume_token else "."))
+        while stream.alive:
+            resource_ids = {}
+            while len(resource_ids) < RESOURCE_CHANGE_BATCH_SIZE:
+                change = await stream.try_next()
+                if change is None:
+                    break
+                resource_ids[change['documentKey']['_id']] = None # Ordered set: a resource changed twice is scored once
+            if resource_ids:
+                yield list(resource_ids), stream.resume_token
+
+
+async def redis_stream_batches(redis_connection, last_entry_id: str = '0-0'):
+    """
+    Yields (resource_ids, last_entry_id) batches of the entries added to RESOURCE_CHANGE_STREAM_KEY
+    after last_entry_id, at most RESOURCE_CHANGE_BATCH_SIZE at a time.
+    """
+    print(f"Worker Change Feed: Reading Redis stream '{RESOURCE_CHANGE_STREAM_KEY}' after entry {last_entry_id}.")
+    while True:
+        response = await run_io(
+            redis_connection.xread, {RESOURCE_CHANGE_STREAM_KEY: last_entry_id},
+            count=RESOURCE_CHANGE_BATCH_SIZE, block=RESOURCE_CHANGE_BATCH_WAIT_MS
+        )
+        if not response:
+            continue
+        entries = response[0][1]
+        resource_ids = {}
+        for entry_id, fields in entries:
+            try:
+                resource_ids[ObjectId(fields[b'resourceId'].decode())] = None
+            except Exception as e:
+                print(f"Worker Change Feed: Skipping stream entry {entry_id}, no valid resourceId: {e}")
+        last_entry_id = entries[-1][0].decode()
+        yield list(resource_ids), last_entry_id
+
+
+async def run_change_feed(source: str = None):
+    """
+    Scores resource changes from the feed until cancelled, checkpointing after every batch.
+
+    Args:
+        source: 'change_stream' or 'redis_stream'; defaults to RESOURCE_CHANGE_FEED_SOURCE.
+    """
+    source = source or RESOURCE_CHANGE_FEED_SOURCE
+    if source not in ('change_stream', 'redis_stream'):
+        raise ValueError(f"Unknown RESOURCE_CHANGE_FEED_SOURCE '{source}'")
+    redis_connection = get_redis_connection()
+    checkpoint_key = f"{RESOURCE_CHANGE_CHECKPOINT_KEY}:{source}"
+    open_errands = OpenErrands()
+
+    while True:
+        checkpoint = await run_io(redis_connection.get, checkpoint_key)
+        if source == 'change_stream':
+            batches = change_stream_batches(json.loads(checkpoint) if checkpoint else None)
+        else:
+            batches = redis_stream_batches(redis_connection, checkpoint.decode() if checkpoint else '0-0')
+
+        try:
+            async for resource_ids, checkpoint in batches:
+                if open_errands.is_stale():
+                    await open_errands.load()
+                started_at = time.perf_counter()
+                feed_stats = await score_changed_resources(resource_ids, open_errands)
+                print(f"Worker Change Feed: Scored {len(resource_ids)} changed resources in {time.perf_counter() - started_at:.2f}s: {feed_stats}")
+                await run_io(redis_connection.set, checkpoint_key, json.dumps(checkpoint) if source == 'change_stream' else checkpoint)
+        except OperationFailure as e:
+            if e.code != CHANGE_STREAM_HISTORY_LOST:
+                raise
+            # Changes missed meanwhile are picked up by the scheduled populatePotentialMatches job
+            print(f"Worker Change Feed: Resume token is no longer in the oplog, watching from now: {e}")
+            await run_io(redis_connection.delete, checkpoint_key)
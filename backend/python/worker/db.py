@@ -0,0 +1,92 @@
+# backend/python/worker/db.py
+#
+# Async MongoDB access layer for the worker, on Motor (asyncio-native driver).
+# Handlers await every query, so concurrent jobs interleave their I/O instead of
+# blocking the event loop.
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from config import MONGO_URI, MONGO_DB_NAME, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, POTENTIAL_MATCH_COLLECTION
+
+# --- MongoDB Connection Setup for the Worker ---
+# The client connects lazily on the first operation, inside the worker's event loop
+try:
+    db_client = AsyncIOMotorClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+    )
+    db = db_client[MONGO_DB_NAME]
+    resource_collection = db.resources
+    match_collection = db.matches
+    users_collection = db.users
+    wallets_collection = db.wallets
+    errands_collection = db.errands # Used in assignErrand_job
+    runner_profile_collection = db.runner_profiles # Used in populate_potential_matches_job & assignErrand_job
+    potential_match_collection = db[POTENTIAL_MATCH_COLLECTION] # One document per scored (service-request, service-offer) pair
+    print(f"Worker DB: Async MongoDB client configured for database '{MONGO_DB_NAME}' (pool {MONGO_MIN_POOL_SIZE}-{MONGO_MAX_POOL_SIZE}).")
+except Exception as e:
+    print(f"Worker DB: Failed to configure async MongoDB client: {e}")
+    raise # Re-raise for critical failure
+
+
+# --- Keyset pagination ---
+async def find_in_keyset_pages(collection, query: dict, sort_field: str = '_id', projection: dict = None,
+                               page_size: int = 1000, max_documents: int = None):
+    """
+    Async generator yielding the documents matching query as lists of at most page_size,
+    ordered by (sort_field, _id).
+
+    Each page starts after the last (sort_field, _id) of the previous one instead of
+    using skip(), so MongoDB seeks straight to the next page through an index on
+    (..., sort_field, _id) rather than rescanning every skipped document. Documents
+    updated out of the query while the caller processes a page don't shift later pages.
+
+    Args:
+        collection: The Motor collection to read.
+        query: The filter.
+        sort_field: Field to page on. Its values should be of one BSON type or null/missing
+                    (null and missing sort first). '_id' pages on _id alone.
+        projection: Optional projection; sort_field and _id are always included.
+        page_size: Maximum number of documents per page.
+        max_documents: Optional cap on the total number of documents yielded.
+    """
+    if projection is not None:
+        projection = {**projection, sort_field: 1, '_id': 1}
+    sort = [('_id', 1)] if sort_field == '_id' else [(sort_field, 1), ('_id', 1)]
+
+    last_document = None
+    yielded = 0
+    while True:
+        limit = page_size if max_documents is None else min(page_size, max_documents - yielded)
+        if limit <= 0:
+            return
+
+        page_query = query
+        if last_document is not None:
+            page_query = {'$and': [query, _keyset_after(sort_field, last_document)]}
+
+        page = await collection.find(page_query, projection).sort(sort).limit(limit).to_list(length=None)
+        if not page:
+            return
+        yield page
+
+        yielded += len(page)
+        if len(page) < limit:
+            return
+        last_document = page[-1]
+
+
+def _keyset_after(sort_field: str, document: dict) -> dict:
+    # Filter for the documents that sort after `document` on (sort_field, _id)
+    last_id = document['_id']
+    if sort_field == '_id':
+        return {'_id': {'$gt': last_id}}
+
+    last_value = document.get(sort_field)
+    if last_value is None:
+        # null / missing sort before every value
+        greater_value = {sort_field: {'$ne': None}}
+    else:
+        greater_value = {sort_field: {'$gt': last_value}}
+    return {'$or': [greater_value, {sort_field: last_value, '_id': {'$gt': last_id}}]}
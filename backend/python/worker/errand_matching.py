@@ -0,0 +1,135 @@
+# backend/python/worker/errand_matching.py
+#
+# CPU-bound scoring stage of the 'populatePotentialMatches' job. Pure computation on
+# plain dicts (no database access), so the job handler can run it in the CPU process pool.
+
+import numpy as np
+
+from nlp.errand_scoring import OfferFeatures, calculate_match_scores, request_features
+from worker.matching import MIN_MATCH_SCORE
+from config import ERRAND_LOCATION_INDEX_ENABLED, ERRAND_UNLOCATED_REQUEST_FALLBACK
+
+# Points a pair can get without any location match: time overlap, door delivery, cargo and equipment
+MAX_NON_LOCATION_SCORE = 20 + 15 + 5 + 10
+
+
+def _lowered(value) -> str:
+    return value.lower() if isinstance(value, str) else ''
+
+
+def request_location_keys(request_resource: dict) -> set:
+    """
+    Index keys of a service-request: the buildings and campus zones of its pickup and
+    dropoff addresses, lowercased as calculate_match_score compares them.
+    """
+    request_specs = request_resource.get('specifications') or {}
+    keys = set()
+    for address_field in ('from_address', 'to_address'):
+        address = request_specs.get(address_field) or {}
+        building = _lowered(address.get('buildingName'))
+        campus_zone = _lowered(address.get('campusZone'))
+        if building:
+            keys.add(('building', building))
+        if campus_zone:
+            keys.add(('zone', campus_zone))
+    return keys
+
+
+def offer_location_keys(offer_resource: dict, runner_profile: dict) -> set:
+    """
+    Index keys of a service-offer. calculate_match_score gives location points when the
+    offer's availabilityCampusZone equals a request building, or when a request zone is
+    one of the runner's operatingCampusZones, so those are the keys an offer is filed under.
+    """
+    offer_specs = offer_resource.get('specifications') or {}
+    keys = set()
+    availability_campus_zone = _lowered(offer_specs.get('availabilityCampusZone'))
+    if availability_campus_zone:
+        keys.add(('building', availability_campus_zone))
+    for campus_zone in runner_profile.get('operatingCampusZones') or []:
+        if _lowered(campus_zone):
+            keys.add(('zone', _lowered(campus_zone)))
+    return keys
+
+
+def build_offer_location_index(scorable_offers: list) -> dict:
+    """Maps each location key to the positions (ascending) of the offers filed under it."""
+    location_index = {}
+    for position, (s_offer, runner_profile_doc) in enumerate(scorable_offers):
+        for key in offer_location_keys(s_offer, runner_profile_doc):
+            location_index.setdefault(key, []).append(position)
+    return location_index
+
+
+def score_errand_pairs(service_requests: list, service_offers: list, runner_profile_map: dict,
+                       use_location_index: bool = None, unlocated_fallback: str = None) -> tuple:
+    """
+    Scores service-requests against the service-offers whose runner has a profile. With
+    the location index, a request is only scored against offers sharing a building or
+    campus zone with it; requests without any location fall back to unlocated_fallback.
+    The skipped offers get no location points, but can still reach MIN_MATCH_SCORE with up
+    to MAX_NON_LOCATION_SCORE points, so the index trades those matches for speed.
+
+    Args:
+        service_requests: 'service-request' Resource documents.
+        service_offers: 'service-offer' Resource documents.
+        runner_profile_map: RunnerProfile documents keyed by the offer's userId.
+        use_location_index: Defaults to ERRAND_LOCATION_INDEX_ENABLED.
+        unlocated_fallback: 'all' or 'none'; defaults to ERRAND_UNLOCATED_REQUEST_FALLBACK.
+
+    Returns:
+        A (scored_pairs, scoring_stats) tuple: dicts (requestId, offerId, runnerProfileId, score),
+        one per pair with score >= MIN_MATCH_SCORE, and the number of pairs scored / skipped
+        by the index and of requests without a location.
+    """
+    if use_location_index is None:
+        use_location_index = ERRAND_LOCATION_INDEX_ENABLED
+    if unlocated_fallback is None:
+        unlocated_fallback = ERRAND_UNLOCATED_REQUEST_FALLBACK
+
+    # Only offers whose runner has a profile can be scored
+    scorable_offers = [
+        (s_offer, runner_profile_map[s_offer['userId']]) for s_offer in service_offers if s_offer['userId'] in runner_profile_map
+    ]
+    location_index = build_offer_location_index(scorable_offers) if use_location_index else None
+    if location_index is not None and MAX_NON_LOCATION_SCORE >= MIN_MATCH_SCORE:
+        print(f"Worker Errand Matching: Location index is on; pairs without location points can score up to {MAX_NON_LOCATION_SCORE} >= MIN_MATCH_SCORE {MIN_MATCH_SCORE} and are skipped.")
+    every_offer = range(len(scorable_offers))
+    # Offers and runner profiles are encoded once; each request is then scored against all its offers at once
+    offer_features = OfferFeatures(scorable_offers)
+
+    scored_pairs = []
+    scoring_stats = {'scored_pairs': 0, 'skipped_pairs': 0, 'unlocated_requests': 0}
+
+    for s_req in service_requests:
+        if location_index is None:
+            offer_positions = every_offer
+        else:
+            location_keys = request_location_keys(s_req)
+            if location_keys:
+                # Union of the co-located offers, in offer order
+                offer_positions = sorted({
+                    position for key in location_keys for position in location_index.get(key, ())
+                })
+            else:
+                scoring_stats['unlocated_requests'] += 1
+                offer_positions = every_offer if unlocated_fallback == 'all' else ()
+
+        scoring_stats['scored_pairs'] += len(offer_positions)
+        scoring_stats['skipped_pairs'] += len(scorable_offers) - len(offer_positions)
+
+        offer_positions = np.asarray(offer_positions, dtype=np.int64)
+        scores = calculate_match_scores(request_features(s_req, offer_features), offer_features, offer_positions)
+
+        for position, score in zip(offer_positions.tolist(), scores.tolist()):
+            if score >= MIN_MATCH_SCORE:
+                s_offer, runner_profile_doc = scorable_offers[position]
+                scored_pairs.append({
+                    'requestId': s_req['_id'],
+                    'offerId': s_offer['_id'],
+                    'runnerProfileId': runner_profile_doc['_id'],
+                    'score': score,
+                })
+                print(f"Calculated score {score} for request {s_req['_id']} with offer {s_offer['_id']}.")
+
+    return scored_pairs, scoring_stats
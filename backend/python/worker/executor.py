@@ -0,0 +1,72 @@
+# backend/python/worker/executor.py
+#
+# Execution layer for the job handlers. CPU-bound stages (classification, candidate
+# scoring, bipartite matching) run in a ProcessPoolExecutor so they neither block the
+# event loop nor stay on one core; blocking pymongo calls run in a thread pool.
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from config import CPU_POOL_WORKERS, CPU_POOL_START_METHOD, CPU_POOL_PRELOAD_MODELS, IO_POOL_WORKERS
+
+_cpu_pool = None
+_io_pool = None
+
+
+def _init_cpu_worker():
+    """Runs once in every CPU pool process: preloads the NLP models so jobs don't pay for it."""
+    if not CPU_POOL_PRELOAD_MODELS:
+        return
+    from nlp.models import get_nlp_pipeline, get_sentence_transformer_model
+    from nlp.processing import get_category_embeddings
+    print(f"Worker Executor: Preloading NLP models in CPU pool process {os.getpid()}...")
+    get_sentence_transformer_model()
+    get_nlp_pipeline()
+    get_category_embeddings()
+
+
+def get_cpu_pool() -> ProcessPoolExecutor:
+    global _cpu_pool
+    if _cpu_pool is None:
+        _cpu_pool = ProcessPoolExecutor(
+            max_workers=max(1, CPU_POOL_WORKERS),
+            mp_context=multiprocessing.get_context(CPU_POOL_START_METHOD),
+            initializer=_init_cpu_worker,
+        )
+        print(f"Worker Executor: Started CPU process pool with {max(1, CPU_POOL_WORKERS)} workers ({CPU_POOL_START_METHOD}).")
+    return _cpu_pool
+
+
+def get_io_pool() -> ThreadPoolExecutor:
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=max(1, IO_POOL_WORKERS), thread_name_prefix="worker-io")
+    return _io_pool
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """
+    Runs a CPU-bound function in the process pool and awaits its result.
+    fn and its arguments must be picklable (module-level functions and plain data).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_pool(), partial(fn, *args, **kwargs))
+
+
+async def run_io(fn, *args, **kwargs):
+    """Runs a blocking call (e.g. a pymongo operation) in the I/O thread pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_pool(), partial(fn, *args, **kwargs))
+
+
+def shutdown_pools(wait: bool = False):
+    global _cpu_pool, _io_pool
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=wait, cancel_futures=True)
+        _cpu_pool = None
+    if _io_pool is not None:
+        _io_pool.shutdown(wait=wait, cancel_futures=True)
+        _io_pool = None
@@ -0,0 +1,85 @@
+# backend/python/worker/fanout.py
+#
+# Redis layout of a distributed 'matchResources' run (fan-out / fan-in over BullMQ):
+#
+#   'matchResourcesCoordinator'  fetches every category once, stores a snapshot of it and
+#                                enqueues one 'scoreMatchShard' job per category / price bucket
+#                                on match_resources_queue
+#   'scoreMatchShard'            (any worker replica) scores its shard against the snapshot and
+#                                stores the candidates as raw CANDIDATE_DTYPE bytes; the shard
+#                                that completes the run enqueues the reduce job
+#   'reduceMatchResources'       merges the candidates in shard order, resolves conflicts and
+#                                commits, like handle_MatchResources_Job does in one process
+#   'checkMatchRun'              (delayed by MATCH_RUN_CHECK_DELAY_SECONDS) fails with the missing
+#                                shards if the run has not reduced by then, so a shard that ran
+#                                out of its MATCH_SHARD_ATTEMPTS does not leave the run to expire silently
+#
+# Keys, all under <MATCH_FANOUT_KEY_PREFIX>:<runId> and expiring after MATCH_FANOUT_TTL_SECONDS:
+#   :plan                 JSON run plan (categories and shards)
+#   :resources:<c>        BSON snapshot of category c's resources, sorted by (price, _id)
+#   :candidates:<s>       candidates of shard s, indices relative to its category snapshot
+#   :stats:<s>            JSON scoring stats of shard s
+#   :done                 set of completed shard indices (the fan-in counter)
+#
+# To try it locally, start several `python worker_entry.py` processes against one Redis
+# and add a 'matchResourcesCoordinator' job to match_resources_queue.
+
+import json
+
+import bson
+
+from config import MATCH_FANOUT_KEY_PREFIX
+from .candidates import candidates_to_bytes, slim_resource
+from .matching import score_category_resources
+
+
+def run_key(run_id: str, *parts) -> str:
+    return ":".join([MATCH_FANOUT_KEY_PREFIX, str(run_id)] + [str(part) for part in parts])
+
+
+def shard_job_id(run_id: str, shard_index: int) -> str:
+    return f"{run_id}-shard-{shard_index}"
+
+
+def reduce_job_id(run_id: str) -> str:
+    # Fixed per run, so BullMQ ignores a second reduce job if two shards finish together
+    return f"{run_id}-reduce"
+
+
+def check_job_id(run_id: str) -> str:
+    return f"{run_id}-check"
+
+
+def resources_to_bytes(resources: list) -> bytes:
+    return bson.encode({'resources': resources})
+
+
+def resources_from_bytes(value: bytes) -> list:
+    return bson.decode(value)['resources']
+
+
+def plan_to_json(categories: list, shards: list) -> str:
+    """
+    Args:
+        categories: [{'category', 'resourceCount'}] in category order; category c's snapshot
+                    is stored under :resources:<c>.
+        shards: [{'categoryIndex', 'anchorStart', 'anchorEnd'}] in merge order.
+    """
+    return json.dumps({'categories': categories, 'shards': shards})
+
+
+def plan_from_json(value) -> dict:
+    return json.loads(value)
+
+
+# --- CPU pool entry points ---
+# Snapshots are decoded inside the pool process, so the event loop never handles the full documents.
+def score_shard_snapshot(category: str, snapshot: bytes, anchor_range: tuple) -> tuple:
+    """Scores one shard of a category snapshot; returns (candidate bytes, scoring stats)."""
+    candidates, scoring_stats = score_category_resources(category, resources_from_bytes(snapshot), anchor_range=anchor_range)
+    return candidates_to_bytes(candidates), scoring_stats
+
+
+def slim_resources_from_bytes(snapshot: bytes) -> list:
+    """The resource table entries (see slim_resource) of a category snapshot, in snapshot order."""
+    return [slim_resource(resource) for resource in resources_from_bytes(snapshot)]
@@ -0,0 +1,167 @@
+# backend/python/worker/instant_match.py
+#
+# Online path of marketplace matching. Right after handle_ClassifyResource_Job sets a resource
+# to 'matching', it is scored against the open counterparts of its category. Only the
+# counterparts inside its price-feasible range are fetched; the (status, category) index and the
+# price bound select them. The best counterpart still 'matching' becomes a pending match with
+# suggested prices, like a unique top match in resolve_potential_matches. The periodic matching
+# jobs keep running and reconcile whatever this path leaves unmatched.
+#
+# Both resources are claimed inside one transaction, with updates conditional on status
+# 'matching': two instant matches of the same counterpart cannot both succeed, and a
+# failed insert leaves neither resource claimed.
+
+import time
+from datetime import datetime
+
+from bson import ObjectId
+
+from config import INSTANT_MATCH_CANDIDATES
+from .candidates import sort_by_score
+from .db import db_client, find_in_keyset_pages, match_collection, resource_collection
+from .executor import run_cpu
+from .matching import BUYER_TYPES, ERRAND_FEE, compatible_types, score_category_resources
+
+# Counterparts are read in (price, _id) pages of this size
+COUNTERPART_PAGE_SIZE = 1000
+
+
+def counterpart_query(resource: dict) -> dict:
+    """Open resources of the compatible type in the resource's category whose price is compatible with it."""
+    if resource['type'] in BUYER_TYPES:
+        price_bound = {'$lte': resource['price'] - ERRAND_FEE} # Asks the bid covers with the fee
+    else:
+        price_bound = {'$gte': resource['price'] + ERRAND_FEE} # Bids covering the ask and the fee
+    return {
+        'status': 'matching',
+        'category': resource.get('category'),
+        'type': compatible_types[resource['type']],
+        'price': price_bound,
+    }
+
+
+def rank_counterparts(resource: dict, counterparts: list, candidate_count: int) -> list:
+    """
+    Scores resource against its counterparts (as score_category_resources scores one
+    resource of a category) and returns the best candidate_count as (position, score)
+    pairs, position indexing counterparts. Runs in the CPU process pool.
+    """
+    category_resources = [resource] + counterparts
+    candidates, _ = score_category_resources(
+        resource.get('category'), category_resources, top_k=candidate_count, anchor_range=(0, 1)
+    )
+    ranked = sort_by_score(candidates)[:candidate_count]
+    return [(int(candidate['idx_b']) - 1, float(candidate['score'])) for candidate in ranked]
+
+
+def instant_match_document(resource: dict, counterpart: dict, score: float) -> dict:
+    """
+    The pending Match document of an instant match. The suggested prices leave the errand
+    fee between them: the requester is offered the owner's ask plus the fee, the owner the
+    requester's bid minus the fee.
+    """
+    requester_resource, owner_resource = (resource, counterpart) if resource['type'] in BUYER_TYPES else (counterpart, resource)
+    created_at = datetime.utcnow()
+    return {
+        '_id': ObjectId(),
+        'resource1': requester_resource['_id'],
+        'resource2': owner_resource['_id'],
+        'requester': requester_resource.get('userId'),
+        'owner': owner_resource.get('userId'),
+        'resource1Payment': None, # Initial price is None for pending negotiation
+        'resource2Receipt': None, # Initial price is None for pending negotiation
+        'score': score,
+        'status': 'pending',
+        'suggestedPriceRequester': owner_resource['price'] + ERRAND_FEE,
+        'suggestedPriceOwner': requester_resource['price'] - ERRAND_FEE,
+        'originalPriceRequester': requester_resource['price'],
+        'originalPriceOwner': owner_resource['price'],
+        'firstAcceptanceTime': None,
+        'requesterAcceptedSuggestedPrice': False,
+        'ownerAcceptedSuggestedPrice': False,
+        'requesterAcceptedOriginalPrice': False,
+        'ownerAcceptedOriginalPrice': False,
+        'rejectedBy': None,
+        'timeoutPenaltyAppliedTo': None,
+        'createdAt': created_at,
+        'updatedAt': created_at,
+    }
+
+
+async def claim_instant_match(resource: dict, ranked_counterparts: list):
+    """
+    Claims resource and the first of ranked_counterparts that is still 'matching', and inserts
+    their pending match, in one transaction. Returns the Match document, or None when
+    resource was matched meanwhile or none of the counterparts is still available.
+    """
+    async with await db_client.start_session() as session:
+        async with session.start_transaction():
+            claimed = await resource_collection.update_one(
+                {'_id': resource['_id'], 'status': 'matching'}, {'$set': {'status': 'matched'}}, session=session
+            )
+            if claimed.modified_count == 0:
+                print(f"Worker Instant Match: Resource {resource['_id']} is no longer 'matching'.")
+                await session.abort_transaction()
+                return None
+
+            for counterpart, score in ranked_counterparts:
+                claimed = await resource_collection.update_one(
+                    {'_id': counterpart['_id'], 'status': 'matching'}, {'$set': {'status': 'matched'}}, session=session
+                )
+                if claimed.modified_count == 0:
+                    print(f"Worker Instant Match: Counterpart {counterpart['_id']} was matched meanwhile, trying the next one.")
+                    continue
+                match_document = instant_match_document(resource, counterpart, score)
+                await match_collection.insert_one(match_document, session=session)
+                return match_document
+
+            await session.abort_transaction()
+            return None
+
+
+async def instant_match(resource: dict) -> dict:
+    """
+    Matches a newly classified resource (already saved as 'matching') with its best open
+    counterpart, if any.
+
+    Args:
+        resource: The resource document with its classified category and specifications.
+
+    Returns:
+        A summary: the created match's ID (or None), the counterparts scored, the instant
+        path's duration and the time to first match since the resource was created.
+    """
+    started_at = time.perf_counter()
+    summary = {'matchId': None, 'counterparts': 0, 'candidates': 0}
+    if resource.get('type') not in compatible_types or not isinstance(resource.get('price'), (int, float)):
+        print(f"Worker Instant Match: Resource {resource['_id']} has no marketplace type or numeric price; left to the scheduled matching.")
+        return summary
+
+    counterparts = []
+    async for counterparts_page in find_in_keyset_pages(
+        resource_collection, counterpart_query(resource), sort_field='price',
+        projection={'name': 1, 'type': 1, 'category': 1, 'price': 1, 'specifications': 1, 'userId': 1, '_id': 1},
+        page_size=COUNTERPART_PAGE_SIZE,
+    ):
+        counterparts.extend(counterparts_page)
+    summary['counterparts'] = len(counterparts)
+
+    ranked = await run_cpu(rank_counterparts, resource, counterparts, INSTANT_MATCH_CANDIDATES) if counterparts else []
+    summary['candidates'] = len(ranked)
+
+    match_document = None
+    if ranked:
+        match_document = await claim_instant_match(resource, [(counterparts[position], score) for position, score in ranked])
+
+    summary['seconds'] = round(time.perf_counter() - started_at, 3)
+    if match_document is None:
+        print(f"Worker Instant Match: No instant match for resource {resource['_id']} in {summary['seconds']}s: {summary}")
+        return summary
+
+    summary['matchId'] = str(match_document['_id'])
+    created_at = resource.get('createdAt')
+    if isinstance(created_at, datetime):
+        # Time-to-first-match: from the resource's creation (including classification) to its pending match
+        summary['timeToFirstMatchSeconds'] = round((match_document['createdAt'] - created_at).total_seconds(), 3)
+    print(f"Worker Instant Match: Matched resource {resource['_id']} in {summary['seconds']}s: {summary}")
+    return summary
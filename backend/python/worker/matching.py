@@ -0,0 +1,726 @@
+# backend/python/worker/matching.py
+#
+# CPU-bound stages of the 'matchResources' job: candidate scoring per category and
+# tier-by-tier conflict resolution. Everything here is pure computation on plain
+# dicts (no database access), so the job handler can run it in the CPU process pool.
+
+import heapq
+import json # Needed for json.dumps
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+import numpy as np
+from bson import ObjectId # Needed for MongoDB _id
+
+from nlp.processing import (
+    calculate_name_similarity_matrix, # Batched semantic name scores for a whole category
+    bounded_levenshtein_distances, # For Levenshtein name score (optional as a secondary factor)
+    determine_vcg_prices_for_tier,
+)
+from nlp.embedding_cache import embedding_cache
+from config import MATCH_ASSIGNMENT_MODE, MATCH_GLOBAL_SURPLUS_WEIGHT, MATCH_TOP_K
+from .assignment import max_weight_assignment
+from .candidates import (
+    CANDIDATE_DTYPE,
+    TYPE_CODES,
+    CandidateBuilder,
+    candidate_to_potential_match,
+    sort_by_score,
+)
+
+# Define compatible types for easy lookup (Needed in matching logic)
+compatible_types = {
+    'buy': 'sell',
+    'sell': 'buy',
+    'rent': 'lease',
+    'lease': 'rent',
+}
+
+# Define your minimum score threshold for a valid match (Needed in matching logic)
+MIN_MATCH_SCORE = 5 # Adjust this value
+
+ERRAND_FEE = 2
+
+# Define weight for semantic name similarity score (Needed in matching logic)
+SEMANTIC_SIMILARITY_WEIGHT = 5 # Example weight for scaling semantic similarity (0-1) to points
+
+# Names further apart than this edit distance get no Levenshtein points
+LEVENSHTEIN_MAX_DISTANCE = 2
+
+# Which side of a trade each type is on (buyers pay, sellers receive)
+BUYER_TYPES = ('buy', 'lease', 'service-request')
+SELLER_TYPES = ('sell', 'rent', 'service-offer')
+
+
+def _has_numeric_price(resource: dict) -> bool:
+    price = resource.get('price')
+    return isinstance(price, (int, float)) and not isinstance(price, bool)
+
+
+def spec_fingerprint(specifications: dict, resource_id=None) -> frozenset:
+    """
+    Normalizes a resource's specifications once into a set of integer hashes, one per
+    (key, canonical JSON value) entry. Two resources agree on a specification key exactly
+    when they share its hash, so spec overlap is the size of the set intersection.
+    Values that can't be serialized are left out (they never counted as a match).
+    """
+    fingerprint = set()
+    for key, value in (specifications or {}).items():
+        try:
+            canonical_value = json.dumps(value, sort_keys=True)
+        except (TypeError, ValueError) as e:
+            print(f"Worker Matching: Warning: Specification '{key}' of resource {resource_id} is not serializable and is ignored for matching: {e}")
+            continue
+        fingerprint.add(hash((key, canonical_value)))
+    return frozenset(fingerprint)
+
+
+def price_feasible_range(resource_type: str, price, counterpart_prices: list) -> tuple:
+    """
+    Returns the [start, end) slice of counterpart_prices (sorted ascending) that is
+    price-compatible with a resource of resource_type at price, i.e. where
+    buyer price >= seller price + ERRAND_FEE.
+    """
+    if resource_type in BUYER_TYPES:
+        # Sellers asking at most price - ERRAND_FEE: a prefix of the sorted prices
+        return 0, bisect_right(counterpart_prices, price - ERRAND_FEE)
+    if resource_type in SELLER_TYPES:
+        # Buyers bidding at least price + ERRAND_FEE: a suffix of the sorted prices
+        return bisect_left(counterpart_prices, price + ERRAND_FEE), len(counterpart_prices)
+    return 0, 0
+
+
+# --- Candidate scoring for one category ---
+def score_category_resources(category: str, category_resources: list, top_k: int = None,
+                             anchor_range: tuple = None) -> tuple:
+    """
+    Scores every compatible pair of resources in one category and returns the
+    price-compatible potential matches with score >= MIN_MATCH_SCORE.
+
+    Args:
+        category: The category being scored (used for logging).
+        category_resources: The category's 'matching' resources, sorted by price.
+        top_k: Keep only the K best counterparts of each resource, selected with a bounded
+               heap while its pairs are scored. 0 keeps every pair (exhaustive mode).
+               Defaults to MATCH_TOP_K.
+        anchor_range: Optional (start, end) slice of category_resources. Only those resources
+                      are scored as resource A (against every counterpart in the category),
+                      so the shards of a category can be scored independently and their
+                      candidates concatenated in shard order equal the unsharded result.
+
+    Returns:
+        A (candidates, scoring_stats) tuple. candidates is a CANDIDATE_DTYPE array (see
+        worker/candidates.py) whose idx_a / idx_b are positions in category_resources;
+        scoring_stats counts the compatible-type pairs, the pairs pruned by price before
+        scoring and the pairs scored.
+    """
+    if top_k is None:
+        top_k = MATCH_TOP_K
+    candidate_builder = CandidateBuilder()
+    scoring_stats = {'compatible_pairs': 0, 'price_pruned_pairs': 0, 'scored_pairs': 0, 'top_k_dropped_pairs': 0}
+
+    # Group fetched resources by type within this category (Keep this)
+    # Only resources with a numeric price can ever be price-compatible; each group is
+    # kept sorted by price so the feasible counterparts form one contiguous range.
+    indexed_resources_by_type = {}
+    unpriced_by_type = {}
+    for table_index, resource in enumerate(category_resources):
+        if not _has_numeric_price(resource):
+            unpriced_by_type[resource['type']] = unpriced_by_type.get(resource['type'], 0) + 1
+            continue
+        if resource['type'] not in indexed_resources_by_type:
+            indexed_resources_by_type[resource['type']] = []
+        indexed_resources_by_type[resource['type']].append((table_index, resource))
+    resources_by_type = {}
+    table_indices_by_type = {} # Position of each grouped resource in category_resources
+    for resource_type, indexed_resources in indexed_resources_by_type.items():
+        indexed_resources.sort(key=lambda indexed_resource: indexed_resource[1]['price'])
+        table_indices_by_type[resource_type] = [table_index for table_index, _ in indexed_resources]
+        resources_by_type[resource_type] = [resource for _, resource in indexed_resources]
+    prices_by_type = {
+        resource_type: [resource['price'] for resource in type_resources]
+        for resource_type, type_resources in resources_by_type.items()
+    }
+    lowercase_names_by_type = {
+        resource_type: [(resource.get('name') or '').lower() for resource in type_resources]
+        for resource_type, type_resources in resources_by_type.items()
+    }
+    # Specifications are serialized once per resource, not once per pair and key
+    spec_fingerprints_by_type = {
+        resource_type: [spec_fingerprint(resource.get('specifications'), resource.get('_id')) for resource in type_resources]
+        for resource_type, type_resources in resources_by_type.items()
+    }
+
+
+    # Position of each resource inside its type group, used to index the similarity matrices
+    type_positions = {}
+    for type_resources in resources_by_type.values():
+        for position, resource in enumerate(type_resources):
+            type_positions[str(resource['_id'])] = position
+
+    # Resources scored as resource A in this call, and their row in the similarity matrices
+    anchor_start, anchor_end = anchor_range if anchor_range is not None else (0, len(category_resources))
+    is_full_range = anchor_start == 0 and anchor_end == len(category_resources)
+    anchor_positions_by_type = {
+        resource_type: [position for position, table_index in enumerate(table_indices)
+                        if anchor_start <= table_index < anchor_end]
+        for resource_type, table_indices in table_indices_by_type.items()
+    }
+    anchor_rows_by_type = {
+        resource_type: {position: row for row, position in enumerate(anchor_positions)}
+        for resource_type, anchor_positions in anchor_positions_by_type.items()
+    }
+
+    # --- Batch semantic name similarity ---
+    # Encode every distinct name of this category once and score all
+    # buyer/seller pairs of each compatible type pair with one matrix product.
+    name_similarity_by_types = {}
+    for type_a, type_b in compatible_types.items():
+        if is_full_range and (type_b, type_a) in name_similarity_by_types:
+            name_similarity_by_types[(type_a, type_b)] = name_similarity_by_types[(type_b, type_a)].T
+            continue
+        if type_a not in resources_by_type or type_b not in resources_by_type:
+            continue
+        anchor_resources = [resources_by_type[type_a][position] for position in anchor_positions_by_type[type_a]]
+        name_similarity_by_types[(type_a, type_b)] = calculate_name_similarity_matrix(
+            [resource.get('name') for resource in anchor_resources],
+            [resource.get('name') for resource in resources_by_type[type_b]]
+        )
+        print(f"Worker Matching: Computed {len(anchor_resources)}x{len(resources_by_type[type_b])} name similarity matrix for {type_a}/{type_b} in category {category}.")
+
+
+    # --- Find potential matches within this category's resources --- (Keep this structure)
+    for resource_a in category_resources[anchor_start:anchor_end]:
+        if resource_a['type'] not in compatible_types:
+            continue
+
+        compatible_type = compatible_types[resource_a['type']]
+        potential_counterparts = resources_by_type.get(compatible_type, [])
+        counterpart_count = len(potential_counterparts) + unpriced_by_type.get(compatible_type, 0)
+        scoring_stats['compatible_pairs'] += counterpart_count
+        if not _has_numeric_price(resource_a) or not potential_counterparts:
+            scoring_stats['price_pruned_pairs'] += counterpart_count
+            continue
+
+        # Only generate counterparts inside the price-feasible range, before any scoring runs
+        range_start, range_end = price_feasible_range(
+            resource_a['type'], resource_a['price'], prices_by_type[compatible_type]
+        )
+        scoring_stats['price_pruned_pairs'] += counterpart_count - (range_end - range_start)
+        position_a = type_positions[str(resource_a['_id'])]
+        table_index_a = table_indices_by_type[resource_a['type']][position_a]
+        counterpart_table_indices = table_indices_by_type[compatible_type]
+        name_similarity_row = name_similarity_by_types[(resource_a['type'], compatible_type)][anchor_rows_by_type[resource_a['type']][position_a]]
+        spec_fingerprint_a = spec_fingerprints_by_type[resource_a['type']][position_a]
+        counterpart_spec_fingerprints = spec_fingerprints_by_type[compatible_type]
+        # Edit distances to the whole feasible range in one call, capped at LEVENSHTEIN_MAX_DISTANCE + 1
+        levenshtein_distances = bounded_levenshtein_distances(
+            (resource_a.get('name') or '').lower(),
+            lowercase_names_by_type[compatible_type][range_start:range_end],
+            LEVENSHTEIN_MAX_DISTANCE
+        )
+        # Bounded min-heap of (score, -position_b, priceA, priceB) for top-K mode; on equal
+        # scores the earlier counterpart is kept, as the exhaustive sort would rank it first
+        top_counterparts = []
+
+        for position_b in range(range_start, range_end):
+            resource_b = potential_counterparts[position_b]
+            if resource_b['_id'] == resource_a['_id'] or resource_b['category'] != resource_a['category']:
+                continue
+            scoring_stats['scored_pairs'] += 1
+
+            # --- Calculate Scores (Keep this logic) ---
+            semantic_similarity = float(name_similarity_row[position_b])
+            semantic_name_score = semantic_similarity * SEMANTIC_SIMILARITY_WEIGHT
+
+            name_similarity_leven = int(levenshtein_distances[position_b - range_start])
+            levenshtein_score = 0
+            if name_similarity_leven > 0 and name_similarity_leven <= LEVENSHTEIN_MAX_DISTANCE:
+                levenshtein_score = (LEVENSHTEIN_MAX_DISTANCE - name_similarity_leven + 1)
+            elif name_similarity_leven == 0:
+                levenshtein_score = 3
+
+            name_score = semantic_name_score + levenshtein_score
+
+            # Number of specification keys with equal values (see spec_fingerprint)
+            spec_match = len(spec_fingerprint_a & counterpart_spec_fingerprints[position_b])
+
+            spec_score = spec_match * 2
+
+            score = name_score + spec_score
+
+            # --- Price Compatibility Check ---
+            priceA = resource_a.get('price')
+            priceB = resource_b.get('price')
+            typeA = resource_a.get('type')
+            typeB = resource_b.get('type')
+
+            isPriceCompatible = False
+            if priceA is not None and priceB is not None and isinstance(priceA, (int, float)) and isinstance(priceB, (int, float)):
+                 if typeA in ['buy', 'lease', 'service-request'] and typeB in ['sell', 'rent', 'service-offer']:
+                      # resourceA is buyer, resourceB is seller
+                      isPriceCompatible = priceA >= priceB + ERRAND_FEE
+                 elif typeA in ['sell', 'rent', 'service-offer'] and typeB in ['buy', 'lease', 'service-request']:
+                      # resourceA is seller, resourceB is buyer
+                      isPriceCompatible = priceB >= priceA + ERRAND_FEE
+
+            if score >= MIN_MATCH_SCORE and isPriceCompatible:
+                if top_k > 0:
+                    heap_entry = (score, -position_b, priceA, priceB)
+                    if len(top_counterparts) < top_k:
+                        heapq.heappush(top_counterparts, heap_entry)
+                    else:
+                        heapq.heappushpop(top_counterparts, heap_entry)
+                        scoring_stats['top_k_dropped_pairs'] += 1
+                    continue
+
+                # Store indices into category_resources, not copies of the documents
+                candidate_builder.add(
+                    table_index_a, counterpart_table_indices[position_b],
+                    score, priceA, priceB, typeA, typeB
+                )
+
+        # Emit the kept counterparts in scoring order, so ties sort the same way as in exhaustive mode
+        for score, negated_position_b, priceA, priceB in sorted(top_counterparts, key=lambda entry: -entry[1]):
+            candidate_builder.add(
+                table_index_a, counterpart_table_indices[-negated_position_b],
+                score, priceA, priceB, resource_a['type'], compatible_type
+            )
+
+    print(f"Worker Matching: Category {category} scoring stats: {scoring_stats}")
+    print(f"Worker Matching: Embedding cache stats after scoring category {category}: {embedding_cache.stats()}")
+    return candidate_builder.build(), scoring_stats
+
+
+def plan_scoring_shards(category_resources: list, shard_size: int) -> list:
+    """
+    Splits a price-sorted category into contiguous anchor ranges of about shard_size
+    resources (price buckets), for score_category_resources(anchor_range=...).
+    Returns [(0, len)] when the category fits in one shard or shard_size <= 0.
+    """
+    resource_count = len(category_resources)
+    if shard_size <= 0 or resource_count <= shard_size:
+        return [(0, resource_count)]
+    return [(start, min(start + shard_size, resource_count)) for start in range(0, resource_count, shard_size)]
+
+
+# --- Conflict resolution across all categories ---
+def vcg_match_document(matchToCreate: dict, resourceA_doc: dict, resourceB_doc: dict) -> dict:
+    """
+    The pending Match document for a pair selected by bipartite matching, with the
+    VCG-determined prices (see determine_vcg_prices_for_tier) as suggested prices.
+    """
+    isResourceARequester = resourceA_doc.get('type') in ['buy', 'lease', 'service-request']
+    requesterResource = resourceA_doc if isResourceARequester else resourceB_doc
+    ownerResource = resourceA_doc if not isResourceARequester else resourceB_doc
+
+    vcg_determined_price_requester = matchToCreate['determinedPriceA'] if isResourceARequester else matchToCreate['determinedPriceB']
+    vcg_determined_price_owner = matchToCreate['determinedPriceB'] if isResourceARequester else matchToCreate['determinedPriceA']
+
+    return {
+        '_id': ObjectId(),
+        'resource1': requesterResource.get('_id'),
+        'resource2': ownerResource.get('_id'),
+        'requester': requesterResource.get('userId'),
+        'owner': ownerResource.get('userId'),
+        'resource1Payment': None, # Initial price is None for pending
+        'resource2Receipt': None, # Initial price is None for pending
+        'score': matchToCreate['score'],
+        'status': 'pending',
+        # For VCG matches, the suggested prices are the VCG-determined ones.
+        'suggestedPriceRequester': vcg_determined_price_requester,
+        'suggestedPriceOwner': vcg_determined_price_owner,
+        'originalPriceRequester': requesterResource.get('price'), # Still store original
+        'originalPriceOwner': ownerResource.get('price'),
+        'firstAcceptanceTime': None, # Initial state
+        'requesterAcceptedSuggestedPrice': False,
+        'ownerAcceptedSuggestedPrice': False,
+        'requesterAcceptedOriginalPrice': False, # Not used in this simplified model
+        'ownerAcceptedOriginalPrice': False, # Not used in this simplified model
+        'rejectedBy': None,
+        'timeoutPenaltyAppliedTo': None,
+        'createdAt': datetime.utcnow(),
+        'updatedAt': datetime.utcnow(),
+    }
+
+
+def resolve_potential_matches(candidates, resource_table: list, statusMap: dict, mode: str = None) -> tuple:
+    """
+    Sorts potential matches by score and resolves conflicts tier by tier: a unique
+    top match becomes a pending match with suggested prices, every other tier is
+    resolved with max-weight bipartite matching and VCG-like pricing.
+    In 'global' mode, resolve_potential_matches_globally is used instead.
+
+    Args:
+        candidates: CANDIDATE_DTYPE array of potential matches across all categories,
+                    with idx_a / idx_b pointing into resource_table.
+        resource_table: The run's resources (at least _id, userId, type, price and category).
+        statusMap: Current status of every resource involved, keyed by string ID.
+        mode: 'tiered' or 'global'; defaults to MATCH_ASSIGNMENT_MODE.
+
+    Returns:
+        A (createdMatches, resourceIdsToUpdateStatus) tuple: the Match documents to insert
+        and the string IDs of resources to mark 'matched'.
+    """
+    mode = mode or MATCH_ASSIGNMENT_MODE
+    if mode == 'global':
+        return resolve_potential_matches_globally(candidates, resource_table, statusMap)
+    if mode != 'tiered':
+        print(f"Worker Matching: Warning: Unknown assignment mode '{mode}'. Resolving tier by tier.")
+
+    # --- Sort all potential matches globally by score (descending) ---
+    all_potential_matches = sort_by_score(candidates)
+    all_scores = all_potential_matches['score']
+    negated_scores = -all_scores # Ascending, for finding tier boundaries with searchsorted
+    resource_ids = [str(resource['_id']) for resource in resource_table]
+
+    print("Worker Matching: All potential matches sorted globally by score.")
+
+    # --- Process sorted potential matches by score tier and resolve conflicts ---
+    createdMatches = [] # Collect match documents to be inserted
+    resourceIdsToUpdateStatus = set() # Track resource IDs whose status needs updating
+    matchedResourceIds = set() # Track IDs matched in this run to avoid duplicates
+
+    currentScoreIndex = 0
+    while currentScoreIndex < len(all_potential_matches):
+        currentScore = float(all_scores[currentScoreIndex]);
+
+        # The tier is the run of equal scores starting here (scores are sorted descending)
+        tierIndex = int(np.searchsorted(negated_scores, -currentScore, side='right'))
+        tierPotentialMatches = all_potential_matches[currentScoreIndex:tierIndex];
+
+        print(f"Worker Matching: Processing tier with score {currentScore}. Found {len(tierPotentialMatches)} potential matches in this tier.");
+
+        # --- Filter for AVAILABLE potential matches in this tier ---
+        available_tier_potential_matches = []
+        for candidate in tierPotentialMatches:
+            resourceA_id = resource_ids[candidate['idx_a']]
+            resourceB_id = resource_ids[candidate['idx_b']]
+
+            isResourceAAvailable = statusMap.get(resourceA_id) == 'matching' and resourceA_id not in matchedResourceIds;
+            isResourceBAvailable = statusMap.get(resourceB_id) == 'matching' and resourceB_id not in matchedResourceIds;
+
+            if isResourceAAvailable and isResourceBAvailable:
+                # Only the available candidates of the tier are expanded into small dicts
+                available_tier_potential_matches.append(candidate_to_potential_match(candidate));
+            else:
+                  if currentScore >= MIN_MATCH_SCORE:
+                      print(f"Worker Matching: Skipping potential match in tier (Score {currentScore}) between {resourceA_id} and {resourceB_id} - unavailable or already matched (status: {statusMap.get(resourceA_id, 'unknown')}, {statusMap.get(resourceB_id, 'unknown')} | matched this run: {resourceA_id in matchedResourceIds or resourceB_id in matchedResourceIds}).");
+
+
+        print(f"Worker Matching: Found {len(available_tier_potential_matches)} AVAILABLE potential matches in this tier.");
+
+
+        # --- Handle Unique High Score Match vs. VCG Tie-Breaking ---
+        # A tier is a unique high score match IF:
+        # 1. It's the first tier (currentScoreIndex == 0).
+        # 2. There is exactly ONE available potential match in this tier.
+        # 3. There are no more potential matches globally, OR the next potential match globally has a strictly lower score.
+        is_unique_high_score_tier = (
+            currentScoreIndex == 0 and
+            len(available_tier_potential_matches) == 1 and
+            (tierIndex == len(all_potential_matches) or all_scores[tierIndex] < currentScore)
+        )
+
+
+        if is_unique_high_score_tier:
+            # --- Handle Unique High Score Match ---
+            print(f"Worker Matching: Identified unique high score AVAILABLE match (Score {currentScore}). Creating pending match with suggested prices.")
+            unique_match = available_tier_potential_matches[0]
+            resourceA = resource_table[unique_match['idxA']] # Materialize the resources of the created match only
+            resourceB = resource_table[unique_match['idxB']]
+
+            rA_id = str(resourceA['_id'])
+            rB_id = str(resourceB['_id'])
+
+            # Calculate Suggested Prices for Negotiation Phase
+            suggestedPriceRequester = None
+            suggestedPriceOwner = None
+            originalPriceRequester = None
+            originalPriceOwner = None
+
+
+            # Determine requester/owner and calculate suggested prices based on types and prices
+            # Use the types stored in the potential_match dict, which came from the resource docs.
+            typeA = unique_match.get('typeA')
+            typeB = unique_match.get('typeB')
+            priceA = unique_match.get('priceA')
+            priceB = unique_match.get('priceB')
+
+            # Find the original resource documents again to get userId and potentially other original fields
+            # We can use the resource table entries looked up above
+            resourceA_doc = resourceA
+            resourceB_doc = resourceB
+
+
+            if typeA in ['buy', 'lease', 'service-request'] and typeB in ['sell', 'rent', 'service-offer']:
+                # resourceA is requester (buyer side), resourceB is owner (seller side)
+                requester_userId = resourceA_doc.get('userId')
+                owner_userId = resourceB_doc.get('userId')
+                originalPriceRequester = priceA # Buyer's original bid
+                originalPriceOwner = priceB   # Seller's original ask
+
+                # Calculate suggested prices
+                if originalPriceOwner is not None and isinstance(originalPriceOwner, (int, float)):
+                    suggestedPriceRequester = originalPriceOwner + ERRAND_FEE
+
+                if originalPriceRequester is not None and isinstance(originalPriceRequester, (int, float)):
+                     suggestedPriceOwner = originalPriceRequester - ERRAND_FEE
+
+
+            elif typeA in ['sell', 'rent', 'service-offer'] and typeB in ['buy', 'lease', 'service-request']:
+                # resourceA is owner (seller side), resourceB is requester (buyer side)
+                owner_userId = resourceA_doc.get('userId')
+                requester_userId = resourceB_doc.get('userId')
+                originalPriceOwner = priceA   # Seller's original ask
+                originalPriceRequester = priceB # Buyer's original bid
+
+                # Calculate suggested prices
+                if originalPriceOwner is not None and isinstance(originalPriceOwner, (int, float)):
+                    suggestedPriceRequester = originalPriceOwner + ERRAND_FEE
+
+                if originalPriceRequester is not None and isinstance(originalPriceRequester, (int, float)):
+                    suggestedPriceOwner = originalPriceRequester - ERRAND_FEE
+
+            else:
+                 # This case should not happen for a valid compatible match filtered by price compatibility
+                 print(f"Worker Matching: Warning: Unique high score match with unexpected types during suggested price calculation: {typeA} and {typeB}. Skipping match creation.")
+                 # Move to the next tier index and continue the loop
+                 currentScoreIndex = tierIndex
+                 continue # Skip match creation and go to next tier
+
+
+            # Create the Match document dictionary for the unique high score match
+            newMatch = {
+                '_id': ObjectId(), # Generate new ObjectId for MongoDB
+                'resource1': resourceA_doc.get('_id'), # Original ObjectId of resource A
+                'resource2': resourceB_doc.get('_id'), # Original ObjectId of resource B
+                'requester': requester_userId,
+                'owner': owner_userId,
+                'resource1Payment': None, # Initial price is None for pending negotiation
+                'resource2Receipt': None, # Initial price is None for pending negotiation
+                'score': currentScore, # Store the unique high score
+                'status': 'pending', # Initial status for negotiation
+                'suggestedPriceRequester': suggestedPriceRequester, # Store calculated suggested prices
+                'suggestedPriceOwner': suggestedPriceOwner,
+                'originalPriceRequester': originalPriceRequester, # Store original prices
+                'originalPriceOwner': originalPriceOwner,
+                'firstAcceptanceTime': None, # Set to null initially for negotiation
+                'requesterAcceptedSuggestedPrice': False, # Set flags to false initially
+                'ownerAcceptedSuggestedPrice': False,
+                # These original acceptance flags are not strictly needed in the simplified model,
+                # but keeping them for potential future use or if schema requires.
+                'requesterAcceptedOriginalPrice': False,
+                'ownerAcceptedOriginalPrice': False,
+                'rejectedBy': None, # Set to null initially
+                'timeoutPenaltyAppliedTo': None, # Set to null initially for timeout penalties
+                'createdAt': datetime.utcnow(), # Timestamp of match creation
+                'updatedAt': datetime.utcnow(), # Add updated at timestamp
+            }
+
+            createdMatches.append(newMatch)
+
+            # Mark the resources in this unique match as 'matched' internally
+            # This prevents them from being matched in lower score tiers in this run.
+            resourceIdsToUpdateStatus.add(rA_id)
+            resourceIdsToUpdateStatus.add(rB_id)
+            statusMap[rA_id] = 'matched' # Update status map for subsequent availability checks
+            statusMap[rB_id] = 'matched'
+            matchedResourceIds.add(rA_id)
+            matchedResourceIds.add(rB_id)
+
+            print(f"Worker Matching: Created pending match for unique high score pair {rA_id} and {rB_id} (Score {currentScore}) with suggested prices.")
+
+
+        else:
+            # --- Handle VCG Tie-Breaking (Multiple Available Matches or Conflicts in Tier) ---
+            # This block will be executed if the tier is NOT a unique high score with one available match.
+            # This includes:
+            # - Tiers with score lower than the highest (if any)
+            # - Tiers with the same highest score (ties)
+            # - The highest score tier if it has more than one available match (conflicts at the highest score)
+            print(f"Worker Matching: Tier Score {currentScore} is not a unique high score AVAILABLE match with one available match. Applying VCG tie-breaking if available matches exist.")
+
+            selected_matches_in_tier = [] # Matches chosen by bipartite matching for this tier
+
+            if len(available_tier_potential_matches) > 0:
+                 # --- VCG Tie-Breaking Logic (Apply Bipartite Matching) ---
+                 print(f"Worker Matching: Applying Max Weight Bipartite Matching for {len(available_tier_potential_matches)} available matches in tier with score {currentScore}.")
+
+                 # Edges as integer arrays: buyer / seller resource table indices and surplus weight
+                 edge_buyers = []
+                 edge_sellers = []
+                 edge_weights = []
+                 edge_potential_matches = []
+
+                 for potential_match in available_tier_potential_matches:
+                     typeA = potential_match.get('typeA')
+                     typeB = potential_match.get('typeB')
+                     priceA = potential_match.get('priceA')
+                     priceB = potential_match.get('priceB')
+
+                     if typeA in ['buy', 'lease', 'service-request'] and typeB in ['sell', 'rent', 'service-offer']:
+                         buyer_index, seller_index = potential_match['idxA'], potential_match['idxB']
+                         buyer_price, seller_price = priceA, priceB
+                     elif typeA in ['sell', 'rent', 'service-offer'] and typeB in ['buy', 'lease', 'service-request']:
+                         seller_index, buyer_index = potential_match['idxA'], potential_match['idxB']
+                         seller_price, buyer_price = priceA, priceB
+                     else:
+                         print(f"Worker Matching: Warning: Unexpected resource types when building graph for tier: {typeA} and {typeB}. Skipping edge.")
+                         continue
+
+                     edge_weight = 0
+                     if buyer_price is not None and seller_price is not None and isinstance(buyer_price, (int, float)) and isinstance(seller_price, (int, float)):
+                         edge_weight = buyer_price - seller_price
+
+                     if edge_weight > 0:
+                          edge_buyers.append(buyer_index)
+                          edge_sellers.append(seller_index)
+                          edge_weights.append(edge_weight)
+                          edge_potential_matches.append(potential_match)
+
+
+                 if not edge_weights:
+                     print(f"Worker Matching: Bipartite graph for tier score {currentScore} has no edges with positive weight. No VCG matches selected.")
+                 else:
+                     try:
+                          selected_positions = max_weight_assignment(edge_buyers, edge_sellers, edge_weights)
+                          selected_matches_in_tier = [edge_potential_matches[position] for position in selected_positions]
+
+                          print(f"Worker Matching: Selected {len(selected_matches_in_tier)} matches from tier score {currentScore} via Bipartite Matching (Selection).")
+
+
+                          # --- Create Match Documents for the selected VCG matches ---
+                          # For VCG selected matches, the VCG determined price is the initial proposal.
+                          # Suggested prices can be set to these VCG prices.
+
+                          # First, determine VCG prices for the selected matches.
+                          matches_with_vcg_prices = determine_vcg_prices_for_tier(
+                             selected_matches=selected_matches_in_tier,
+                             all_available_tier_matches=available_tier_potential_matches # Pass the full list
+                          )
+
+                          for matchToCreate in matches_with_vcg_prices:
+                              resourceA_doc = resource_table[matchToCreate['idxA']]
+                              resourceB_doc = resource_table[matchToCreate['idxB']]
+
+                              rA_id = str(resourceA_doc.get('_id'))
+                              rB_id = str(resourceB_doc.get('_id'))
+
+                              # Check if resources are still available (should be if selected by bipartite matching from available)
+                              if statusMap.get(rA_id) == 'matching' and rA_id not in matchedResourceIds and \
+                                  statusMap.get(rB_id) == 'matching' and rB_id not in matchedResourceIds:
+
+                                  print(f"Worker Matching: Creating match with score {matchToCreate['score']} (Tier Score) between {rA_id} and {rB_id} with VCG-determined prices.")
+
+                                  newMatch = vcg_match_document(matchToCreate, resourceA_doc, resourceB_doc)
+
+                                  createdMatches.append(newMatch)
+
+                                  resourceIdsToUpdateStatus.add(rA_id)
+                                  resourceIdsToUpdateStatus.add(rB_id)
+                                  statusMap[rA_id] = 'matched'
+                                  statusMap[rB_id] = 'matched'
+                                  matchedResourceIds.add(rA_id)
+                                  matchedResourceIds.add(rB_id)
+
+                                  print(f"Worker Matching: Created pending VCG match for pair {rA_id} and {rB_id} with VCG-determined prices.")
+
+                              else:
+                                  print(f"Worker Matching: Skipping match creation for VCG pair {rA_id} and {rB_id} (Score {currentScore}) - already matched in a higher-priority tier or earlier in this run.")
+
+
+                     except Exception as graph_matching_error:
+                          print(f"Worker Matching: Error during VCG Bipartite Matching for tier score {currentScore}: {graph_matching_error}")
+                          pass # Continue to next tier
+
+
+        # Move index to the start of the next score tier
+        currentScoreIndex = tierIndex;
+
+    return createdMatches, resourceIdsToUpdateStatus
+
+
+def resolve_potential_matches_globally(candidates, resource_table: list, statusMap: dict, surplus_weight: float = None) -> tuple:
+    """
+    Resolves conflicts with one max-weight assignment per category instead of one per
+    score tier. Every available candidate is an edge weighing score + surplus_weight *
+    surplus (bid - ask), so higher scores still come first and surplus decides between
+    close scores. The selected pairs are priced with determine_vcg_prices_for_tier
+    against the category's available candidates and all become pending VCG matches.
+
+    Args:
+        candidates, resource_table, statusMap: As for resolve_potential_matches.
+        surplus_weight: Defaults to MATCH_GLOBAL_SURPLUS_WEIGHT.
+
+    Returns:
+        A (createdMatches, resourceIdsToUpdateStatus) tuple, as resolve_potential_matches.
+    """
+    if surplus_weight is None:
+        surplus_weight = MATCH_GLOBAL_SURPLUS_WEIGHT
+
+    createdMatches = []
+    resourceIdsToUpdateStatus = set()
+    if len(candidates) == 0:
+        return createdMatches, resourceIdsToUpdateStatus
+
+    # --- Keep the candidates whose resources are both still 'matching' ---
+    is_available = np.array([statusMap.get(str(resource['_id'])) == 'matching' for resource in resource_table], dtype=bool)
+    available = candidates[is_available[candidates['idx_a']] & is_available[candidates['idx_b']]]
+    print(f"Worker Matching: Global assignment over {len(available)} of {len(candidates)} potential matches with available resources.")
+    if len(available) == 0:
+        return createdMatches, resourceIdsToUpdateStatus
+
+    # --- Orient every candidate as buyer -> seller and weigh it ---
+    a_is_buyer = np.isin(available['type_a'], [TYPE_CODES[resource_type] for resource_type in BUYER_TYPES])
+    buyers = np.where(a_is_buyer, available['idx_a'], available['idx_b'])
+    sellers = np.where(a_is_buyer, available['idx_b'], available['idx_a'])
+    bids = np.where(a_is_buyer, available['price_a'], available['price_b'])
+    asks = np.where(a_is_buyer, available['price_b'], available['price_a'])
+    weights = available['score'] + surplus_weight * (bids - asks)
+
+    # --- One assignment per category (categories never share an edge) ---
+    category_codes = {}
+    table_categories = np.array([category_codes.setdefault(resource.get('category'), len(category_codes)) for resource in resource_table])
+    categories = list(category_codes)
+    candidate_categories = table_categories[available['idx_a']]
+    order = np.argsort(candidate_categories, kind='stable')
+    boundaries = np.flatnonzero(np.diff(candidate_categories[order])) + 1
+
+    for in_category in np.split(order, boundaries):
+        category = categories[candidate_categories[in_category[0]]]
+        selected = in_category[max_weight_assignment(buyers[in_category], sellers[in_category], weights[in_category])]
+        selected_matches = [candidate_to_potential_match(candidate) for candidate in available[selected]]
+
+        # VCG prices only depend on the bids and asks present, so the pricing pool is the
+        # distinct (bid, ask, buyer type, seller type) combinations of the category
+        pool_rows = np.unique(np.column_stack((
+            bids[in_category], asks[in_category],
+            np.where(a_is_buyer, available['type_a'], available['type_b'])[in_category],
+            np.where(a_is_buyer, available['type_b'], available['type_a'])[in_category],
+        )), axis=0)
+        pricing_pool = np.zeros(len(pool_rows), dtype=CANDIDATE_DTYPE)
+        pricing_pool['price_a'], pricing_pool['price_b'] = pool_rows[:, 0], pool_rows[:, 1]
+        pricing_pool['type_a'], pricing_pool['type_b'] = pool_rows[:, 2], pool_rows[:, 3]
+
+        print(f"Worker Matching: Category {category}: selected {len(selected_matches)} of {len(in_category)} available potential matches by global assignment.")
+
+        matches_with_vcg_prices = determine_vcg_prices_for_tier(
+            selected_matches=selected_matches,
+            all_available_tier_matches=[candidate_to_potential_match(row) for row in pricing_pool],
+        )
+
+        for matchToCreate in matches_with_vcg_prices:
+            resourceA_doc = resource_table[matchToCreate['idxA']]
+            resourceB_doc = resource_table[matchToCreate['idxB']]
+            rA_id = str(resourceA_doc.get('_id'))
+            rB_id = str(resourceB_doc.get('_id'))
+
+            createdMatches.append(vcg_match_document(matchToCreate, resourceA_doc, resourceB_doc))
+            resourceIdsToUpdateStatus.add(rA_id)
+            resourceIdsToUpdateStatus.add(rB_id)
+            statusMap[rA_id] = 'matched'
+            statusMap[rB_id] = 'matched'
+
+    print(f"Worker Matching: Global assignment created {len(createdMatches)} pending VCG matches.")
+    return createdMatches, resourceIdsToUpdateStatus
@@ -0,0 +1,294 @@
+# backend/python/worker/potential_matches.py
+#
+# Storage of errand potential matches: the scored (service-request, service-offer) pairs
+# written by 'populatePotentialMatches' and read by 'assignErrand'. POTENTIAL_MATCH_STORE
+# selects where they live:
+#
+#   'runner_profile'  embedded in RunnerProfile.potentialErrandRequests, as the Node claim
+#                     route (routes/errand.js) reads them; each runner keeps at most
+#                     RUNNER_POTENTIAL_MATCHES_TOP_K entries, none older than POTENTIAL_MATCH_STALE_HOURS
+#   'collection'      one document per pair in POTENTIAL_MATCH_COLLECTION:
+#                       { requestId, offerId, runnerProfileId, score, matchedAt }
+#                     unique on (requestId, offerId), read through (requestId, score, matchedAt),
+#                     and expiring POTENTIAL_MATCH_TTL_SECONDS after its last re-scoring
+#   'both'            written to both, read from the collection
+
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from config import (
+    POTENTIAL_MATCH_STALE_HOURS,
+    POTENTIAL_MATCH_STORE,
+    POTENTIAL_MATCH_TTL_SECONDS,
+    POTENTIAL_MATCH_WRITE_CHUNK_SIZE,
+    RUNNER_POTENTIAL_MATCHES_TOP_K,
+)
+from .db import potential_match_collection, resource_collection, runner_profile_collection
+
+# Statuses of a service-request that is still waiting for a runner (as populatePotentialMatches selects them)
+OPEN_REQUEST_STATUSES = ['submitted', 'matching']
+
+# Request IDs per $in query / $pull while pruning
+PRUNE_CHUNK_SIZE = 1000
+
+
+def uses_collection() -> bool:
+    return POTENTIAL_MATCH_STORE in ('collection', 'both')
+
+
+def uses_runner_profiles() -> bool:
+    return POTENTIAL_MATCH_STORE in ('runner_profile', 'both')
+
+
+async def ensure_potential_match_indexes():
+    """Creates the potential-match collection's indexes (a no-op when they already exist)."""
+    if not uses_collection():
+        return
+    try:
+        await potential_match_collection.create_index(
+            [('requestId', ASCENDING), ('offerId', ASCENDING)], unique=True, name='requestId_offerId_unique'
+        )
+        await potential_match_collection.create_index(
+            [('requestId', ASCENDING), ('score', DESCENDING), ('matchedAt', DESCENDING)], name='requestId_score_matchedAt'
+        )
+        await potential_match_collection.create_index(
+            'matchedAt', expireAfterSeconds=POTENTIAL_MATCH_TTL_SECONDS, name='matchedAt_ttl'
+        )
+        print(f"Worker Potential Matches: Indexes of '{potential_match_collection.name}' are in place.")
+    except Exception as e:
+        # E.g. the TTL index exists with another expireAfterSeconds; change it with collMod
+        print(f"Worker Potential Matches: Error creating indexes of '{potential_match_collection.name}': {e}")
+
+
+async def save_potential_matches(scored_pairs: list):
+    """
+    Writes scored pairs (requestId, offerId, runnerProfileId, score; see score_errand_pairs)
+    to the configured store(s).
+    """
+    if not scored_pairs:
+        return
+    matched_at = datetime.utcnow() # Use UTC
+    if uses_collection():
+        await _upsert_potential_matches(scored_pairs, matched_at)
+    if uses_runner_profiles():
+        await _save_to_runner_profiles(scored_pairs, matched_at)
+
+
+async def _upsert_potential_matches(scored_pairs: list, matched_at: datetime):
+    # One upsert per pair; unordered, so one failing write doesn't stop the rest of its chunk
+    for chunk_start in range(0, len(scored_pairs), POTENTIAL_MATCH_WRITE_CHUNK_SIZE):
+        bulk_operations = [
+            UpdateOne(
+                {'requestId': scored_pair['requestId'], 'offerId': scored_pair['offerId']},
+                {'$set': {
+                    'runnerProfileId': scored_pair['runnerProfileId'],
+                    'score': scored_pair['score'],
+                    'matchedAt': matched_at,
+                }},
+                upsert=True,
+            )
+            for scored_pair in scored_pairs[chunk_start:chunk_start + POTENTIAL_MATCH_WRITE_CHUNK_SIZE]
+        ]
+        try:
+            result = await potential_match_collection.bulk_write(bulk_operations, ordered=False)
+            print(f"Worker Potential Matches: Upserted {result.upserted_count}, updated {result.modified_count} of {len(bulk_operations)} potential matches.")
+        except Exception as e_bulk:
+            print(f"Worker Potential Matches: Error during bulk upsert of potential matches: {e_bulk}")
+
+
+async def _save_to_runner_profiles(scored_pairs: list, matched_at: datetime):
+    """
+    Merges scored pairs into each runner's potentialErrandRequests, keeping it bounded. Each
+    runner gets one pipeline update that drops the entries being re-scored and the stale
+    ones ($filter), adds the new entries ($concatArrays) and keeps the RUNNER_POTENTIAL_MATCHES_TOP_K
+    best, highest score then most recent ($sortArray, MongoDB 5.2+, and $slice). A single
+    statement is atomic per document, so concurrent writers (the scheduled job and the
+    change feed) can't leave a request twice in a runner's list.
+    """
+    # The best entry per (runner, request); a runner can match a request with several offers
+    entries_by_runner = {}
+    for scored_pair in scored_pairs:
+        runner_entries = entries_by_runner.setdefault(scored_pair['runnerProfileId'], {})
+        current_entry = runner_entries.get(scored_pair['requestId'])
+        if current_entry is None or scored_pair['score'] > current_entry['score']:
+            runner_entries[scored_pair['requestId']] = {
+                'requestId': scored_pair['requestId'],
+                'score': scored_pair['score'],
+                'matchedAt': matched_at,
+                'offerId': scored_pair['offerId']
+            }
+
+    stale_before = matched_at - timedelta(hours=POTENTIAL_MATCH_STALE_HOURS)
+    bulk_operations = []
+    for runner_profile_id, runner_entries in entries_by_runner.items():
+        kept_entries = {'$filter': {
+            'input': {'$ifNull': ['$potentialErrandRequests', []]},
+            'as': 'entry',
+            'cond': {'$and': [
+                {'$not': [{'$in': ['$$entry.requestId', list(runner_entries)]}]},
+                {'$gte': ['$$entry.matchedAt', stale_before]},
+            ]},
+        }}
+        bulk_operations.append(UpdateOne(
+            {'_id': runner_profile_id},
+            [{'$set': {
+                'potentialErrandRequests': {'$slice': [
+                    {'$sortArray': {
+                        'input': {'$concatArrays': [kept_entries, {'$literal': list(runner_entries.values())}]},
+                        'sortBy': {'score': -1, 'matchedAt': -1},
+                    }},
+                    RUNNER_POTENTIAL_MATCHES_TOP_K,
+                ]},
+                'lastPotentialMatchUpdate': matched_at,
+            }}]
+        ))
+
+    try:
+        result = await runner_profile_collection.bulk_write(bulk_operations, ordered=False)
+        print(f"Bulk write for runner profiles completed. Runners: {len(entries_by_runner)}, Matched: {result.matched_count}, Modified: {result.modified_count}")
+    except Exception as e_bulk:
+        print(f"Error during bulk write for runner profiles: {e_bulk}")
+
+
+async def find_potential_runners(request_id, min_score=None) -> list:
+    """
+    The runners that could take a service-request, best first (highest score, then the most
+    recently scored): [{'runner_profile', 'score', 'matchedAt'}]. Runners with an active
+    errand are left out.
+
+    Args:
+        request_id: ObjectId of the service-request.
+        min_score: Optional minimum score, applied in the query when reading the collection.
+    """
+    if not uses_collection():
+        return await _find_potential_runners_in_profiles(request_id)
+
+    # One query on the (requestId, score, matchedAt) index, already in the final order
+    potential_match_query = {'requestId': request_id}
+    if min_score is not None:
+        potential_match_query['score'] = {'$gte': min_score}
+    potential_matches = await potential_match_collection.find(
+        potential_match_query, {'runnerProfileId': 1, 'score': 1, 'matchedAt': 1}
+    ).sort([('score', DESCENDING), ('matchedAt', DESCENDING)]).to_list(length=None)
+    if not potential_matches:
+        return []
+
+    runner_profiles = {
+        runner_profile['_id']: runner_profile
+        async for runner_profile in runner_profile_collection.find({
+            '_id': {'$in': list({potential_match['runnerProfileId'] for potential_match in potential_matches})},
+            'currentActiveErrand': {'$exists': False} # Example: runner is not currently on an active errand
+        })
+    }
+
+    potential_runners = []
+    seen_runner_profiles = set()
+    for potential_match in potential_matches:
+        runner_profile_id = potential_match['runnerProfileId']
+        # A runner with several matching offers is listed once, with its best one
+        if runner_profile_id in runner_profiles and runner_profile_id not in seen_runner_profiles:
+            seen_runner_profiles.add(runner_profile_id)
+            potential_runners.append({
+                'runner_profile': runner_profiles[runner_profile_id],
+                'score': potential_match['score'],
+                'matchedAt': potential_match.get('matchedAt', datetime.min),
+            })
+    return potential_runners
+
+
+async def _find_potential_runners_in_profiles(request_id) -> list:
+    potential_runners_cursor = runner_profile_collection.find(
+        {
+            'potentialErrandRequests.requestId': request_id,
+            # Add conditions for runner availability (e.g., 'isAvailable': True)
+            # 'isAvailable': True # Example, uncomment and define if applicable
+            'currentActiveErrand': {'$exists': False} # Example: runner is not currently on an active errand
+        }
+    )
+
+    scored_runners = []
+    for runner_profile in await potential_runners_cursor.to_list(length=None):
+        for req_entry in runner_profile.get('potentialErrandRequests', []):
+            if req_entry['requestId'] == request_id:
+                score = req_entry.get('score', 0)
+                if not isinstance(score, (int, float)):
+                    score = 0
+                matched_at = req_entry.get('matchedAt', datetime.min)
+                scored_runners.append({
+                    'runner_profile': runner_profile,
+                    'score': score,
+                    'matchedAt': matched_at
+                })
+                break
+
+    # Highest score first, then the most recent matchedAt
+    scored_runners.sort(key=lambda x: (x['score'], x['matchedAt']), reverse=True)
+    return scored_runners
+
+
+async def remove_potential_matches(request_id, session=None):
+    """
+    Drops an assigned service-request's documents from the potential-match collection (inside
+    the assignment transaction). The chosen runner's embedded entry is pulled by the caller's
+    own RunnerProfile update.
+    """
+    if uses_collection():
+        result = await potential_match_collection.delete_many({'requestId': request_id}, session=session)
+        print(f"Worker Potential Matches: Removed {result.deleted_count} potential matches of assigned request {request_id}.")
+
+
+async def prune_potential_matches() -> dict:
+    """
+    Removes the potential matches of service-requests that are no longer waiting for a runner
+    (assigned, cancelled, deleted...) and, from runner profiles, the stale entries.
+
+    Returns:
+        Counts of the requests found closed and of the runner profiles / documents changed.
+    """
+    stale_before = datetime.utcnow() - timedelta(hours=POTENTIAL_MATCH_STALE_HOURS)
+    prune_stats = {'closed_requests': 0, 'runner_profiles_pruned': 0, 'documents_deleted': 0}
+
+    # Requests referenced by potential matches, then the ones among them that are still open
+    referenced_request_ids = set()
+    if uses_runner_profiles():
+        referenced_request_ids.update(await runner_profile_collection.distinct('potentialErrandRequests.requestId'))
+    if uses_collection():
+        referenced_request_ids.update(await potential_match_collection.distinct('requestId'))
+    referenced_request_ids.discard(None)
+    referenced_request_ids = list(referenced_request_ids)
+
+    closed_request_ids = []
+    for chunk_start in range(0, len(referenced_request_ids), PRUNE_CHUNK_SIZE):
+        chunk = referenced_request_ids[chunk_start:chunk_start + PRUNE_CHUNK_SIZE]
+        open_request_ids = set(await resource_collection.distinct('_id', {
+            '_id': {'$in': chunk},
+            'status': {'$in': OPEN_REQUEST_STATUSES},
+            'assignedErrandId': {'$exists': False},
+        }))
+        closed_request_ids.extend(request_id for request_id in chunk if request_id not in open_request_ids)
+    prune_stats['closed_requests'] = len(closed_request_ids)
+
+    if uses_runner_profiles():
+        # Stale entries go in the first pass; later chunks only drop closed requests
+        for chunk_start in range(0, max(len(closed_request_ids), 1), PRUNE_CHUNK_SIZE):
+            chunk = closed_request_ids[chunk_start:chunk_start + PRUNE_CHUNK_SIZE]
+            entry_conditions = [{'requestId': {'$in': chunk}}] if chunk else []
+            if chunk_start == 0:
+                entry_conditions.append({'matchedAt': {'$lt': stale_before}})
+            result = await runner_profile_collection.update_many(
+                {'potentialErrandRequests': {'$elemMatch': {'$or': entry_conditions}}},
+                {'$pull': {'potentialErrandRequests': {'$or': entry_conditions}}}
+            )
+            prune_stats['runner_profiles_pruned'] += result.modified_count
+
+    if uses_collection():
+        # Stale documents expire through the TTL index
+        for chunk_start in range(0, len(closed_request_ids), PRUNE_CHUNK_SIZE):
+            result = await potential_match_collection.delete_many(
+                {'requestId': {'$in': closed_request_ids[chunk_start:chunk_start + PRUNE_CHUNK_SIZE]}}
+            )
+            prune_stats['documents_deleted'] += result.deleted_count
+
+    print(f"Worker Potential Matches: Pruned potential matches: {prune_stats}")
+    return prune_stats
@@ -1,47 +1,74 @@
 # backend/python/worker/tasks.py
 
 from bullmq import Worker
+import asyncio
 import os
 import signal
+import time
 from bson import ObjectId # Needed for MongoDB _id
-from pymongo import MongoClient # Import MongoClient
-import networkx as nx
+from pymongo import UpdateOne # Bulk write models (also accepted by Motor)
+import requests # Notifications to the Node.js service
 from datetime import datetime, timedelta
 import json # Needed for json.dumps
 
 # Import functions and models from nlp module
 from nlp.processing import ( # Import necessary functions
-    classify_resource_text,
-    calculate_name_semantic_similarity, # For semantic name score
-    levenshteinDistance, # For Levenshtein name score (optional as a secondary factor)
-    determine_vcg_prices_for_tier,
-    calculate_match_score,
+    classify_resource_texts, # Batch classification, used by both classification handlers
 )
+from nlp.batching import ClassificationBatcher # Coalesces concurrent classifyResource jobs
 # Import loaded NLP models if needed directly in task handlers (less common if functions handle it)
 # from ..nlp.models import nlp_pipeline, sentence_transformer_model # Example import
 
+# CPU-bound matching stages and the pools they run in
+from worker.executor import run_cpu, run_io
+from worker.matching import (
+    compatible_types,
+    MIN_MATCH_SCORE,
+    score_category_resources,
+    plan_scoring_shards,
+    resolve_potential_matches,
+)
+from worker.candidates import (
+    candidate_resource_indices,
+    candidates_from_bytes,
+    concatenate_candidates,
+    offset_candidates,
+    slim_resource,
+)
+from worker.fanout import (
+    check_job_id,
+    plan_from_json,
+    plan_to_json,
+    reduce_job_id,
+    resources_to_bytes,
+    run_key,
+    score_shard_snapshot,
+    shard_job_id,
+    slim_resources_from_bytes,
+)
+from worker.errand_matching import score_errand_pairs
+from worker.instant_match import instant_match
+from worker.potential_matches import (
+    find_potential_runners,
+    prune_potential_matches,
+    remove_potential_matches,
+    save_potential_matches,
+)
 
-# Import constants from config
-from config import MONGO_URI, MONGO_DB_NAME
-
-# Define compatible types for easy lookup (Needed in matching logic)
-compatible_types = {
-    'buy': 'sell',
-    'sell': 'buy',
-    'rent': 'lease',
-    'lease': 'rent',
-}
-
-# Define your minimum score threshold for a valid match (Needed in matching logic)
-MIN_MATCH_SCORE = 5 # Adjust this value
 
-ERRAND_FEE = 2
+# Import constants from config
+from config import CLASSIFY_BULK_MAX_SIZE, INSTANT_MATCH_ENABLED, MATCH_PARALLEL_WORKERS, MATCH_SHARD_SIZE, MATCH_FANOUT_TTL_SECONDS
+from config import MATCH_SHARD_ATTEMPTS, MATCH_SHARD_BACKOFF_MS, MATCH_RUN_CHECK_DELAY_SECONDS
+from config import ERRAND_MAX_OFFERS_PER_RUN
 
 # Define batch size for fetching resources (Needed in matching logic)
 BATCH_SIZE = 1000 # Adjust batch size based on your server's memory
 
-# Define weight for semantic name similarity score (Needed in matching logic)
-SEMANTIC_SIMILARITY_WEIGHT = 5 # Example weight for scaling semantic similarity (0-1) to points
+# Pending service-requests are read in pages of this size by assignErrand_job (at most BATCH_SIZE per run)
+ASSIGN_ERRAND_PAGE_SIZE = 100
+
+# Matches resolved by a matching run are claimed this many at a time, each in its own transaction
+MATCH_CLAIM_BATCH_SIZE = 50
 
 # Define the URL of your Node.js notification endpoint
 # This should be configurable (e.g., read from config)
@@ -54,28 +81,22 @@ ACCEPTANCE_WINDOW_DURATION = timedelta(days=1) # Define this constant
 AUTO_COMPLETE_TIME_WINDOW_HOURS = int(os.getenv('AUTO_COMPLETE_TIME_WINDOW_HOURS', 24))
 
 # --- MongoDB Connection Setup for the Worker ---
-# Connect to MongoDB once when the worker process starts
-try:
-    db_client = MongoClient(MONGO_URI)
-    db = db_client[MONGO_DB_NAME]
-    resource_collection = db.resources
-    match_collection = db.matches
-    users_collection = db.users
-    wallets_collection = db.wallets
-    errands_collection = db.errands # Used in assignErrand_job
-    runner_profile_collection = db.runner_profiles # <--- NEW: Used in populate_potential_matches_job & assignErrand_job
-    print(f"Worker Tasks: MongoDB connected to database '{MONGO_DB_NAME}'.")
-except Exception as e:
-    print(f"Worker Tasks: Failed to connect to MongoDB: {e}")
-    db_client = None
-    db = None
-    resource_collection = None
-    match_collection = None
-    users_collection = None
-    wallets_collection = None
-    errands_collection = None
-    runner_profile_collection = None
-    raise # Re-raise for critical failure
+# Async (Motor) client and collections, shared by all handlers; see worker/db.py
+from worker.db import (
+    db_client,
+    db,
+    resource_collection,
+    match_collection,
+    users_collection,
+    wallets_collection,
+    errands_collection,
+    runner_profile_collection,
+    find_in_keyset_pages, # (sort key, _id) keyset pagination instead of skip/limit
+)
+
+
+# Micro-batching dispatcher for single classifyResource jobs; each batch runs in the CPU process pool
+classification_batcher = ClassificationBatcher(run_batch=lambda items: run_cpu(classify_resource_texts, items))
 
 
 # --- Define job handler for 'classifyResource' ---
@@ -97,7 +118,7 @@ async def handle_ClassifyResource_Job(job): # Renamed function
         resource_id = ObjectId(resource_id_str)
 
         # 1. Fetch resource from DB (using pymongo)
-        resource_data = resource_collection.find_one({'_id': resource_id})
+        resource_data = await resource_collection.find_one({'_id': resource_id})
 
         if not resource_data:
             print(f"Worker Tasks: Resource {resource_id_str} not found for classification.")
@@ -105,12 +126,13 @@ async def handle_ClassifyResource_Job(job): # Renamed function
 
         print(f"Worker Tasks: Fetched resource {resource_id_str} for classification.")
 
-        # 2. Perform classification using the imported function
-        # The classify_resource_text function in nlp/processing.py
-        # will use the spaCy model loaded in nlp/models.py
-        classification_results = classify_resource_text(
+        # 2. Perform classification through the micro-batching dispatcher
+        # Concurrent classifyResource jobs are coalesced into one batched
+        # classification (see nlp/batching.py); the result is this resource's own.
+        classification_results = await classification_batcher.classify(
             resource_data.get('name'),
-            resource_data.get('description')
+            resource_data.get('description'),
+            resource_data.get('specifications') or {}
         )
 
         print(f"Worker Tasks: Classification results for {resource_id_str}: {classification_results}")
@@ -122,21 +144,29 @@ async def handle_ClassifyResource_Job(job): # Renamed function
             'status': 'matching' # Set status to matching after successful classification
         }
 
-        update_result = resource_collection.update_one({'_id': resource_id}, {'$set': update_data})
+        update_result = await resource_collection.update_one({'_id': resource_id}, {'$set': update_data})
 
         if update_result.modified_count > 0:
             print(f"Worker Tasks: Successfully updated resource {resource_id_str} after classification. Status set to 'matching'.")
         else:
              print(f"Worker Tasks: Resource {resource_id_str} found but not modified after classification.")
 
-        # Removed: Code to add matchResources job. Matching is triggered separately.
-        print(f"Worker Tasks: Classification done for {resource_id_str}. Match job trigger skipped.")
+        # Score the classified resource right away (see worker/instant_match.py); the scheduled
+        # matching jobs still reconcile it if no counterpart is available yet.
+        if not INSTANT_MATCH_ENABLED:
+            print(f"Worker Tasks: Classification done for {resource_id_str}. Instant match disabled.")
+            return
+        try:
+            return await instant_match({**resource_data, **update_data})
+        except Exception as match_error:
+            # The resource stays 'matching' for the scheduled matching; the classification is not undone
+            print(f"Worker Tasks: Instant match failed for resource {resource_id_str}: {match_error}")
 
 
     except Exception as e:
         print(f"Worker Tasks: Error processing classifyResource job {job.id} for resource {resource_id_str}: {e}")
         try:
-             resource_collection.update_one(
+             await resource_collection.update_one(
                  {'_id': resource_id},
                  {'$set': {'status': 'classification_failed', 'error_message': str(e)[:255]}}
              )
@@ -147,6 +177,181 @@ async def handle_ClassifyResource_Job(job): # Renamed function
         raise # Re-raise to let BullMQ handle retries
 
 
+# --- Define job handler for 'classifyResources' (bulk) ---
+# Classifies many resources in one job: one $in fetch, one batched classification
+# and one unordered bulk_write. Job data lists the 'resourceIds' to classify
+# (at most CLASSIFY_BULK_MAX_SIZE per job).
+async def handle_ClassifyResources_Job(job):
+    print(f"Worker Tasks: Handling classifyResources job {job.id}")
+
+    if db is None or resource_collection is None:
+        print(f"Worker Tasks: Database not available. Cannot process classifyResources job {job.id}.")
+        raise ConnectionError("Database connection not available.")
+
+    resource_id_strs = job.data.get('resourceIds')
+    if not resource_id_strs:
+        print(f"Worker Tasks: classifyResources job {job.id} has no resources to classify.")
+        return {'classified': 0, 'failed': 0, 'missing': 0}
+
+    resource_ids = []
+    for resource_id_str in list(dict.fromkeys(resource_id_strs))[:CLASSIFY_BULK_MAX_SIZE]:
+        try:
+            resource_ids.append(ObjectId(resource_id_str))
+        except Exception:
+            print(f"Worker Tasks: Skipping invalid resource ID '{resource_id_str}' in classifyResources job {job.id}.")
+
+    try:
+        # 1. Fetch all resources with a single query
+        resources = await resource_collection.find(
+            {'_id': {'$in': resource_ids}},
+            {'name': 1, 'description': 1, 'specifications': 1, 'category': 1}
+        ).to_list(length=None)
+        missing_count = len(resource_ids) - len(resources)
+        print(f"Worker Tasks: Fetched {len(resources)} of {len(resource_ids)} resources for bulk classification.")
+
+        # 2. Classify them in one batch, in the CPU process pool
+        classification_results = await run_cpu(classify_resource_texts, [
+            (resource.get('name'), resource.get('description'), resource.get('specifications') or {})
+            for resource in resources
+        ])
+
+        # 3. Build one update per resource; failures only affect their own resource
+        bulk_operations = []
+        failed_count = 0
+        for resource, result in zip(resources, classification_results):
+            if isinstance(result, Exception):
+                failed_count += 1
+                bulk_operations.append(UpdateOne(
+                    {'_id': resource['_id']},
+                    {'$set': {'status': 'classification_failed', 'error_message': str(result)[:255]}}
+                ))
+                continue
+
+            bulk_operations.append(UpdateOne(
+                {'_id': resource['_id']},
+                {'$set': {
+                    'category': result.get('category', resource.get('category')),
+                    'specifications': result.get('specifications', resource.get('specifications')),
+                    'status': 'matching' # Set status to matching after successful classification
+                }}
+            ))
+
+        if bulk_operations:
+            write_result = await resource_collection.bulk_write(bulk_operations, ordered=False)
+            print(f"Worker Tasks: Bulk classification write matched {write_result.matched_count}, modified {write_result.modified_count} resources.")
+
+        summary = {
+            'classified': len(resources) - failed_count,
+            'failed': failed_count,
+            'missing': missing_count,
+        }
+        print(f"Worker Tasks: classifyResources job {job.id} finished: {summary}")
+        return summary
+
+    except Exception as e:
+        print(f"Worker Tasks: Error processing classifyResources job {job.id}: {e}")
+        raise # Re-raise to let BullMQ handle retries
+
+
+# --- Shared stages of the matching jobs ---
+async def fetch_category_resources(category: str) -> list:
+    """Fetches a category's 'matching' resources of the compatible types, sorted by (price, _id)."""
+    relevant_types = set(compatible_types.keys()).union(set(compatible_types.values()))
+
+    # Fetch resources for this category and relevant types in (price, _id) keyset pages (Keep this)
+    # Every pair in the category is scored, so the pages are collected into one price-sorted list.
+    category_resources = []
+
+    async for batch in find_in_keyset_pages(
+         resource_collection,
+         {
+              'status': 'matching',
+              'category': category,
+              'type': {'$in': list(relevant_types)}
+         },
+         sort_field='price',
+         projection={ # Ensure all needed fields are projected
+             'name': 1, 'type': 1, 'category': 1, 'price': 1,
+             'specifications': 1, 'userId': 1, '_id': 1 # Include _id and userId
+         },
+         page_size=BATCH_SIZE,
+    ):
+         category_resources.extend(batch)
+         print(f"Worker Tasks: Fetched batch of {len(batch)} resources for category {category}. Total fetched: {len(category_resources)}")
+
+    print(f"Worker Tasks: Finished fetching all {len(category_resources)} matching resources for category {category}.")
+    return category_resources
+
+
+async def resolve_and_save_matches(all_potential_matches, resource_table: list):
+    """
+    Resolves the merged candidates of a matching run against the resources' current
+    statuses, then claims the resources of each created match and inserts it.
+    """
+    # Fetch current statuses only for resources involved in potential matches
+    allPotentialResourceIds = {
+        str(resource_table[table_index]['_id']) for table_index in candidate_resource_indices(all_potential_matches)
+    }
+
+    resources_in_potential_matches_cursor = resource_collection.find(
+        { '_id': { '$in': [ObjectId(id_str) for id_str in allPotentialResourceIds] } },
+        { '_id': 1, 'status': 1 }
+    )
+    statusMap = { str(r['_id']): r['status'] for r in await resources_in_potential_matches_cursor.to_list(length=None) }
+
+    print(f"Worker Tasks: Fetched status for {len(statusMap)} resources involved in potential matches.");
+
+
+    # --- Resolve conflicts tier by tier in the CPU process pool ---
+    # (max-weight bipartite matching and VCG pricing are pure CPU work)
+    createdMatches, _ = await run_cpu(
+        resolve_potential_matches, all_potential_matches, resource_table, statusMap
+    )
+    print(f"Worker Tasks: Conflict resolution selected {len(createdMatches)} matches.")
+
+
+    # --- Claim the matched resources and save the Match documents ---
+    # Statuses were read before resolving, and an instant match (worker/instant_match.py) may
+    # have claimed a resource since: each match is inserted only if both its resources are
+    # still 'matching', and they are marked 'matched' in the same transaction.
+    claimed_count = 0
+    for batch_start in range(0, len(createdMatches), MATCH_CLAIM_BATCH_SIZE):
+        claim_results = await asyncio.gather(*[
+            claim_and_insert_match(match_document)
+            for match_document in createdMatches[batch_start:batch_start + MATCH_CLAIM_BATCH_SIZE]
+        ])
+        claimed_count += sum(claim_results)
+
+    print(f"Worker Tasks: Inserted {claimed_count} of {len(createdMatches)} matches and marked {2 * claimed_count} resources 'matched'; "
+          f"{len(createdMatches) - claimed_count} had a resource matched meanwhile.")
+
+
+async def claim_and_insert_match(match_document: dict) -> bool:
+    """
+    Marks both resources of a resolved match 'matched' if they are still 'matching' and
+    inserts the match, in one transaction. Returns whether the match was inserted.
+    """
+    resource_ids = [match_document['resource1'], match_document['resource2']]
+    try:
+        async with await db_client.start_session() as session:
+            async with session.start_transaction():
+                claimed = await resource_collection.update_many(
+                    {'_id': {'$in': resource_ids}, 'status': 'matching'},
+                    {'$set': {'status': 'matched'}},
+                    session=session
+                )
+                if claimed.modified_count != len(resource_ids):
+                    await session.abort_transaction()
+                    print(f"Worker Tasks: Skipping match between {resource_ids[0]} and {resource_ids[1]}: a resource is no longer 'matching'.")
+                    return False
+                await match_collection.insert_one(match_document, session=session)
+                return True
+    except Exception as db_error:
+        # E.g. a write conflict with an instant match claiming one of the resources
+        print(f"Worker Tasks: Error claiming match between {resource_ids[0]} and {resource_ids[1]}: {db_error}")
+        return False
+
+
 # --- Define job handler for 'matchResources' ---
 # This handler contains the matching logic and will be called when a 'matchResources' job is added
 async def handle_MatchResources_Job(job): # Renamed function
@@ -161,504 +366,307 @@ async def handle_MatchResources_Job(job): # Renamed function
 
         # 1. Find all distinct categories with resources in 'matching' status
         # Leveraging index on 'status' and 'category'
-        distinct_categories = resource_collection.distinct('category', {'status': 'matching'})
+        distinct_categories = await resource_collection.distinct('category', {'status': 'matching'})
 
         print(f"Worker Tasks: Found {len(distinct_categories)} distinct categories with matching resources.")
 
-        all_potential_matches = [] # Collect potential matches from all categories
+        all_candidates = [] # Candidate arrays from all categories (see worker/candidates.py)
+        resource_table = [] # Slim copies of every fetched resource; candidates index into this
+        scoring_stats = {} # Pair counts (compatible / pruned by price / scored) summed over categories
 
+        # Categories are independent until the global sort, so each category (or price bucket
+        # of a large one, see plan_scoring_shards) is scored as its own task in the CPU pool,
+        # at most MATCH_PARALLEL_WORKERS at a time, while the next categories are still being fetched.
+        scoring_slots = asyncio.Semaphore(max(1, MATCH_PARALLEL_WORKERS))
+        scoring_tasks = [] # (category, offset of the category in resource_table, shard tasks) in fetch order
+        shard_seconds = [] # Time each shard spent scoring, to report the parallel speedup
 
-        # 2. Iterate through each category (Keep this structure)
-        for category in distinct_categories:
-             print(f"Worker Tasks: Processing matching resources for category: {category}")
-
-             relevant_types = set(compatible_types.keys()).union(set(compatible_types.values()))
-
-             # Fetch resources for this category and relevant types in batches (Keep this)
-             skip = 0
-             category_resources = []
-
-             while True:
-                  batch_cursor = resource_collection.find({
-                       'status': 'matching',
-                       'category': category,
-                       'type': {'$in': list(relevant_types)}
-                  }).project({ # Ensure all needed fields are projected
-                      'name': 1, 'type': 1, 'category': 1, 'price': 1,
-                      'specifications': 1, 'userId': 1, '_id': 1 # Include _id and userId
-                  }).sort([('price', 1)]).skip(skip).limit(BATCH_SIZE)
-
-                  batch = list(batch_cursor)
-
-                  if not batch:
-                       break
-
-                  category_resources.extend(batch)
-                  skip += len(batch)
-                  print(f"Worker Tasks: Fetched batch of {len(batch)} resources for category {category}. Total fetched: {len(category_resources)}")
-
-             print(f"Worker Tasks: Finished fetching all {len(category_resources)} matching resources for category {category}.")
-
-
-             # Group fetched resources by type within this category (Keep this)
-             resources_by_type = {}
-             for resource in category_resources:
-                 if resource['type'] not in resources_by_type:
-                     resources_by_type[resource['type']] = []
-                 resources_by_type[resource['type']].append(resource)
-
-
-             # --- Find potential matches within this category's resources --- (Keep this structure)
-             for resource_a in category_resources:
-                 if resource_a['type'] not in compatible_types:
-                     continue
-
-                 compatible_type = compatible_types[resource_a['type']]
-                 potential_counterparts = resources_by_type.get(compatible_type, [])
-
-
-                 for resource_b in potential_counterparts:
-                     if resource_b['_id'] == resource_a['_id'] or resource_b['category'] != resource_a['category']:
-                         continue
-
-                     # --- Calculate Scores (Keep this logic) ---
-                     semantic_similarity = calculate_name_semantic_similarity(
-                         resource_a.get('name'),
-                         resource_b.get('name')
-                     )
-                     semantic_name_score = semantic_similarity * SEMANTIC_SIMILARITY_WEIGHT
-
-                     name_similarity_leven = levenshteinDistance(
-                         (resource_a.get('name') or '').lower(),
-                         (resource_b.get('name') or '').lower()
-                     )
-                     levenshtein_score = 0
-                     if name_similarity_leven > 0 and name_similarity_leven <= 2:
-                         levenshtein_score = (2 - name_similarity_leven + 1)
-                     elif name_similarity_leven == 0:
-                         levenshtein_score = 3
-
-                     name_score = semantic_name_score + levenshtein_score
-
-                     spec_match = 0
-                     specs_a = resource_a.get('specifications', {}) or {}
-                     specs_b = resource_b.get('specifications', {}) or {}
-
-                     for key in specs_a:
-                         if key in specs_b:
-                             # Use json.dumps for consistent comparison of potentially nested dicts/lists
-                             try:
-                                 if json.dumps(specs_a[key], sort_keys=True) == json.dumps(specs_b[key], sort_keys=True):
-                                     spec_match += 1
-                             except TypeError as e:
-                                 print(f"Worker Tasks: Warning: Could not compare specifications due to TypeError: {e}. Specs A[{key}]: {specs_a[key]}, Specs B[{key}]: {specs_b[key]}")
-                                 # Handle cases where specs might not be serializable (e.g., complex objects)
-                                 # You might skip comparison for this key or handle differently.
-                                 pass # Skip comparison for this key if not serializable
-
-
-                     spec_score = spec_match * 2
-
-                     score = name_score + spec_score
-
-                     # --- Price Compatibility Check ---
-                     priceA = resource_a.get('price')
-                     priceB = resource_b.get('price')
-                     typeA = resource_a.get('type')
-                     typeB = resource_b.get('type')
-
-                     isPriceCompatible = False
-                     if priceA is not None and priceB is not None and isinstance(priceA, (int, float)) and isinstance(priceB, (int, float)):
-                          if typeA in ['buy', 'lease', 'service-request'] and typeB in ['sell', 'rent', 'service-offer']:
-                               # resourceA is buyer, resourceB is seller
-                               isPriceCompatible = priceA >= priceB + ERRAND_FEE
-                          elif typeA in ['sell', 'rent', 'service-offer'] and typeB in ['buy', 'lease', 'service-request']:
-                               # resourceA is seller, resourceB is buyer
-                               isPriceCompatible = priceB >= priceA + ERRAND_FEE
-
-                     if score >= MIN_MATCH_SCORE and isPriceCompatible:
-                         # Store the full resource documents in the potential match for easy access later
-                         all_potential_matches.append({
-                             'resourceA': dict(resource_a), # Store as dict to avoid potential Mongoose object issues
-                             'resourceB': dict(resource_b),
-                             'score': score,
-                             'priceA': priceA,
-                             'priceB': priceB,
-                             'typeA': typeA,
-                             'typeB': typeB,
-                         });
+        async def score_shard(category, category_resources, anchor_range):
+            async with scoring_slots:
+                started_at = time.perf_counter()
+                result = await run_cpu(score_category_resources, category, category_resources, anchor_range=anchor_range)
+                shard_seconds.append(time.perf_counter() - started_at)
+                return result
 
+        scoring_started_at = time.perf_counter()
 
+        try:
+            # 2. Iterate through each category (Keep this structure)
+            for category in distinct_categories:
+                 print(f"Worker Tasks: Processing matching resources for category: {category}")
+
+                 category_resources = await fetch_category_resources(category)
+
+
+                 # --- Schedule this category's candidate scoring in the CPU process pool ---
+                 shards = plan_scoring_shards(category_resources, MATCH_SHARD_SIZE)
+                 scoring_tasks.append((category, len(resource_table), [
+                     asyncio.create_task(score_shard(category, category_resources, anchor_range)) for anchor_range in shards
+                 ]))
+                 resource_table.extend(slim_resource(resource) for resource in category_resources)
+                 print(f"Worker Tasks: Scheduled scoring of category {category} in {len(shards)} shard(s).")
+
+
+            # --- Merge the per-shard candidates in category and shard order ---
+            for category, table_offset, shard_tasks in scoring_tasks:
+                category_candidate_count = 0
+                for shard_task in shard_tasks:
+                    shard_candidates, shard_scoring_stats = await shard_task
+                    all_candidates.append(offset_candidates(shard_candidates, table_offset))
+                    category_candidate_count += len(shard_candidates)
+                    for stat_name, stat_value in shard_scoring_stats.items():
+                        scoring_stats[stat_name] = scoring_stats.get(stat_name, 0) + stat_value
+                print(f"Worker Tasks: Scored category {category}: {category_candidate_count} potential matches.")
+        except Exception:
+            # Don't leave shards running for a job that failed
+            for _, _, shard_tasks in scoring_tasks:
+                for shard_task in shard_tasks:
+                    shard_task.cancel()
+            raise
+
+        scoring_wall_seconds = time.perf_counter() - scoring_started_at
+        print(f"Worker Tasks: Scored {len(shard_seconds)} shard(s) with up to {max(1, MATCH_PARALLEL_WORKERS)} in parallel: "
+              f"{sum(shard_seconds):.2f}s of shard time in {scoring_wall_seconds:.2f}s wall time "
+              f"(speedup {sum(shard_seconds) / scoring_wall_seconds if scoring_wall_seconds > 0 else 1.0:.2f}x, including fetch time).")
+
+        print(f"Worker Tasks: Candidate pruning across all categories: {scoring_stats}")
+        all_potential_matches = concatenate_candidates(all_candidates)
         print(f"Worker Tasks: Collected {len(all_potential_matches)} total price-compatible potential matches with score >= {MIN_MATCH_SCORE} across all categories.")
 
 
-        # --- Sort all potential matches globally by score (descending) ---
-        all_potential_matches.sort(key=lambda x: x['score'], reverse=True);
+        await resolve_and_save_matches(all_potential_matches, resource_table)
 
-        print("Worker Tasks: All potential matches sorted globally by score.");
+        print("Worker Tasks: Batching and conflict-resolving matching process finished.")
 
-        # --- Process sorted potential matches by score tier and resolve conflicts ---
-        createdMatches = []; # Collect match documents to be inserted
-        resourceIdsToUpdateStatus = set(); # Track resource IDs whose status needs updating
-        matchedResourceIds = set(); # Track IDs matched in this run to avoid duplicates
+    except Exception as main_process_error:
+        print(f"Worker Tasks: Error in main matchResources job process: {main_process_error}")
+        # Decide how to handle critical errors in the main process.
+        # Maybe log and let the job fail for BullMQ to retry.
+        raise # Re-raise the exception to indicate job failure
 
-        # Fetch current statuses only for resources involved in potential matches
-        allPotentialResourceIds = set();
-        for pm in all_potential_matches:
-             allPotentialResourceIds.add(str(pm['resourceA']['_id']));
-             allPotentialResourceIds.add(str(pm['resourceB']['_id']));
+# --- Distributed matching: coordinator, shard and reduce jobs (see worker/fanout.py) ---
+async def handle_MatchResourcesCoordinator_Job(job):
+    """
+    Fan-out step of a distributed matching run. Fetches every category once, stores a
+    snapshot of each in Redis and enqueues one 'scoreMatchShard' job per category or
+    price bucket, so any worker replica can score it.
+    """
+    print(f"Worker Tasks: Handling matchResourcesCoordinator job {job.id}")
+
+    if db is None or resource_collection is None or match_collection is None:
+         print(f"Worker Tasks: Database or collections not available. Cannot process matchResourcesCoordinator job {job.id}.")
+         raise ConnectionError("Database connection not available.")
+
+    from worker.queue import redis_connection, resource_queue # Same connection the queues use
+    run_id = str(job.id)
+
+    try:
+        distinct_categories = await resource_collection.distinct('category', {'status': 'matching'})
+        print(f"Worker Tasks: Found {len(distinct_categories)} distinct categories with matching resources for run {run_id}.")
+
+        plan_categories = []
+        plan_shards = []
+        for category in distinct_categories:
+            category_resources = await fetch_category_resources(category)
+            if not category_resources:
+                continue
 
-        resources_in_potential_matches_cursor = resource_collection.find(
-            { '_id': { '$in': [ObjectId(id_str) for id_str in allPotentialResourceIds] } },
-            { '_id': 1, 'status': 1 }
+            category_index = len(plan_categories)
+            plan_categories.append({'category': category, 'resourceCount': len(category_resources)})
+            await run_io(
+                redis_connection.set, run_key(run_id, 'resources', category_index),
+                resources_to_bytes(category_resources), ex=MATCH_FANOUT_TTL_SECONDS
+            )
+            for anchor_start, anchor_end in plan_scoring_shards(category_resources, MATCH_SHARD_SIZE):
+                plan_shards.append({'categoryIndex': category_index, 'anchorStart': anchor_start, 'anchorEnd': anchor_end})
+
+        if not plan_shards:
+            print(f"Worker Tasks: No matching resources to score for run {run_id}.")
+            return {'runId': run_id, 'categories': 0, 'shards': 0}
+
+        await run_io(
+            redis_connection.set, run_key(run_id, 'plan'),
+            plan_to_json(plan_categories, plan_shards), ex=MATCH_FANOUT_TTL_SECONDS
         )
-        statusMap = { str(r['_id']): r['status'] for r in resources_in_potential_matches_cursor }
 
-        print(f"Worker Tasks: Fetched status for {len(statusMap)} resources involved in potential matches.");
+        # A shard that never completes keeps the done-set short of the plan and the reduce from running,
+        # so shards are retried, and the delayed check reports the run if it still has not reduced
+        for shard_index in range(len(plan_shards)):
+            await resource_queue.add(
+                'scoreMatchShard',
+                {'runId': run_id, 'shardIndex': shard_index},
+                {
+                    'jobId': shard_job_id(run_id, shard_index),
+                    'removeOnComplete': True,
+                    'attempts': MATCH_SHARD_ATTEMPTS,
+                    'backoff': {'type': 'exponential', 'delay': MATCH_SHARD_BACKOFF_MS},
+                }
+            )
+        await resource_queue.add(
+            'checkMatchRun', {'runId': run_id},
+            {'jobId': check_job_id(run_id), 'delay': MATCH_RUN_CHECK_DELAY_SECONDS * 1000, 'removeOnComplete': True}
+        )
 
+        print(f"Worker Tasks: Run {run_id}: enqueued {len(plan_shards)} scoring shard(s) for {len(plan_categories)} categories.")
+        return {'runId': run_id, 'categories': len(plan_categories), 'shards': len(plan_shards)}
 
-        currentScoreIndex = 0
-        while currentScoreIndex < len(all_potential_matches):
-            currentScore = all_potential_matches[currentScoreIndex]['score'];
-            tierPotentialMatches = [];
+    except Exception as e:
+        print(f"Worker Tasks: Error in matchResourcesCoordinator job {job.id}: {e}")
+        raise # Re-raise to let BullMQ handle retries
 
-            tierIndex = currentScoreIndex;
-            while tierIndex < len(all_potential_matches) and all_potential_matches[tierIndex]['score'] == currentScore:
-                tierPotentialMatches.append(all_potential_matches[tierIndex]);
-                tierIndex += 1
 
-            print(f"Worker Tasks: Processing tier with score {currentScore}. Found {len(tierPotentialMatches)} potential matches in this tier.");
+async def handle_ScoreMatchShard_Job(job):
+    """
+    Scores one shard of a distributed matching run and stores its candidates in Redis.
+    The shard that completes the run enqueues the 'reduceMatchResources' job.
+    """
+    run_id = job.data['runId']
+    shard_index = int(job.data['shardIndex'])
+    print(f"Worker Tasks: Handling scoreMatchShard job {job.id} (run {run_id}, shard {shard_index})")
+
+    from worker.queue import redis_connection, resource_queue # Same connection the queues use
 
-            # --- Filter for AVAILABLE potential matches in this tier ---
-            available_tier_potential_matches = []
-            for potential_match in tierPotentialMatches:
-                resourceA = potential_match['resourceA']
-                resourceB = potential_match['resourceB']
-                resourceA_id = str(resourceA['_id'])
-                resourceB_id = str(resourceB['_id'])
+    try:
+        plan_value = await run_io(redis_connection.get, run_key(run_id, 'plan'))
+        if plan_value is None:
+            raise RuntimeError(f"Plan of matching run {run_id} is missing or expired.")
+        plan = plan_from_json(plan_value)
+        shard = plan['shards'][shard_index]
+        category = plan['categories'][shard['categoryIndex']]['category']
+
+        snapshot = await run_io(redis_connection.get, run_key(run_id, 'resources', shard['categoryIndex']))
+        if snapshot is None:
+            raise RuntimeError(f"Resource snapshot of category {category} in matching run {run_id} is missing or expired.")
+
+        candidate_bytes, shard_scoring_stats = await run_cpu(
+            score_shard_snapshot, category, snapshot, (shard['anchorStart'], shard['anchorEnd'])
+        )
 
-                isResourceAAvailable = statusMap.get(resourceA_id) == 'matching' and resourceA_id not in matchedResourceIds;
-                isResourceBAvailable = statusMap.get(resourceB_id) == 'matching' and resourceB_id not in matchedResourceIds;
+        def store_shard_result():
+            pipeline = redis_connection.pipeline()
+            pipeline.set(run_key(run_id, 'candidates', shard_index), candidate_bytes, ex=MATCH_FANOUT_TTL_SECONDS)
+            pipeline.set(run_key(run_id, 'stats', shard_index), json.dumps(shard_scoring_stats), ex=MATCH_FANOUT_TTL_SECONDS)
+            pipeline.sadd(run_key(run_id, 'done'), shard_index)
+            pipeline.expire(run_key(run_id, 'done'), MATCH_FANOUT_TTL_SECONDS)
+            pipeline.scard(run_key(run_id, 'done'))
+            return pipeline.execute()[-1]
+
+        completed_shards = await run_io(store_shard_result)
+        print(f"Worker Tasks: Run {run_id}: shard {shard_index} of category {category} stored "
+              f"({len(candidate_bytes)} bytes of candidates); {completed_shards}/{len(plan['shards'])} shards done.")
+
+        # Shard results are stored before they are counted, so whoever sees the full count can reduce
+        if completed_shards >= len(plan['shards']):
+            await resource_queue.add(
+                'reduceMatchResources', {'runId': run_id},
+                {'jobId': reduce_job_id(run_id), 'removeOnComplete': True}
+            )
+            print(f"Worker Tasks: Run {run_id}: all shards scored, enqueued reduce job.")
 
-                if isResourceAAvailable and isResourceBAvailable:
-                    available_tier_potential_matches.append(potential_match);
-                else:
-                      if currentScore >= MIN_MATCH_SCORE:
-                          print(f"Worker Tasks: Skipping potential match in tier (Score {currentScore}) between {resourceA_id} and {resourceB_id} - unavailable or already matched (status: {statusMap.get(resourceA_id, 'unknown')}, {statusMap.get(resourceB_id, 'unknown')} | matched this run: {resourceA_id in matchedResourceIds or resourceB_id in matchedResourceIds}).");
+    except Exception as e:
+        print(f"Worker Tasks: Error in scoreMatchShard job {job.id}: {e}")
+        raise # Re-raise to let BullMQ handle retries
 
 
-            print(f"Worker Tasks: Found {len(available_tier_potential_matches)} AVAILABLE potential matches in this tier.");
+async def handle_CheckMatchRun_Job(job):
+    """
+    Delayed check of a distributed matching run. A finished run has deleted its plan; a run
+    whose shards are all done gets its reduce job enqueued again (a no-op while it is still
+    queued); a run with missing shards fails this job with them, instead of expiring silently.
+    """
+    run_id = job.data['runId']
+    print(f"Worker Tasks: Handling checkMatchRun job {job.id} (run {run_id})")
 
+    from worker.queue import redis_connection, resource_queue # Same connection the queues use
 
-            # --- Handle Unique High Score Match vs. VCG Tie-Breaking ---
-            # A tier is a unique high score match IF:
-            # 1. It's the first tier (currentScoreIndex == 0).
-            # 2. There is exactly ONE available potential match in this tier.
-            # 3. There are no more potential matches globally, OR the next potential match globally has a strictly lower score.
-            is_unique_high_score_tier = (
-                currentScoreIndex == 0 and
-                len(available_tier_potential_matches) == 1 and
-                (tierIndex == len(all_potential_matches) or all_potential_matches[tierIndex]['score'] < currentScore)
+    try:
+        plan_value = await run_io(redis_connection.get, run_key(run_id, 'plan'))
+        if plan_value is None:
+            print(f"Worker Tasks: Run {run_id}: finished, nothing to check.")
+            return {'runId': run_id, 'status': 'finished'}
+        plan = plan_from_json(plan_value)
+
+        done_values = await run_io(redis_connection.smembers, run_key(run_id, 'done'))
+        done_shards = {int(value) for value in done_values}
+        missing_shards = [index for index in range(len(plan['shards'])) if index not in done_shards]
+        if missing_shards:
+            raise RuntimeError(
+                f"Matching run {run_id} has not reduced after {MATCH_RUN_CHECK_DELAY_SECONDS}s: "
+                f"shard(s) {missing_shards} of {len(plan['shards'])} never completed."
             )
 
+        await resource_queue.add(
+            'reduceMatchResources', {'runId': run_id},
+            {'jobId': reduce_job_id(run_id), 'removeOnComplete': True}
+        )
+        print(f"Worker Tasks: Run {run_id}: all shards scored but not reduced yet, enqueued reduce job.")
+        return {'runId': run_id, 'status': 'reducing'}
 
-            if is_unique_high_score_tier:
-                # --- Handle Unique High Score Match ---
-                print(f"Worker Tasks: Identified unique high score AVAILABLE match (Score {currentScore}). Creating pending match with suggested prices.")
-                unique_match = available_tier_potential_matches[0]
-                resourceA = unique_match['resourceA'] # Get resource dicts from the potential match
-                resourceB = unique_match['resourceB']
-
-                rA_id = str(resourceA['_id'])
-                rB_id = str(resourceB['_id'])
-
-                # Calculate Suggested Prices for Negotiation Phase
-                suggestedPriceRequester = None
-                suggestedPriceOwner = None
-                originalPriceRequester = None
-                originalPriceOwner = None
-
-
-                # Determine requester/owner and calculate suggested prices based on types and prices
-                # Use the types stored in the potential_match dict, which came from the resource docs.
-                typeA = unique_match.get('typeA')
-                typeB = unique_match.get('typeB')
-                priceA = unique_match.get('priceA')
-                priceB = unique_match.get('priceB')
-
-                # Find the original resource documents again to get userId and potentially other original fields
-                # We can use the resource dicts stored in the potential match
-                resourceA_doc = unique_match['resourceA']
-                resourceB_doc = unique_match['resourceB']
-
-
-                if typeA in ['buy', 'lease', 'service-request'] and typeB in ['sell', 'rent', 'service-offer']:
-                    # resourceA is requester (buyer side), resourceB is owner (seller side)
-                    requester_userId = resourceA_doc.get('userId')
-                    owner_userId = resourceB_doc.get('userId')
-                    originalPriceRequester = priceA # Buyer's original bid
-                    originalPriceOwner = priceB   # Seller's original ask
-
-                    # Calculate suggested prices
-                    if originalPriceOwner is not None and isinstance(originalPriceOwner, (int, float)):
-                        suggestedPriceRequester = originalPriceOwner + ERRAND_FEE
-
-                    if originalPriceRequester is not None and isinstance(originalPriceRequester, (int, float)):
-                         suggestedPriceOwner = originalPriceRequester - ERRAND_FEE
-
-
-                elif typeA in ['sell', 'rent', 'service-offer'] and typeB in ['buy', 'lease', 'service-request']:
-                    # resourceA is owner (seller side), resourceB is requester (buyer side)
-                    owner_userId = resourceA_doc.get('userId')
-                    requester_userId = resourceB_doc.get('userId')
-                    originalPriceOwner = priceA   # Seller's original ask
-                    originalPriceRequester = priceB # Buyer's original bid
-
-                    # Calculate suggested prices
-                    if originalPriceOwner is not None and isinstance(originalPriceOwner, (int, float)):
-                        suggestedPriceRequester = originalPriceOwner + ERRAND_FEE
-
-                    if originalPriceRequester is not None and isinstance(originalPriceRequester, (int, float)):
-                        suggestedPriceOwner = originalPriceRequester - ERRAND_FEE
-
-                else:
-                     # This case should not happen for a valid compatible match filtered by price compatibility
-                     print(f"Worker Tasks: Warning: Unique high score match with unexpected types during suggested price calculation: {typeA} and {typeB}. Skipping match creation.")
-                     # Move to the next tier index and continue the loop
-                     currentScoreIndex = tierIndex
-                     continue # Skip match creation and go to next tier
-
-
-                # Create the Match document dictionary for the unique high score match
-                newMatch = {
-                    '_id': ObjectId(), # Generate new ObjectId for MongoDB
-                    'resource1': resourceA_doc.get('_id'), # Original ObjectId of resource A
-                    'resource2': resourceB_doc.get('_id'), # Original ObjectId of resource B
-                    'requester': requester_userId,
-                    'owner': owner_userId,
-                    'resource1Payment': None, # Initial price is None for pending negotiation
-                    'resource2Receipt': None, # Initial price is None for pending negotiation
-                    'score': currentScore, # Store the unique high score
-                    'status': 'pending', # Initial status for negotiation
-                    'suggestedPriceRequester': suggestedPriceRequester, # Store calculated suggested prices
-                    'suggestedPriceOwner': suggestedPriceOwner,
-                    'originalPriceRequester': originalPriceRequester, # Store original prices
-                    'originalPriceOwner': originalPriceOwner,
-                    'firstAcceptanceTime': None, # Set to null initially for negotiation
-                    'requesterAcceptedSuggestedPrice': False, # Set flags to false initially
-                    'ownerAcceptedSuggestedPrice': False,
-                    # These original acceptance flags are not strictly needed in the simplified model,
-                    # but keeping them for potential future use or if schema requires.
-                    'requesterAcceptedOriginalPrice': False,
-                    'ownerAcceptedOriginalPrice': False,
-                    'rejectedBy': None, # Set to null initially
-                    'timeoutPenaltyAppliedTo': None, # Set to null initially for timeout penalties
-                    'createdAt': datetime.utcnow(), # Timestamp of match creation
-                    'updatedAt': datetime.utcnow(), # Add updated at timestamp
-                }
+    except Exception as e:
+        print(f"Worker Tasks: Error in checkMatchRun job {job.id}: {e}")
+        raise
 
-                createdMatches.append(newMatch)
-
-                # Mark the resources in this unique match as 'matched' internally
-                # This prevents them from being matched in lower score tiers in this run.
-                resourceIdsToUpdateStatus.add(rA_id)
-                resourceIdsToUpdateStatus.add(rB_id)
-                statusMap[rA_id] = 'matched' # Update status map for subsequent availability checks
-                statusMap[rB_id] = 'matched'
-                matchedResourceIds.add(rA_id)
-                matchedResourceIds.add(rB_id)
-
-                print(f"Worker Tasks: Created pending match for unique high score pair {rA_id} and {rB_id} (Score {currentScore}) with suggested prices.")
-
-
-            else:
-                # --- Handle VCG Tie-Breaking (Multiple Available Matches or Conflicts in Tier) ---
-                # This block will be executed if the tier is NOT a unique high score with one available match.
-                # This includes:
-                # - Tiers with score lower than the highest (if any)
-                # - Tiers with the same highest score (ties)
-                # - The highest score tier if it has more than one available match (conflicts at the highest score)
-                print(f"Worker Tasks: Tier Score {currentScore} is not a unique high score AVAILABLE match with one available match. Applying VCG tie-breaking if available matches exist.")
-
-                selected_matches_in_tier = [] # Matches chosen by bipartite matching for this tier
 
-                if len(available_tier_potential_matches) > 0:
-                     # --- VCG Tie-Breaking Logic (Apply Bipartite Matching) ---
-                     print(f"Worker Tasks: Applying Max Weight Bipartite Matching for {len(available_tier_potential_matches)} available matches in tier with score {currentScore}.")
-
-                     B = nx.Graph()
-                     buyer_nodes_in_graph = [] # Collect buyer nodes added to graph
-
-                     for potential_match in available_tier_potential_matches:
-                         resourceA_doc = potential_match['resourceA'] # Use the stored resource dicts
-                         resourceB_doc = potential_match['resourceB']
-                         nodeA_id = f"resource_{str(resourceA_doc.get('_id'))}_type_{resourceA_doc.get('type')}"
-                         nodeB_id = f"resource_{str(resourceB_doc.get('_id'))}_type_{resourceB_doc.get('type')}"
-
-                         buyer_node_id = None
-                         seller_node_id = None
-                         buyer_price = None
-                         seller_price = None
-
-                         typeA = resourceA_doc.get('type')
-                         typeB = resourceB_doc.get('type')
-                         priceA = resourceA_doc.get('price')
-                         priceB = resourceB_doc.get('price')
-
-
-                         if typeA in ['buy', 'lease', 'service-request'] and typeB in ['sell', 'rent', 'service-offer']:
-                             buyer_node_id = nodeA_id
-                             seller_node_id = nodeB_id
-                             buyer_price = priceA
-                             seller_price = priceB
-                         elif typeA in ['sell', 'rent', 'service-offer'] and typeB in ['buy', 'lease', 'service-request']:
-                             seller_node_id = nodeA_id
-                             buyer_node_id = nodeB_id
-                             seller_price = priceA
-                             buyer_price = priceB
-                         else:
-                             print(f"Worker Tasks: Warning: Unexpected resource types when building graph for tier: {typeA} and {typeB}. Skipping edge.")
-                             continue
-
-                         edge_weight = 0
-                         if buyer_price is not None and seller_price is not None and isinstance(buyer_price, (int, float)) and isinstance(seller_price, (int, float)):
-                             edge_weight = buyer_price - seller_price
-
-                         if edge_weight > 0:
-                              B.add_edge(buyer_node_id, seller_node_id, weight=edge_weight, potential_match=potential_match)
-                              if buyer_node_id not in buyer_nodes_in_graph:
-                                   buyer_nodes_in_graph.append(buyer_node_id)
-
-
-                     if B.number_of_edges() > 0:
-                         try:
-                              matching_result_dict = nx.max_weight_matching(B, top_nodes=buyer_nodes_in_graph, maxcardinality=False)
-
-                              for node1_id, node2_id in matching_result_dict.items():
-                                  if B.has_edge(node1_id, node2_id):
-                                       edge_data = B.get_edge_data(node1_id, node2_id)
-                                       if 'potential_match' in edge_data:
-                                           selected_matches_in_tier.append(edge_data['potential_match'])
-                                  elif B.has_edge(node2_id, node1_id):
-                                       edge_data = B.get_edge_data(node2_id, node1_id)
-                                       if 'potential_match' in edge_data:
-                                           selected_matches_in_tier.append(edge_data['potential_match'])
-                                  else:
-                                       print(f"Worker Tasks: Warning: Matched nodes {node1_id} and {node2_id} do not have a corresponding edge in the graph. Skipping.")
-
-
-                              print(f"Worker Tasks: Selected {len(selected_matches_in_tier)} matches from tier score {currentScore} via Bipartite Matching (Selection).")
-
-
-                              # --- Create Match Documents for the selected VCG matches ---
-                              # For VCG selected matches, the VCG determined price is the initial proposal.
-                              # Suggested prices can be set to these VCG prices.
-
-                              # First, determine VCG prices for the selected matches.
-                              matches_with_vcg_prices = determine_vcg_prices_for_tier(
-                                 selected_matches=selected_matches_in_tier,
-                                 all_available_tier_matches=available_tier_potential_matches # Pass the full list
-                              )
-
-                              for matchToCreate in matches_with_vcg_prices:
-                                  resourceA_doc = matchToCreate['resourceA']
-                                  resourceB_doc = matchToCreate['resourceB']
-
-                                  rA_id = str(resourceA_doc.get('_id'))
-                                  rB_id = str(resourceB_doc.get('_id'))
-
-                                  # Check if resources are still available (should be if selected by bipartite matching from available)
-                                  if statusMap.get(rA_id) == 'matching' and rA_id not in matchedResourceIds and \
-                                      statusMap.get(rB_id) == 'matching' and rB_id not in matchedResourceIds:
-
-                                      print(f"Worker Tasks: Creating match with score {matchToCreate['score']} (Tier Score) between {rA_id} and {rB_id} with VCG-determined prices.")
-
-                                      isResourceARequester = resourceA_doc.get('type') in ['buy', 'lease', 'service-request']
-                                      requesterResource = resourceA_doc if isResourceARequester else resourceB_doc
-                                      ownerResource = resourceA_doc if not isResourceARequester else resourceB_doc
-
-                                      vcg_determined_price_requester = matchToCreate['determinedPriceA'] if isResourceARequester else matchToCreate['determinedPriceB']
-                                      vcg_determined_price_owner = matchToCreate['determinedPriceB'] if isResourceARequester else matchToCreate['determinedPriceA']
-
-
-                                      newMatch = {
-                                        '_id': ObjectId(),
-                                        'resource1': requesterResource.get('_id'),
-                                        'resource2': ownerResource.get('_id'),
-                                        'requester': requesterResource.get('userId'),
-                                        'owner': ownerResource.get('userId'),
-                                        'resource1Payment': None, # Initial price is None for pending
-                                        'resource2Receipt': None, # Initial price is None for pending
-                                        'score': matchToCreate['score'],
-                                        'status': 'pending',
-                                        # For VCG matches, the suggested prices are the VCG-determined ones.
-                                        'suggestedPriceRequester': vcg_determined_price_requester,
-                                        'suggestedPriceOwner': vcg_determined_price_owner,
-                                        'originalPriceRequester': requesterResource.get('price'), # Still store original
-                                        'originalPriceOwner': ownerResource.get('price'),
-                                        'firstAcceptanceTime': None, # Initial state
-                                        'requesterAcceptedSuggestedPrice': False,
-                                        'ownerAcceptedSuggestedPrice': False,
-                                        'requesterAcceptedOriginalPrice': False, # Not used in this simplified model
-                                        'ownerAcceptedOriginalPrice': False, # Not used in this simplified model
-                                        'rejectedBy': None,
-                                        'timeoutPenaltyAppliedTo': None,
-                                        'createdAt': datetime.utcnow(),
-                                        'updatedAt': datetime.utcnow(),
-                                      }
-
-                                      createdMatches.append(newMatch)
-
-                                      resourceIdsToUpdateStatus.add(rA_id)
-                                      resourceIdsToUpdateStatus.add(rB_id)
-                                      statusMap[rA_id] = 'matched'
-                                      statusMap[rB_id] = 'matched'
-                                      matchedResourceIds.add(rA_id)
-                                      matchedResourceIds.add(rB_id)
-
-                                      print(f"Worker Tasks: Created pending VCG match for pair {rA_id} and {rB_id} with VCG-determined prices.")
-
-                                  else:
-                                      print(f"Worker Tasks: Skipping match creation for VCG pair {rA_id} and {rB_id} (Score {currentScore}) - already matched in a higher-priority tier or earlier in this run.")
-
-
-                         except nx.NetworkXPointlessConcept:
-                              print(f"Worker Tasks: Bipartite graph for tier score {currentScore} is empty or has no edges with positive weight. No VCG matches selected.")
-                         except Exception as graph_matching_error:
-                              print(f"Worker Tasks: Error during VCG Bipartite Matching for tier score {currentScore}: {graph_matching_error}")
-                              pass # Continue to next tier
-
-
-            # Move index to the start of the next score tier
-            currentScoreIndex = tierIndex;
-
-
-        # --- Save Created Match Documents and Update Statuses ---
-        if createdMatches:
-            try:
-                insert_result = match_collection.insert_many(createdMatches)
-                print(f"Worker Tasks: Successfully inserted {len(insert_result.inserted_ids)} match documents.")
-            except Exception as db_error:
-                print(f"Worker Tasks: Error inserting match documents: {db_error}")
-
-        if resourceIdsToUpdateStatus:
-            try:
-                object_ids_to_update = [ObjectId(id_str) for id_str in resourceIdsToUpdateStatus]
-                update_result = resource_collection.update_many(
-                    {'_id': {'$in': object_ids_to_update}},
-                    {'$set': {'status': 'matched'}} # Assuming 'matched' is a valid status
-                )
-                print(f"Worker Tasks: Successfully updated status to 'matched' for {update_result.modified_count} resources.")
-            except Exception as db_error:
-                print(f"Worker Tasks: Error updating resource statuses: {db_error}")
+async def handle_ReduceMatchResources_Job(job):
+    """
+    Fan-in step of a distributed matching run: merges the shard candidates in plan order,
+    resolves conflicts and commits the matches, then deletes the run's Redis keys.
+    """
+    run_id = job.data['runId']
+    print(f"Worker Tasks: Handling reduceMatchResources job {job.id} (run {run_id})")
 
-        print("Worker Tasks: Batching and conflict-resolving matching process finished.")
+    if db is None or resource_collection is None or match_collection is None:
+         print(f"Worker Tasks: Database or collections not available. Cannot process reduceMatchResources job {job.id}.")
+         raise ConnectionError("Database connection not available.")
 
-    except Exception as main_process_error:
-        print(f"Worker Tasks: Error in main matchResources job process: {main_process_error}")
-        # Decide how to handle critical errors in the main process.
-        # Maybe log and let the job fail for BullMQ to retry.
-        raise # Re-raise the exception to indicate job failure
+    from worker.queue import redis_connection # Same connection the queues use
+
+    try:
+        plan_value = await run_io(redis_connection.get, run_key(run_id, 'plan'))
+        if plan_value is None:
+            raise RuntimeError(f"Plan of matching run {run_id} is missing or expired.")
+        plan = plan_from_json(plan_value)
+
+        # Rebuild the run's resource table from the category snapshots
+        resource_table = []
+        category_offsets = []
+        for category_index in range(len(plan['categories'])):
+            snapshot = await run_io(redis_connection.get, run_key(run_id, 'resources', category_index))
+            if snapshot is None:
+                raise RuntimeError(f"Resource snapshot {category_index} of matching run {run_id} is missing or expired.")
+            category_offsets.append(len(resource_table))
+            resource_table.extend(await run_cpu(slim_resources_from_bytes, snapshot))
+
+        shard_count = len(plan['shards'])
+        candidate_values = await run_io(redis_connection.mget, [run_key(run_id, 'candidates', index) for index in range(shard_count)])
+        stats_values = await run_io(redis_connection.mget, [run_key(run_id, 'stats', index) for index in range(shard_count)])
+        missing_shards = [index for index, value in enumerate(candidate_values) if value is None]
+        if missing_shards:
+            raise RuntimeError(f"Matching run {run_id} is missing results of shard(s) {missing_shards}.")
+
+        all_candidates = []
+        scoring_stats = {}
+        for shard, candidate_value, stats_value in zip(plan['shards'], candidate_values, stats_values):
+            all_candidates.append(offset_candidates(candidates_from_bytes(candidate_value), category_offsets[shard['categoryIndex']]))
+            for stat_name, stat_value in json.loads(stats_value or '{}').items():
+                scoring_stats[stat_name] = scoring_stats.get(stat_name, 0) + stat_value
+
+        all_potential_matches = concatenate_candidates(all_candidates)
+        print(f"Worker Tasks: Run {run_id}: candidate pruning across all categories: {scoring_stats}")
+        print(f"Worker Tasks: Run {run_id}: collected {len(all_potential_matches)} potential matches from {shard_count} shard(s).")
+
+        # Resources matched since the coordinator ran are filtered out by their current status
+        await resolve_and_save_matches(all_potential_matches, resource_table)
+
+        run_keys = [run_key(run_id, 'plan'), run_key(run_id, 'done')]
+        run_keys += [run_key(run_id, 'resources', index) for index in range(len(plan['categories']))]
+        run_keys += [run_key(run_id, part, index) for part in ('candidates', 'stats') for index in range(shard_count)]
+        await run_io(redis_connection.delete, *run_keys)
+        print(f"Worker Tasks: Distributed matching run {run_id} finished.")
+
+    except Exception as e:
+        print(f"Worker Tasks: Error in reduceMatchResources job {job.id}: {e}")
+        raise # Re-raise to let BullMQ handle retries
 
 # Note: Remember to implement the Node.js backend endpoints for negotiation
 # and the Python background task for timeouts and penalties.
@@ -675,13 +683,14 @@ async def handle_MatchResources_Job(job): # Renamed function
 async def populate_potential_matches_job(job):
     """
     BullMQ job handler to calculate match scores between service-requests and service-offers,
-    and populate the potentialErrandRequests array in RunnerProfile documents.
+    and store them as potential matches (RunnerProfile.potentialErrandRequests and/or the
+    potential-match collection, per POTENTIAL_MATCH_STORE).
     This job is expected to run frequently, perhaps every minute or few minutes.
     """
     job_data = job.data
     print(f"Processing populate_potential_matches_job for job ID: {job.id}, Data: {job_data}")
 
-    if not db_client or not db:
+    if db_client is None or db is None:
         print("MongoDB connection not established. Exiting job.")
         # Consider raising an exception here if DB connection is critical for this job to prevent it from being marked as 'completed'
         raise ConnectionError("MongoDB client is not initialized. Cannot perform populate_potential_matches_job.")
@@ -691,23 +700,10 @@ async def populate_potential_matches_job(job):
         # This prevents re-processing all resources on every run.
         time_window = datetime.utcnow() - timedelta(minutes=10) # Use UTC for consistency
 
-        # 1. Fetch relevant 'service-request' resources
-        service_requests_cursor = resource_collection.find(
-            {
-                'type': 'service-request',
-                'status': {'$in': ['submitted', 'matching']},
-                'assignedErrandId': {'$exists': False},
-                '$or': [
-                    {'createdAt': {'$gte': time_window}},
-                    {'updatedAt': {'$gte': time_window}}
-                ]
-            }
-        ).limit(BATCH_SIZE)
-        service_requests = list(service_requests_cursor)
-        print(f"Found {len(service_requests)} relevant 'service-request' resources to evaluate.")
-
-        # 2. Fetch relevant 'service-offer' resources and their associated RunnerProfiles
-        service_offers_cursor = resource_collection.find(
+        # 1. Fetch relevant 'service-offer' resources and their associated RunnerProfiles
+        service_offers = []
+        async for offers_page in find_in_keyset_pages(
+            resource_collection,
             {
                 'type': 'service-offer',
                 'status': {'$in': ['active', 'available']},
@@ -715,79 +711,58 @@ async def populate_potential_matches_job(job):
                     {'createdAt': {'$gte': time_window}},
                     {'updatedAt': {'$gte': time_window}}
                 ]
-            }
-        ).limit(BATCH_SIZE)
-        service_offers = list(service_offers_cursor)
+            },
+            page_size=BATCH_SIZE,
+            max_documents=ERRAND_MAX_OFFERS_PER_RUN or None,
+        ):
+            service_offers.extend(offers_page)
         print(f"Found {len(service_offers)} relevant 'service-offer' resources.")
+        if ERRAND_MAX_OFFERS_PER_RUN and len(service_offers) >= ERRAND_MAX_OFFERS_PER_RUN:
+            print(f"Worker Tasks: Offer cap ERRAND_MAX_OFFERS_PER_RUN={ERRAND_MAX_OFFERS_PER_RUN} reached; later offers are not scored in this run.")
 
         # Map service offers to their associated runner profiles for efficient lookup
         runner_profile_map = {}
         if service_offers:
             runner_ids = [offer['userId'] for offer in service_offers]
             runner_profiles_cursor = runner_profile_collection.find({'userId': {'$in': runner_ids}})
-            for profile in runner_profiles_cursor:
+            for profile in await runner_profiles_cursor.to_list(length=None):
                 runner_profile_map[profile['userId']] = profile
 
         print(f"Fetched {len(runner_profile_map)} runner profiles for active offers.")
 
-        # 3. Iterate and Score
-        # For robust array updates in MongoDB (update or push),
-        # it's often more reliable to use two operations or a complex aggregation pipeline update.
-        # For many updates, `bulk_write` is best.
-        
-        updates_queue = []
-
-        for s_req in service_requests:
-            for s_offer in service_offers:
-                if s_offer['userId'] in runner_profile_map:
-                    runner_profile_doc = runner_profile_map[s_offer['userId']]
-
-                    score = calculate_match_score(s_req, s_offer, runner_profile_doc)
-
-                    if score >= MIN_MATCH_SCORE:
-                        potential_match_entry = {
-                            'requestId': s_req['_id'],
-                            'score': score,
-                            'matchedAt': datetime.utcnow(), # Use UTC
-                            'offerId': s_offer['_id']
-                        }
+        # 2. Stream relevant 'service-request' resources page by page and score each page against the offers
+        total_service_requests = 0
+        scoring_stats = {} # Pairs scored / skipped by the location index, summed over pages
+        async for service_requests in find_in_keyset_pages(
+            resource_collection,
+            {
+                'type': 'service-request',
+                'status': {'$in': ['submitted', 'matching']},
+                'assignedErrandId': {'$exists': False},
+                '$or': [
+                    {'createdAt': {'$gte': time_window}},
+                    {'updatedAt': {'$gte': time_window}}
+                ]
+            },
+            page_size=BATCH_SIZE,
+        ):
+            total_service_requests += len(service_requests)
+            print(f"Found {len(service_requests)} relevant 'service-request' resources to evaluate ({total_service_requests} so far).")
+            if not service_offers:
+                continue
 
-                        # Try to update an existing entry first (using arrayFilters)
-                        updates_queue.append(
-                            {
-                                'filter': {'_id': runner_profile_doc['_id'], 'potentialErrandRequests.requestId': s_req['_id']},
-                                'update': {'$set': {'potentialErrandRequests.$[elem]': potential_match_entry}},
-                                'array_filters': [{'elem.requestId': s_req['_id']}]
-                            }
-                        )
-                        # If the above didn't update (no matching requestId found in array), push a new one
-                        updates_queue.append(
-                            {
-                                'filter': {'_id': runner_profile_doc['_id'], 'potentialErrandRequests.requestId': {'$ne': s_req['_id']}},
-                                'update': {'$push': {'potentialErrandRequests': potential_match_entry}}
-                            }
-                        )
-                        print(f"Calculated score {score} for request {s_req['_id']} with offer {s_offer['_id']}.")
-        
-        # Execute bulk write operations
-        if updates_queue:
-            # PyMongo's bulk_write expects a list of WriteModel operations (e.g., UpdateOne)
-            from pymongo import UpdateOne
-            bulk_operations = []
-            for op in updates_queue:
-                if 'array_filters' in op:
-                    bulk_operations.append(UpdateOne(op['filter'], op['update'], array_filters=op['array_filters']))
-                else:
-                    bulk_operations.append(UpdateOne(op['filter'], op['update']))
-            
-            if bulk_operations:
-                try:
-                    result = await asyncio.to_thread(runner_profile_collection.bulk_write, bulk_operations) # Run blocking DB call in a thread
-                    print(f"Bulk write for runner profiles completed. Upserted: {result.upserted_count}, Matched: {result.matched_count}, Modified: {result.modified_count}")
-                except Exception as e_bulk:
-                    print(f"Error during bulk write for runner profiles: {e_bulk}")
-        
+            # 3. Iterate and Score
+            # Scoring requests against their co-located offers is pure CPU work, so it runs in the process pool
+            scored_pairs, page_scoring_stats = await run_cpu(score_errand_pairs, service_requests, service_offers, runner_profile_map)
+            for stat_name, stat_value in page_scoring_stats.items():
+                scoring_stats[stat_name] = scoring_stats.get(stat_name, 0) + stat_value
+
+            # 4. Store this page's potential matches (POTENTIAL_MATCH_STORE, see worker/potential_matches.py)
+            await save_potential_matches(scored_pairs)
+
+        print(f"Worker Tasks: Errand pair scoring for {total_service_requests} requests: {scoring_stats}")
         print("Finished calculating and updating potential matches.")
+        return scoring_stats
 
     except Exception as e_job:
         print(f"An unhandled error occurred in populate_potential_matches_job: {e_job}")
@@ -805,203 +780,197 @@ async def assignErrand_job(job):
     job_data = job.data
     print(f"Processing assignErrand_job for job ID: {job.id}, Data: {job_data}")
 
-    if not db_client or not db:
+    if db_client is None or db is None:
         print("MongoDB connection not established. Exiting job.")
         raise ConnectionError("MongoDB client is not initialized. Cannot perform assignErrand_job.")
 
     try:
-        # 1. Identify Pending 'service-request' Resources
-        pending_service_requests_cursor = resource_collection.find(
+        # 1. Identify Pending 'service-request' Resources, oldest first, in (createdAt, _id) keyset pages
+        # Assigned requests leave the filter while later pages are read; keyset pages don't shift when that happens.
+        total_pending_service_requests = 0
+        async for pending_service_requests in find_in_keyset_pages(
+            resource_collection,
             {
                 'type': 'service-request',
                 'status': 'matching', # Status indicates it's waiting for an assignment
                 'assignedErrandId': {'$exists': False}
-            }
-        ).sort('createdAt', 1).limit(BATCH_SIZE)
+            },
+            sort_field='createdAt',
+            page_size=ASSIGN_ERRAND_PAGE_SIZE,
+            max_documents=BATCH_SIZE,
+        ):
+            total_pending_service_requests += len(pending_service_requests)
+            print(f"Found {len(pending_service_requests)} pending 'service-request' resources ({total_pending_service_requests} so far).")
+
+            # Process each service-request one by one
+            for s_req_resource in pending_service_requests:
+                resource_id = s_req_resource['_id']
+                requester_id = s_req_resource['userId']
+                resource_specs = s_req_resource.get('specifications', {})
+                resource_name = s_req_resource.get('name', f"Errand Request {resource_id}")
+
+                print(f"\n--- Processing service-request: {resource_id} ---")
+
+                # 2. Find Best Potential Runner for this Service Request
+                # Available runners with a potential match, best first (highest score, then most recent matchedAt)
+                scored_runners = await find_potential_runners(resource_id, min_score=MIN_MATCH_SCORE)
+
+                if not scored_runners:
+                    print(f"No potential runners found for service-request: {resource_id}.")
+                    await resource_collection.update_one(
+                        {'_id': resource_id},
+                        {'$inc': {'matchAttempts': 1}}
+                    )
+                    continue
 
-        pending_service_requests = list(pending_service_requests_cursor)
+                eligible_runners = [r for r in scored_runners if r['score'] >= MIN_MATCH_SCORE]
 
-        if not pending_service_requests:
-            print("No pending 'service-request' resources found for assignment.")
-            return
+                if not eligible_runners:
+                    print(f"No eligible runners (score >= {MIN_MATCH_SCORE}) found for service-request: {resource_id}.")
+                    await resource_collection.update_one(
+                        {'_id': resource_id},
+                        {'$inc': {'matchAttempts': 1}}
+                    )
+                    continue
 
-        print(f"Found {len(pending_service_requests)} pending 'service-request' resources.")
+                best_runner_entry = eligible_runners[0]
+                best_runner_profile = best_runner_entry['runner_profile']
+                assigned_runner_id = best_runner_profile['userId']
 
-        # Process each service-request one by one
-        for s_req_resource in pending_service_requests:
-            resource_id = s_req_resource['_id']
-            requester_id = s_req_resource['userId']
-            resource_specs = s_req_resource.get('specifications', {})
-            resource_name = s_req_resource.get('name', f"Errand Request {resource_id}")
+                print(f"Identified best runner {assigned_runner_id} (profile ID: {best_runner_profile['_id']}) for service-request {resource_id}.")
 
-            print(f"\n--- Processing service-request: {resource_id} ---")
+                # 3. Create New Errand Document and update related documents in a transaction
+                # This ensures atomicity for the critical assignment process.
+                async with await db_client.start_session() as session:
+                    async with session.start_transaction():
+                        try:
+                            new_errand_doc = {
+                                'resourceRequestId': resource_id,
+                                'currentStatus': 'pending',
+                                'errandRunner': assigned_runner_id,
+                                'runnerAssignedAt': datetime.utcnow(), # Use UTC
+
+                                'pickupLocation': resource_specs.get('from_address', {}),
+                                'dropoffLocation': resource_specs.get('to_address', {}),
+                                'isDeliveryToDoor': resource_specs.get('door_delivery', False),
+                                'deliveryFee': float(s_req_resource.get('price', 0)) if s_req_resource.get('price') is not None else 0,
+                                'doorDeliveryUnits': int(resource_specs.get('door_delivery_units', 0)) if resource_specs.get('door_delivery_units') is not None else 0,
+                                'expectedStartTime': resource_specs.get('expectedStartTime'),
+                                'expectedEndTime': resource_specs.get('expectedEndTime'),
+                                'expectedTimeframeString': resource_specs.get('expectedTimeframeString'),
+
+                                'createdAt': datetime.utcnow(), # Use UTC
+                                'updatedAt': datetime.utcnow(), # Use UTC
+                            }
 
-            # 2. Find Best Potential Runner for this Service Request
-            potential_runners_cursor = runner_profile_collection.find(
-                {
-                    'potentialErrandRequests.requestId': resource_id,
-                    # Add conditions for runner availability (e.g., 'isAvailable': True)
-                    # 'isAvailable': True # Example, uncomment and define if applicable
-                    'currentActiveErrand': {'$exists': False} # Example: runner is not currently on an active errand
-                }
-            )
-            potential_runners_list = list(potential_runners_cursor)
+                            if not isinstance(new_errand_doc['resourceRequestId'], ObjectId):
+                                new_errand_doc['resourceRequestId'] = ObjectId(new_errand_doc['resourceRequestId'])
+                            if not isinstance(new_errand_doc['errandRunner'], ObjectId):
+                                new_errand_doc['errandRunner'] = ObjectId(new_errand_doc['errandRunner'])
+
+                            insert_result = await errands_collection.insert_one(new_errand_doc, session=session)
+                            new_errand_id = insert_result.inserted_id
+                            print(f"Successfully created new Errand document: {new_errand_id} for service-request {resource_id}.")
+
+                            # 4. Update 'service-request' Resource
+                            await resource_collection.update_one(
+                                {'_id': resource_id},
+                                {
+                                    '$set': {
+                                        'status': 'matched',
+                                        'assignedErrandId': new_errand_id
+                                    },
+                                    '$inc': {'matchAttempts': 1}
+                                },
+                                session=session
+                            )
+                            print(f"Updated service-request {resource_id} status to 'matched' and linked to Errand {new_errand_id}.")
+
+                            # 5. Update RunnerProfile (Remove assigned request from potential matches & set current active errand)
+                            await runner_profile_collection.update_one(
+                                {'_id': best_runner_profile['_id']},
+                                {
+                                    '$pull': {'potentialErrandRequests': {'requestId': resource_id}},
+                                    '$set': {'currentActiveErrand': new_errand_id} # Assign the errand to runner
+                                },
+                                session=session
+                            )
+                            print(f"Removed service-request {resource_id} from runner {best_runner_profile['_id']}'s potential matches and assigned new errand.")
+                            await remove_potential_matches(resource_id, session=session)
 
-            if not potential_runners_list:
-                print(f"No potential runners found for service-request: {resource_id}.")
-                resource_collection.update_one(
-                    {'_id': resource_id},
-                    {'$inc': {'matchAttempts': 1}}
-                )
-                continue
+                            # 6. Send Notification to Runner (via Node.js service)
+                            try:
+                                notification_payload = {
+                                    'userId': str(assigned_runner_id),
+                                    'message': f"You have been assigned a new errand: '{resource_name}'. Please accept to confirm.",
+                                    'data': {
+                                        'errandId': str(new_errand_id),
+                                        'resourceId': str(resource_id),
+                                        'type': 'errand_assignment',
+                                        'resourceName': resource_name,
+                                        'pickupLocation': resource_specs.get('from_address', {}).get('full_address', 'N/A'),
+                                        'dropoffLocation': resource_specs.get('to_address', {}).get('full_address', 'N/A'),
+                                        'deliveryTime': resource_specs.get('delivery_time', 'N/A')
+                                    }
+                                }
+                                headers = {'Content-Type': 'application/json'}
+                                # Perform the HTTP request in a separate thread to avoid blocking the event loop
+                                await run_io(
+                                    requests.post,
+                                    NODEJS_NOTIFICATION_URL,
+                                    data=json.dumps(notification_payload),
+                                    headers=headers,
+                                    timeout=5
+                                )
+                                print(f"Notification sent successfully to runner {assigned_runner_id}.")
+                            except requests.exceptions.RequestException as req_e:
+                                print(f"Failed to send notification to runner {assigned_runner_id}: {req_e}")
+                            except Exception as notif_e:
+                                print(f"An unexpected error occurred while sending notification: {notif_e}")
+
+                            await session.commit_transaction() # Commit the transaction on success
+                            print(f"Transaction committed for service-request {resource_id}.")
+
+                        except Exception as e_transaction:
+                            await session.abort_transaction() # Rollback on error
+                            print(f"Error during transaction for service-request {resource_id}: {e_transaction}. Transaction aborted.")
+                            job.log(f"Transaction error for resource {resource_id}: {e_transaction}")
+                            # Optionally increment matchAttempts here, or rely on subsequent job runs
+                            await resource_collection.update_one(
+                                {'_id': resource_id},
+                                {'$inc': {'matchAttempts': 1}}
+                            )
+                            # Do not re-raise here, so job doesn't necessarily fail for one resource.
+                            # However, if you want the job to retry the *entire batch*, re-raise after rollback.
+                            # For now, we'll log and continue.
 
-            scored_runners = []
-            for runner_profile in potential_runners_list:
-                for req_entry in runner_profile.get('potentialErrandRequests', []):
-                    if req_entry['requestId'] == resource_id:
-                        score = req_entry.get('score', 0)
-                        if not isinstance(score, (int, float)):
-                            score = 0
-                        matched_at = req_entry.get('matchedAt', datetime.min)
-                        scored_runners.append({
-                            'runner_profile': runner_profile,
-                            'score': score,
-                            'matchedAt': matched_at
-                        })
-                        break
-
-            eligible_runners = [r for r in scored_runners if r['score'] >= MIN_MATCH_SCORE]
-
-            if not eligible_runners:
-                print(f"No eligible runners (score >= {MIN_MATCH_SCORE}) found for service-request: {resource_id}.")
-                resource_collection.update_one(
-                    {'_id': resource_id},
-                    {'$inc': {'matchAttempts': 1}}
-                )
-                continue
+        if total_pending_service_requests == 0:
+            print("No pending 'service-request' resources found for assignment.")
+            return
 
-            # Sort eligible runners: highest score first, then oldest matched time first
-            eligible_runners.sort(key=lambda x: (x['score'], x['matchedAt']), reverse=True)
+    except Exception as e_job:
+        print(f"An unhandled error occurred in assignErrand_job: {e_job}")
+        raise # Re-raise for BullMQ retry
 
-            best_runner_entry = eligible_runners[0]
-            best_runner_profile = best_runner_entry['runner_profile']
-            assigned_runner_id = best_runner_profile['userId']
+    print(f"Finished assignErrand_job for job ID: {job.id}")
 
-            print(f"Identified best runner {assigned_runner_id} (profile ID: {best_runner_profile['_id']}) for service-request {resource_id}.")
 
-            # 3. Create New Errand Document and update related documents in a transaction
-            # This ensures atomicity for the critical assignment process.
-            with db_client.start_session() as session:
-                with session.start_transaction():
-                    try:
-                        new_errand_doc = {
-                            'resourceRequestId': resource_id,
-                            'currentStatus': 'pending',
-                            'errandRunner': assigned_runner_id,
-                            'runnerAssignedAt': datetime.utcnow(), # Use UTC
-
-                            'pickupLocation': resource_specs.get('from_address', {}),
-                            'dropoffLocation': resource_specs.get('to_address', {}),
-                            'isDeliveryToDoor': resource_specs.get('door_delivery', False),
-                            'deliveryFee': float(s_req_resource.get('price', 0)) if s_req_resource.get('price') is not None else 0,
-                            'doorDeliveryUnits': int(resource_specs.get('door_delivery_units', 0)) if resource_specs.get('door_delivery_units') is not None else 0,
-                            'expectedStartTime': resource_specs.get('expectedStartTime'),
-                            'expectedEndTime': resource_specs.get('expectedEndTime'),
-                            'expectedTimeframeString': resource_specs.get('expectedTimeframeString'),
-
-                            'createdAt': datetime.utcnow(), # Use UTC
-                            'updatedAt': datetime.utcnow(), # Use UTC
-                        }
+# --- Define job handler for 'prunePotentialMatches' ---
+# Scheduled periodically: drops the potential matches of requests that were assigned, cancelled
+# or deleted since they were scored, and the entries not re-scored within POTENTIAL_MATCH_STALE_HOURS.
+async def handle_PrunePotentialMatches_Job(job):
+    print(f"Worker Tasks: Handling prunePotentialMatches job {job.id}")
 
-                        if not isinstance(new_errand_doc['resourceRequestId'], ObjectId):
-                            new_errand_doc['resourceRequestId'] = ObjectId(new_errand_doc['resourceRequestId'])
-                        if not isinstance(new_errand_doc['errandRunner'], ObjectId):
-                            new_errand_doc['errandRunner'] = ObjectId(new_errand_doc['errandRunner'])
-
-                        insert_result = await asyncio.to_thread(errands_collection.insert_one, new_errand_doc, session=session)
-                        new_errand_id = insert_result.inserted_id
-                        print(f"Successfully created new Errand document: {new_errand_id} for service-request {resource_id}.")
-
-                        # 4. Update 'service-request' Resource
-                        await asyncio.to_thread(
-                            resource_collection.update_one,
-                            {'_id': resource_id},
-                            {
-                                '$set': {
-                                    'status': 'matched',
-                                    'assignedErrandId': new_errand_id
-                                },
-                                '$inc': {'matchAttempts': 1}
-                            },
-                            session=session
-                        )
-                        print(f"Updated service-request {resource_id} status to 'matched' and linked to Errand {new_errand_id}.")
-
-                        # 5. Update RunnerProfile (Remove assigned request from potential matches & set current active errand)
-                        await asyncio.to_thread(
-                            runner_profile_collection.update_one,
-                            {'_id': best_runner_profile['_id']},
-                            {
-                                '$pull': {'potentialErrandRequests': {'requestId': resource_id}},
-                                '$set': {'currentActiveErrand': new_errand_id} # Assign the errand to runner
-                            },
-                            session=session
-                        )
-                        print(f"Removed service-request {resource_id} from runner {best_runner_profile['_id']}'s potential matches and assigned new errand.")
-
-                        # 6. Send Notification to Runner (via Node.js service)
-                        try:
-                            notification_payload = {
-                                'userId': str(assigned_runner_id),
-                                'message': f"You have been assigned a new errand: '{resource_name}'. Please accept to confirm.",
-                                'data': {
-                                    'errandId': str(new_errand_id),
-                                    'resourceId': str(resource_id),
-                                    'type': 'errand_assignment',
-                                    'resourceName': resource_name,
-                                    'pickupLocation': resource_specs.get('from_address', {}).get('full_address', 'N/A'),
-                                    'dropoffLocation': resource_specs.get('to_address', {}).get('full_address', 'N/A'),
-                                    'deliveryTime': resource_specs.get('delivery_time', 'N/A')
-                                }
-                            }
-                            headers = {'Content-Type': 'application/json'}
-                            # Perform the HTTP request in a separate thread to avoid blocking the event loop
-                            await asyncio.to_thread(
-                                requests.post,
-                                NODEJS_NOTIFICATION_URL,
-                                data=json.dumps(notification_payload),
-                                headers=headers,
-                                timeout=5
-                            )
-                            print(f"Notification sent successfully to runner {assigned_runner_id}.")
-                        except requests.exceptions.RequestException as req_e:
-                            print(f"Failed to send notification to runner {assigned_runner_id}: {req_e}")
-                        except Exception as notif_e:
-                            print(f"An unexpected error occurred while sending notification: {notif_e}")
-
-                        session.commit_transaction() # Commit the transaction on success
-                        print(f"Transaction committed for service-request {resource_id}.")
-
-                    except Exception as e_transaction:
-                        session.abort_transaction() # Rollback on error
-                        print(f"Error during transaction for service-request {resource_id}: {e_transaction}. Transaction aborted.")
-                        job.log(f"Transaction error for resource {resource_id}: {e_transaction}")
-                        # Optionally increment matchAttempts here, or rely on subsequent job runs
-                        await asyncio.to_thread(
-                            resource_collection.update_one,
-                            {'_id': resource_id},
-                            {'$inc': {'matchAttempts': 1}}
-                        )
-                        # Do not re-raise here, so job doesn't necessarily fail for one resource.
-                        # However, if you want the job to retry the *entire batch*, re-raise after rollback.
-                        # For now, we'll log and continue.
-            
+    if db_client is None or db is None:
+        print("MongoDB connection not established. Exiting job.")
+        raise ConnectionError("MongoDB client is not initialized. Cannot perform prunePotentialMatches job.")
+
+    try:
+        return await prune_potential_matches()
     except Exception as e_job:
-        print(f"An unhandled error occurred in assignErrand_job: {e_job}")
+        print(f"Worker Tasks: Error during prunePotentialMatches job {job.id}: {e_job}")
         raise # Re-raise for BullMQ retry
 
-    print(f"Finished assignErrand_job for job ID: {job.id}")
-
 
 # --- Separate Process/Endpoint for Requester Acceptance ---
 # This is an API endpoint triggered by the frontend when the requester accepts an offer resource.
@@ -1025,7 +994,7 @@ async def handle_CleanupTimedOutMatches_Job(job):
     print(f"Worker Tasks: Handling cleanupTimedOutMatches job {job.id}")
 
     # Ensure database connections are available
-    if db is None or match_collection is None or db.users is None:
+    if db is None or match_collection is None or users_collection is None:
         print(f"Worker Tasks: Database or collections not available. Cannot process cleanupTimedOutMatches job {job.id}.")
         # Depending on your setup, you might raise an exception or return
         # If using BullMQ, raising an exception allows it to retry the job
@@ -1045,7 +1014,7 @@ async def handle_CleanupTimedOutMatches_Job(job):
             # The query uses the index on status and firstAcceptanceTime for efficiency
         })
 
-        timed_out_acceptance_matches = list(timed_out_acceptance_matches_cursor)
+        timed_out_acceptance_matches = await timed_out_acceptance_matches_cursor.to_list(length=None)
 
         print(f"Worker Tasks: Found {len(timed_out_acceptance_matches)} timed-out matches from the Acceptance Window.")
 
@@ -1056,7 +1025,7 @@ async def handle_CleanupTimedOutMatches_Job(job):
 
                 try: # This is the inner try-except for processing each match
                     # 1. Update Match Status to 'cancelled'
-                    update_result = match_collection.update_one(
+                    update_result = await match_collection.update_one(
                         {'_id': match['_id'], 'status': 'pending'},  # Only update if status is still pending
                         {'$set': {
                             'status': 'cancelled',
@@ -1090,14 +1059,13 @@ async def handle_CleanupTimedOutMatches_Job(job):
                         if timed_out_user_id:
                             print(f"Worker Tasks: User {timed_out_user_id} timed out on match {match_id} in Acceptance Window. Applying penalty.")
                             # Update the match document to record who received the penalty
-                            match_collection.update_one(
+                            await match_collection.update_one(
                                 {'_id': match['_id']},
                                 {'$set': {'timeoutPenaltyAppliedTo': timed_out_user_id, 'updatedAt': datetime.utcnow()}}
                             )
 
                             # Apply the penalty (deduct 5 points) to the user's points
-                            user_collection = db.users  # Assuming your User collection is accessible
-                            user_update_result = user_collection.update_one(
+                            user_update_result = await users_collection.update_one(
                                 {'_id': timed_out_user_id},
                                 {'$inc': {'points': -5}}  # Deduct 5 points
                             )
@@ -1125,7 +1093,7 @@ async def handle_CleanupTimedOutMatches_Job(job):
 
                             try:
                                 # Make the HTTP POST request to the Node.js notification endpoint
-                                response = requests.post(NODEJS_NOTIFICATION_URL, json=notification_payload)
+                                response = await run_io(requests.post, NODEJS_NOTIFICATION_URL, json=notification_payload)
                                 response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
                                 print(f"Worker Tasks: Successfully requested notification for match {match_id}.")
                             except requests.exceptions.RequestException as e:
@@ -1153,7 +1121,7 @@ async def handle_CleanupTimedOutMatches_Job(job):
             # Also check that rejection hasn't happened? If status is pending, it shouldn't have been rejected.
         })
 
-        timed_out_initial_pending_matches = list(timed_out_initial_pending_matches_cursor)
+        timed_out_initial_pending_matches = await timed_out_initial_pending_matches_cursor.to_list(length=None)
 
         print(f"Worker Tasks: Found {len(timed_out_initial_pending_matches)} timed-out matches from the Initial Pending Window (no action).")
 
@@ -1165,7 +1133,7 @@ async def handle_CleanupTimedOutMatches_Job(job):
                 try:
                     # Update Match Status to 'cancelled'
                     # Use update_one with status check for safety
-                    update_result = match_collection.update_one(
+                    update_result = await match_collection.update_one(
                         {'_id': match['_id'], 'status': 'pending'},  # Only update if status is still pending
                         {'$set': {
                             'status': 'cancelled',
@@ -1186,7 +1154,7 @@ async def handle_CleanupTimedOutMatches_Job(job):
                             'data': {'matchId': match_id}
                         }
                         try:
-                            response = requests.post(NODEJS_NOTIFICATION_URL, json=notification_payload)
+                            response = await run_io(requests.post, NODEJS_NOTIFICATION_URL, json=notification_payload)
                             response.raise_for_status()
                             print(f"Worker Tasks: Successfully requested notification for match {match_id} (no action).")
                         except requests.exceptions.RequestException as e:
@@ -1217,7 +1185,7 @@ async def _process_match_completion(match_id: ObjectId, session=None):
     print(f"Attempting auto-completion for match {match_id}...")
 
     # Use the correctly named collection 'match_collection'
-    match = match_collection.find_one({'_id': match_id}, session=session)
+    match = await match_collection.find_one({'_id': match_id}, session=session)
     if not match:
         print(f"Match {match_id} not found during auto-completion process.")
         return False
@@ -1240,7 +1208,7 @@ async def _process_match_completion(match_id: ObjectId, session=None):
         raise ValueError("Invalid finalAmount for wallet credit.")
 
     # Ensure wallet exists and update using correct collection name
-    wallet_update_result = wallets_collection.update_one(
+    wallet_update_result = await wallets_collection.update_one(
         {'userId': owner_id},
         {
             '$inc': {'balance': final_amount},
@@ -1269,7 +1237,7 @@ async def _process_match_completion(match_id: ObjectId, session=None):
     # 2. Award Points & Credits to the Owner
     # Fetch the owner's user document directly (assuming it's found and updated in place)
     # Need to get the current points/credits before updating
-    owner_user = users_collection.find_one({'_id': owner_id}, session=session)
+    owner_user = await users_collection.find_one({'_id': owner_id}, session=session)
     if not owner_user:
         raise ValueError(f"Owner user {owner_id} not found for awarding points/credits during auto-completion.")
 
@@ -1287,7 +1255,7 @@ async def _process_match_completion(match_id: ObjectId, session=None):
         print(f"User {owner_id} has maxed out credits (100). No credit awarded for match {match_id}.")
 
     # Update the user document in the database
-    users_collection.update_one(
+    await users_collection.update_one(
         {'_id': owner_id},
         {
             '$set': {
@@ -1300,7 +1268,7 @@ async def _process_match_completion(match_id: ObjectId, session=None):
     )
     
     # 3. Update Match Status
-    match_collection.update_one(
+    await match_collection.update_one(
         {'_id': match_id},
         {
             '$set': {
@@ -1359,15 +1327,15 @@ async def handle_AutoCompleteMatch_Job(job):
     try:
         # Iterate through matches found by the aggregation pipeline
         # Ensure db_client is available before attempting to use it
-        if not db_client:
+        if db_client is None:
             raise ConnectionError("MongoDB client is not initialized. Cannot perform cleanup job.")
 
-        for match_doc in match_collection.aggregate(pipeline): # Use match_collection
+        async for match_doc in match_collection.aggregate(pipeline): # Use match_collection
             match_id = match_doc['_id']
             
             # Start a transaction for each match to ensure atomicity of updates
-            with db_client.start_session() as session: # Use db_client for session
-                with session.start_transaction():
+            async with await db_client.start_session() as session: # Use db_client for session
+                async with session.start_transaction():
                     try:
                         success = await _process_match_completion(match_id, session=session)
                         if success:
@@ -1377,7 +1345,7 @@ async def handle_AutoCompleteMatch_Job(job):
                         else:
                             print(f"Skipped auto-completion for match {match_id}.")
                     except Exception as e:
-                        session.abort_transaction() # Ensure rollback on any error during processing
+                        await session.abort_transaction() # Ensure rollback on any error during processing
                         print(f"Error processing match {match_id}: {e}. Transaction aborted.")
                         job.log(f"Error processing match {match_id}: {e}")
             